@@ -15,6 +15,9 @@ if config.config_file_name is not None:
 # add your model's MetaData object here for 'autogenerate' support
 from app.db.base_class import Base
 from app.models.user_permissions import UserPermissions
+from app.models.account_metadata import AccountMetadata
+from app.models.lead_index import LeadIndex, HiddenLead
+from app.models.settings_version import SettingsVersion
 
 target_metadata = Base.metadata
 
@@ -0,0 +1,63 @@
+"""
+Вызовы AmoCRM API с автоматической обработкой 401.
+
+Если AmoCRM отклоняет закешированный access_token, токены обновляются
+(один force_refresh на субдомен для всех конкурентных запросов),
+а запрос повторяется с новым токеном.
+"""
+
+from typing import Any, Awaitable, Callable, TypeVar
+
+from fastapi import HTTPException
+
+from app.core.logging import logger
+from app.utils.tokens import get_headers, get_tokens_from_service, refresh_rejected_tokens
+
+T = TypeVar("T")
+
+
+async def call_with_token_refresh(
+    func: Callable[..., Awaitable[T]],
+    subdomain: str,
+    *args: Any,
+    **kwargs: Any,
+) -> T:
+    """
+    Вызов функции из requests_amocrm с токенами субдомена и повтором при 401.
+
+    Функция вызывается с аргументами subdomain и headers, остальные
+    аргументы передаются как есть. При 401 запрос повторяется один раз.
+
+    Args:
+        func: Функция из app.amocrm.requests_amocrm (get_lead_by_id и т.д.)
+        subdomain: Субдомен AmoCRM
+
+    Returns:
+        Результат выполнения функции
+
+    Raises:
+        HTTPException: Ошибка запроса, в т.ч. 401 после обновления токенов
+
+    Example:
+        >>> lead = await call_with_token_refresh(
+        ...     get_lead_by_id, "example", 123, client_session=session
+        ... )
+    """
+    tokens = await get_tokens_from_service(subdomain)
+    headers = await get_headers(subdomain, tokens["access_token"])
+
+    try:
+        return await func(*args, subdomain=subdomain, headers=headers, **kwargs)
+    except HTTPException as e:
+        if e.status_code != 401:
+            raise
+
+        logger.warning(
+            "AmoCRM вернул 401 для subdomain=%s, обновляем токены и повторяем запрос",
+            subdomain
+        )
+
+    tokens = await refresh_rejected_tokens(subdomain, tokens["access_token"])
+    headers = await get_headers(subdomain, tokens["access_token"])
+
+    return await func(*args, subdomain=subdomain, headers=headers, **kwargs)
@@ -0,0 +1,203 @@
+"""
+Circuit breaker для запросов к AmoCRM по аккаунтам (субдоменам).
+
+Когда аккаунт AmoCRM недоступен или постоянно отвечает 429, запросы к нему
+быстро завершаются ошибкой CircuitBreakerOpenError вместо ожидания токена
+rate limiter'а и сетевого таймаута. Это не дает одному аккаунту занимать
+prefetch слоты воркера, нужные остальным.
+
+Состояния:
+    closed    - запросы проходят, ошибки считаются в скользящем окне
+    open      - запросы отклоняются до истечения CIRCUIT_OPEN_TIMEOUT
+    half_open - пропускается ограниченное число пробных запросов; успех
+                замыкает breaker, ошибка снова размыкает. Результаты
+                запросов, пропущенных до размыкания, состояние не меняют
+"""
+
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+from app.core.settings import config
+from app.core.logging import logger
+from app.core.metrics import metrics
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Числовые значения состояний для метрики amocrm_circuit_state
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitBreakerOpenError(Exception):
+    """Запрос к аккаунту AmoCRM отклонен разомкнутым circuit breaker'ом."""
+
+    def __init__(self, account: str, retry_after: float):
+        self.account = account
+        self.retry_after = retry_after
+        super().__init__(
+            f"Circuit breaker for {account} is open, retry after {retry_after:.0f}s"
+        )
+
+
+class CircuitBreaker:
+    """Circuit breaker одного аккаунта AmoCRM."""
+
+    def __init__(
+        self,
+        account: str,
+        failure_rate: float,
+        min_requests: int,
+        window: float,
+        open_timeout: float,
+        half_open_requests: int,
+    ):
+        self.account = account
+        self.failure_rate = failure_rate
+        self.min_requests = min_requests
+        self.window = window
+        self.open_timeout = open_timeout
+        self.half_open_requests = half_open_requests
+
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self._half_open_inflight = 0
+        # (время, успех) запросов в пределах окна
+        self._outcomes: Deque[Tuple[float, bool]] = deque()
+
+        self._export_state()
+
+    def before_request(self) -> bool:
+        """
+        Проверка перед запросом.
+
+        Returns:
+            True, если запрос пропущен как пробный (half_open). Этот признак
+            передается в record_success, record_failure и release
+
+        Raises:
+            CircuitBreakerOpenError: Если breaker разомкнут или лимит пробных запросов исчерпан
+        """
+        if self.state == OPEN:
+            elapsed = time.monotonic() - self.opened_at
+            if elapsed < self.open_timeout:
+                self._reject(self.open_timeout - elapsed)
+            self._set_state(HALF_OPEN)
+
+        if self.state == HALF_OPEN:
+            if self._half_open_inflight >= self.half_open_requests:
+                self._reject(self.open_timeout)
+            self._half_open_inflight += 1
+            return True
+
+        return False
+
+    def record_success(self, probe: bool = False) -> None:
+        """
+        Учет успешного запроса. Состояние half_open меняет только пробный
+        запрос: запрос, пропущенный еще в closed и завершившийся после
+        размыкания, ничего не говорит о восстановлении аккаунта.
+        """
+        if probe:
+            self._half_open_inflight = max(0, self._half_open_inflight - 1)
+            if self.state == HALF_OPEN:
+                self._outcomes.clear()
+                self._set_state(CLOSED)
+            return
+
+        if self.state == CLOSED:
+            self._record(True)
+
+    def record_failure(self, probe: bool = False) -> None:
+        """
+        Учет неуспешного запроса (5xx, 429, сетевая ошибка, таймаут). Поздние
+        ошибки запросов, пропущенных в closed, не продлевают размыкание.
+        """
+        metrics.inc("amocrm_circuit_failures_total", labels={"account": self.account})
+
+        if probe:
+            self._half_open_inflight = max(0, self._half_open_inflight - 1)
+            if self.state == HALF_OPEN:
+                self._open()
+            return
+
+        if self.state != CLOSED:
+            return
+
+        self._record(False)
+
+        total = len(self._outcomes)
+        failures = sum(1 for _, success in self._outcomes if not success)
+        if total >= self.min_requests and failures / total >= self.failure_rate:
+            self._open()
+
+    def release(self, probe: bool = False) -> None:
+        """Завершение запроса без результата (отмена): освобождает слот пробного запроса."""
+        if probe:
+            self._half_open_inflight = max(0, self._half_open_inflight - 1)
+
+    def _record(self, success: bool) -> None:
+        now = time.monotonic()
+        self._outcomes.append((now, success))
+        while self._outcomes and now - self._outcomes[0][0] > self.window:
+            self._outcomes.popleft()
+
+    def _open(self) -> None:
+        self.opened_at = time.monotonic()
+        self._outcomes.clear()
+        self._set_state(OPEN)
+
+    def _reject(self, retry_after: float) -> None:
+        metrics.inc("amocrm_circuit_rejected_total", labels={"account": self.account})
+        raise CircuitBreakerOpenError(self.account, retry_after)
+
+    def _set_state(self, state: str) -> None:
+        if state == self.state:
+            return
+
+        logger.warning(
+            "Circuit breaker AmoCRM: %s -> %s | account: %s", self.state, state, self.account
+        )
+        self.state = state
+        self._export_state()
+
+    def _export_state(self) -> None:
+        metrics.set("amocrm_circuit_state", STATE_VALUES[self.state], labels={"account": self.account})
+
+
+class CircuitBreakerRegistry:
+    """Circuit breaker'ы по аккаунтам AmoCRM с параметрами из конфигурации."""
+
+    def __init__(self):
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def get(self, account: str) -> CircuitBreaker:
+        breaker = self._breakers.get(account)
+        if breaker is None:
+            cfg = config.amocrm_cfg
+            breaker = CircuitBreaker(
+                account,
+                failure_rate=cfg.CIRCUIT_FAILURE_RATE,
+                min_requests=cfg.CIRCUIT_MIN_REQUESTS,
+                window=cfg.CIRCUIT_WINDOW,
+                open_timeout=cfg.CIRCUIT_OPEN_TIMEOUT,
+                half_open_requests=cfg.CIRCUIT_HALF_OPEN_REQUESTS,
+            )
+            self._breakers[account] = breaker
+        return breaker
+
+    def states(self) -> Dict[str, str]:
+        """Состояния breaker'ов по аккаунтам."""
+        return {account: breaker.state for account, breaker in self._breakers.items()}
+
+    def reset(self, account: Optional[str] = None) -> None:
+        """Сброс breaker'а аккаунта (или всех, если account=None)."""
+        if account is None:
+            self._breakers.clear()
+        else:
+            self._breakers.pop(account, None)
+
+
+# Глобальный реестр circuit breaker'ов процесса
+amocrm_circuit_breakers = CircuitBreakerRegistry()
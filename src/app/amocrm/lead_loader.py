@@ -0,0 +1,132 @@
+"""
+DataLoader для лидов AmoCRM.
+
+Объединяет конкурентные запросы отдельных лидов в пакетные запросы
+filter[id][] по 250 ID, чтобы не тратить лимит AmoCRM (6-7 RPS) на
+запрос каждого лида по отдельности.
+"""
+
+import asyncio
+from typing import Any, Dict, List, Optional, Set
+
+from aiohttp import ClientSession
+
+from app.amocrm.auth import call_with_token_refresh
+from app.amocrm.requests_amocrm import get_leads_by_ids
+from app.core.logging import logger
+
+# Максимальное количество ID в одном запросе filter[id][]
+MAX_BATCH_SIZE = 250
+
+# Окно сбора запросов в пакет в секундах
+BATCH_WINDOW = 0.01
+
+
+class LeadLoader:
+    """
+    Пакетный загрузчик лидов одного субдомена.
+
+    Вызовы load() в пределах BATCH_WINDOW объединяются в один запрос к AmoCRM.
+    Загрузчик кеширует результаты, поэтому повторный load() того же лида не
+    делает запрос. Экземпляр создается на один обрабатываемый запрос
+    (сообщение), чтобы кеш не устаревал.
+
+    Usage:
+        loader = LeadLoader("example", client_session)
+        lead_a, lead_b = await asyncio.gather(loader.load(1), loader.load(2))
+    """
+
+    def __init__(
+        self,
+        subdomain: str,
+        client_session: ClientSession,
+        batch_window: float = BATCH_WINDOW,
+        max_batch_size: int = MAX_BATCH_SIZE,
+    ):
+        """
+        Args:
+            subdomain: Субдомен AmoCRM
+            client_session: HTTP сессия (RateLimitedClientSession)
+            batch_window: Окно сбора запросов в пакет в секундах
+            max_batch_size: Максимальный размер пакета (не больше 250)
+        """
+        self.subdomain = subdomain
+        self._client_session = client_session
+        self._batch_window = batch_window
+        self._max_batch_size = min(max_batch_size, MAX_BATCH_SIZE)
+
+        self._cache: Dict[int, asyncio.Future] = {}
+        self._pending: List[int] = []
+        self._dispatch_handle: Optional[asyncio.TimerHandle] = None
+        # Загрузки пакетов в работе (ссылки держатся до завершения задачи)
+        self._batch_tasks: Set[asyncio.Task] = set()
+
+    async def load(self, lead_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Получение лида по ID.
+
+        Returns:
+            Данные лида или None, если лид не найден
+        """
+        future = self._cache.get(lead_id)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._cache[lead_id] = future
+            self._pending.append(lead_id)
+
+            if len(self._pending) >= self._max_batch_size:
+                self._dispatch()
+            elif self._dispatch_handle is None:
+                self._dispatch_handle = asyncio.get_running_loop().call_later(
+                    self._batch_window, self._dispatch
+                )
+
+        # shield: отмена одного вызывающего не должна отменять результат для остальных
+        return await asyncio.shield(future)
+
+    async def load_many(self, lead_ids: List[int]) -> List[Optional[Dict[str, Any]]]:
+        """Получение нескольких лидов. Порядок результатов соответствует lead_ids."""
+        return list(await asyncio.gather(*(self.load(lead_id) for lead_id in lead_ids)))
+
+    def clear(self, lead_id: Optional[int] = None) -> None:
+        """Сброс закешированного лида (или всего кеша, если lead_id=None)."""
+        if lead_id is None:
+            self._cache = {key: future for key, future in self._cache.items() if not future.done()}
+        elif lead_id in self._cache and self._cache[lead_id].done():
+            del self._cache[lead_id]
+
+    def _dispatch(self) -> None:
+        """Отправка накопленного пакета."""
+        if self._dispatch_handle is not None:
+            self._dispatch_handle.cancel()
+            self._dispatch_handle = None
+
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._load_batch(batch))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+
+    async def _load_batch(self, batch: List[int]) -> None:
+        """Загрузка пакета лидов и раздача результатов ожидающим."""
+        logger.debug("LeadLoader: запрос пакета из %s лидов для subdomain=%s", len(batch), self.subdomain)
+
+        try:
+            leads = await call_with_token_refresh(
+                get_leads_by_ids,
+                self.subdomain,
+                batch,
+                client_session=self._client_session,
+            )
+        except Exception as e:
+            for lead_id in batch:
+                # Ошибку не кешируем - следующий load() повторит запрос
+                future = self._cache.pop(lead_id, None)
+                if future is not None and not future.done():
+                    future.set_exception(e)
+            return
+
+        for lead_id in batch:
+            future = self._cache.get(lead_id)
+            if future is not None and not future.done():
+                future.set_result(leads.get(lead_id))
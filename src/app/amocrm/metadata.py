@@ -0,0 +1,252 @@
+"""
+Кеш метаданных аккаунта AmoCRM: кастомные поля сделок, контактов и
+компаний, воронки и их статусы.
+
+Метаданные меняются редко, а нужны при каждой загрузке админки и при
+расчете скрываемых сущностей, поэтому они хранятся в памяти с TTL и
+(опционально) в PostgreSQL, чтобы переживать перезапуски.
+"""
+
+import asyncio
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional, Set
+
+from aiohttp import ClientSession
+
+from app.amocrm.auth import call_with_token_refresh
+from app.amocrm.requests_amocrm import get_custom_fields, get_pipelines
+from app.core.settings import config
+from app.core.logging import logger
+from app.utils.visibility import metadata_version
+
+# Типы сущностей, для которых загружаются кастомные поля
+ENTITY_TYPES = ("leads", "contacts", "companies")
+
+
+def _compact_field(field: Dict[str, Any]) -> Dict[str, Any]:
+    """Оставляем только нужные виджету атрибуты поля."""
+    return {
+        "id": field["id"],
+        "name": field.get("name"),
+        "type": field.get("type"),
+        "code": field.get("code"),
+        "sort": field.get("sort"),
+        "enums": [
+            {"id": enum["id"], "value": enum.get("value")}
+            for enum in field.get("enums") or []
+        ],
+    }
+
+
+def _compact_pipeline(pipeline: Dict[str, Any]) -> Dict[str, Any]:
+    """Оставляем только нужные виджету атрибуты воронки и ее статусов."""
+    return {
+        "id": pipeline["id"],
+        "name": pipeline.get("name"),
+        "sort": pipeline.get("sort"),
+        "is_main": pipeline.get("is_main", False),
+        "is_archive": pipeline.get("is_archive", False),
+        "statuses": [
+            {
+                "id": status["id"],
+                "name": status.get("name"),
+                "sort": status.get("sort"),
+                "color": status.get("color"),
+                "type": status.get("type"),
+            }
+            for status in pipeline.get("_embedded", {}).get("statuses", [])
+        ],
+    }
+
+
+async def fetch_account_metadata(subdomain: str, client_session: ClientSession) -> Dict[str, Any]:
+    """
+    Загрузка метаданных аккаунта из AmoCRM.
+
+    Поля всех сущностей и воронки запрашиваются параллельно.
+
+    Returns:
+        Dict вида {"custom_fields": {"leads": [...], ...}, "pipelines": [...],
+        "fetched_at": "...", "version": "..."}
+    """
+    *fields_by_entity, pipelines = await asyncio.gather(
+        *(
+            call_with_token_refresh(
+                get_custom_fields, subdomain, entity_type, client_session=client_session
+            )
+            for entity_type in ENTITY_TYPES
+        ),
+        call_with_token_refresh(get_pipelines, subdomain, client_session=client_session),
+    )
+
+    metadata = {
+        "custom_fields": {
+            entity_type: [_compact_field(field) for field in fields]
+            for entity_type, fields in zip(ENTITY_TYPES, fields_by_entity)
+        },
+        "pipelines": [_compact_pipeline(pipeline) for pipeline in pipelines],
+        "fetched_at": datetime.now().isoformat(),
+    }
+    metadata["version"] = metadata_version(metadata)
+    return metadata
+
+
+class AccountMetadataCache:
+    """
+    Кеш метаданных аккаунтов AmoCRM по субдоменам.
+
+    Конкурентные загрузки одного субдомена объединяются в одну.
+    При AMOCRM_METADATA_PERSIST метаданные сохраняются в таблицу
+    account_metadata и читаются из нее при промахе кеша в памяти.
+    """
+
+    def __init__(self, ttl: Optional[int] = None, persist: Optional[bool] = None):
+        """
+        Args:
+            ttl: Время жизни метаданных в секундах (по умолчанию из конфигурации)
+            persist: Сохранять метаданные в PostgreSQL (по умолчанию из конфигурации)
+        """
+        self.ttl = ttl if ttl is not None else config.amocrm_cfg.METADATA_CACHE_TTL
+        self.persist = persist if persist is not None else config.amocrm_cfg.METADATA_PERSIST
+
+        # {subdomain: {"data": metadata, "loaded_at": unix time}}
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        # Субдомены, сброшенные invalidate(): следующая загрузка идет в AmoCRM, минуя БД
+        self._invalidated: Set[str] = set()
+
+    def peek(self, subdomain: str) -> Optional[Dict[str, Any]]:
+        """
+        Метаданные из памяти без обращения к AmoCRM (в том числе устаревшие).
+
+        Returns:
+            Метаданные или None, если субдомен еще не загружался
+        """
+        entry = self._entries.get(subdomain)
+        return entry["data"] if entry is not None else None
+
+    async def get(
+        self,
+        subdomain: str,
+        client_session: ClientSession,
+        force_refresh: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Получение метаданных аккаунта.
+
+        Args:
+            subdomain: Субдомен AmoCRM
+            client_session: HTTP сессия (RateLimitedClientSession)
+            force_refresh: Перезагрузить метаданные из AmoCRM, игнорируя кеш
+
+        Returns:
+            Метаданные аккаунта (см. fetch_account_metadata)
+        """
+        force_refresh = force_refresh or subdomain in self._invalidated
+        entry = self._entries.get(subdomain)
+        if not force_refresh and entry is not None and time.time() - entry["loaded_at"] < self.ttl:
+            return entry["data"]
+
+        task = self._inflight.get(subdomain)
+        if task is None:
+            task = asyncio.create_task(self._load(subdomain, client_session, force_refresh))
+            self._inflight[subdomain] = task
+            task.add_done_callback(lambda _: self._inflight.pop(subdomain, None))
+
+        return await asyncio.shield(task)
+
+    async def get_cached(self, subdomain: str) -> Optional[Dict[str, Any]]:
+        """
+        Метаданные без обращения к AmoCRM: из памяти или из PostgreSQL
+        (в том числе устаревшие). Используется там, где нельзя ждать AmoCRM.
+
+        Returns:
+            Метаданные или None, если они еще ни разу не загружались
+        """
+        data = self.peek(subdomain)
+        if data is None and self.persist:
+            data = await self._load_persisted(subdomain, check_ttl=False)
+        return data
+
+    def invalidate(self, subdomain: Optional[str] = None) -> None:
+        """
+        Сброс метаданных субдомена (или всех, если subdomain=None) из памяти.
+
+        Следующая загрузка сброшенного субдомена идет в AmoCRM, даже если в
+        PostgreSQL есть метаданные в пределах TTL.
+        """
+        if subdomain is None:
+            self._invalidated.update(self._entries)
+            self._entries.clear()
+        else:
+            self._invalidated.add(subdomain)
+            self._entries.pop(subdomain, None)
+
+    async def _load(
+        self,
+        subdomain: str,
+        client_session: ClientSession,
+        force_refresh: bool,
+    ) -> Dict[str, Any]:
+        if self.persist and not force_refresh:
+            stored = await self._load_persisted(subdomain)
+            if stored is not None:
+                return stored
+
+        logger.info("Загружаем метаданные аккаунта из AmoCRM для subdomain=%s", subdomain)
+        data = await fetch_account_metadata(subdomain, client_session)
+        self._entries[subdomain] = {"data": data, "loaded_at": time.time()}
+        self._invalidated.discard(subdomain)
+
+        if self.persist:
+            await self._save_persisted(subdomain, data)
+
+        return data
+
+    async def _load_persisted(self, subdomain: str, check_ttl: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        Чтение метаданных из PostgreSQL.
+
+        Args:
+            check_ttl: Возвращать только метаданные в пределах TTL кеша
+        """
+        # Импорт внутри, чтобы модуль можно было использовать без БД
+        from app.db.async_session import async_session
+        from app.services.metadata_service import get_account_metadata
+
+        try:
+            async with async_session() as session:
+                stored = await get_account_metadata(subdomain, session)
+        except Exception as e:
+            logger.warning("Не удалось прочитать метаданные из БД для subdomain=%s: %s", subdomain, e)
+            return None
+
+        if stored is None or stored.fetched_at is None:
+            return None
+
+        loaded_at = stored.fetched_at.timestamp()
+        if check_ttl and time.time() - loaded_at >= self.ttl:
+            return None
+
+        self._entries[subdomain] = {"data": stored.data, "loaded_at": loaded_at}
+        return stored.data
+
+    async def _save_persisted(self, subdomain: str, data: Dict[str, Any]) -> None:
+        from app.db.async_session import async_session
+        from app.services.metadata_service import save_account_metadata
+
+        try:
+            async with async_session() as session:
+                await save_account_metadata(
+                    subdomain,
+                    data,
+                    datetime.fromisoformat(data["fetched_at"]),
+                    session,
+                )
+        except Exception as e:
+            logger.warning("Не удалось сохранить метаданные в БД для subdomain=%s: %s", subdomain, e)
+
+
+# Глобальный кеш метаданных процесса
+metadata_cache = AccountMetadataCache()
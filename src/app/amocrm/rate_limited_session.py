@@ -2,9 +2,54 @@
 Обертка для aiohttp.ClientSession с автоматическим rate limiting.
 """
 
-from typing import Any, Optional
-from aiohttp import ClientSession, ClientResponse
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Generator, Optional, Union
+from aiohttp import ClientError, ClientSession, ClientResponse
+from yarl import URL
+from app.amocrm.circuit_breaker import amocrm_circuit_breakers
 from app.amocrm.rate_limiter import amocrm_rate_limiter
+from app.amocrm.response_cache import (
+    CachedResponse,
+    ResponseCache,
+    get_response_cache,
+    is_cacheable_path,
+)
+
+Response = Union[ClientResponse, CachedResponse]
+
+# Статусы ответа AmoCRM, которые считаются сбоем аккаунта для circuit breaker'а
+CIRCUIT_FAILURE_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+def _account_from_request(url: str, headers: Optional[Dict[str, str]]) -> str:
+    """Субдомен AmoCRM из заголовка Host или из URL."""
+    host = (headers or {}).get("Host") or URL(url).host or ""
+    return host.split(".", 1)[0]
+
+
+class _RateLimitedRequest:
+    """
+    Запрос, ожидающий разрешения rate limiter'а перед выполнением.
+
+    Как и запросы aiohttp, поддерживает оба варианта использования:
+    `await session.get(...)` и `async with session.get(...) as response`.
+    """
+
+    def __init__(self, perform: Callable[[], Awaitable[Response]]):
+        self._perform = perform
+        self._response: Optional[Response] = None
+
+    def __await__(self) -> Generator[Any, None, Response]:
+        return self._perform().__await__()
+
+    async def __aenter__(self) -> Response:
+        self._response = await self._perform()
+        return self._response
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        if self._response is not None:
+            self._response.release()
 
 
 class RateLimitedClientSession:
@@ -12,39 +57,118 @@ class RateLimitedClientSession:
     Обертка для aiohttp.ClientSession с автоматическим rate limiting.
 
     Все HTTP методы автоматически соблюдают rate limit перед выполнением запроса.
+    GET запросы к редко меняющимся эндпоинтам (см. response_cache.CACHEABLE_PATHS)
+    отдаются из кеша ответов без расхода rate limit.
+    Запросы к аккаунту с разомкнутым circuit breaker'ом сразу завершаются
+    ошибкой CircuitBreakerOpenError.
     """
 
-    def __init__(self, session: ClientSession):
+    def __init__(self, session: ClientSession, response_cache: Optional[ResponseCache] = None):
         """
         Args:
             session: aiohttp.ClientSession для оборачивания
+            response_cache: Кеш ответов. По умолчанию - из конфигурации
         """
         self._session = session
+        self._response_cache = response_cache if response_cache is not None else get_response_cache()
 
-    async def get(self, url: str, **kwargs) -> ClientResponse:
+    def get(self, url: str, **kwargs) -> _RateLimitedRequest:
         """GET запрос с rate limiting."""
-        await amocrm_rate_limiter.acquire()
-        return await self._session.get(url, **kwargs)
+        return _RateLimitedRequest(lambda: self._request("GET", url, **kwargs))
 
-    async def post(self, url: str, **kwargs) -> ClientResponse:
+    def post(self, url: str, **kwargs) -> _RateLimitedRequest:
         """POST запрос с rate limiting."""
-        await amocrm_rate_limiter.acquire()
-        return await self._session.post(url, **kwargs)
+        return _RateLimitedRequest(lambda: self._request("POST", url, **kwargs))
 
-    async def patch(self, url: str, **kwargs) -> ClientResponse:
+    def patch(self, url: str, **kwargs) -> _RateLimitedRequest:
         """PATCH запрос с rate limiting."""
-        await amocrm_rate_limiter.acquire()
-        return await self._session.patch(url, **kwargs)
+        return _RateLimitedRequest(lambda: self._request("PATCH", url, **kwargs))
 
-    async def put(self, url: str, **kwargs) -> ClientResponse:
+    def put(self, url: str, **kwargs) -> _RateLimitedRequest:
         """PUT запрос с rate limiting."""
-        await amocrm_rate_limiter.acquire()
-        return await self._session.put(url, **kwargs)
+        return _RateLimitedRequest(lambda: self._request("PUT", url, **kwargs))
 
-    async def delete(self, url: str, **kwargs) -> ClientResponse:
+    def delete(self, url: str, **kwargs) -> _RateLimitedRequest:
         """DELETE запрос с rate limiting."""
-        await amocrm_rate_limiter.acquire()
-        return await self._session.delete(url, **kwargs)
+        return _RateLimitedRequest(lambda: self._request("DELETE", url, **kwargs))
+
+    async def _request(self, method: str, url: str, **kwargs) -> Response:
+        if (
+            method == "GET"
+            and self._response_cache is not None
+            and is_cacheable_path(URL(url).path)
+        ):
+            return await self._cached_get(url, **kwargs)
+
+        return await self._send(method, url, **kwargs)
+
+    async def _send(self, method: str, url: str, **kwargs) -> ClientResponse:
+        """Запрос к AmoCRM через circuit breaker аккаунта и rate limiter."""
+        breaker = amocrm_circuit_breakers.get(_account_from_request(url, kwargs.get("headers")))
+        # Проверяем breaker до rate limiter'а, чтобы не тратить токены на заведомо неуспешные запросы
+        probe = breaker.before_request()
+
+        try:
+            await amocrm_rate_limiter.acquire()
+            response = await self._session.request(method, url, **kwargs)
+        except (ClientError, asyncio.TimeoutError):
+            breaker.record_failure(probe)
+            raise
+        except BaseException:
+            # Отмена и прочие ошибки не говорят о состоянии аккаунта
+            breaker.release(probe)
+            raise
+
+        if response.status in CIRCUIT_FAILURE_STATUSES:
+            breaker.record_failure(probe)
+        else:
+            breaker.record_success(probe)
+
+        return response
+
+    async def _cached_get(self, url: str, **kwargs) -> Response:
+        """
+        GET через кеш ответов: свежий ответ отдается без запроса,
+        устаревший перепроверяется условным запросом.
+        """
+        cache = self._response_cache
+        headers: Dict[str, str] = dict(kwargs.pop("headers", None) or {})
+        params = kwargs.get("params")
+
+        request_url = URL(url)
+        if params:
+            request_url = request_url.update_query(params)
+        # Host учитывается в ключе: субдомен может передаваться заголовком
+        key = f"{headers.get('Host', request_url.host)} {request_url}"
+
+        entry = await cache.get(key)
+        if entry is not None and entry["expires_at"] > time.time():
+            return CachedResponse(entry)
+
+        if entry is not None:
+            if entry["headers"].get("ETag"):
+                headers["If-None-Match"] = entry["headers"]["ETag"]
+            if entry["headers"].get("Last-Modified"):
+                headers["If-Modified-Since"] = entry["headers"]["Last-Modified"]
+
+        response = await self._send("GET", url, headers=headers, **kwargs)
+
+        if response.status == 304 and entry is not None:
+            response.release()
+            return CachedResponse(await cache.revalidated(key, entry))
+
+        if response.status != 200:
+            return response
+
+        body = await response.read()
+        response.release()
+
+        stored_headers = {
+            name: response.headers[name]
+            for name in ("Content-Type", "ETag", "Last-Modified")
+            if name in response.headers
+        }
+        return CachedResponse(await cache.put(key, response.status, stored_headers, body))
 
     def __getattr__(self, name: str) -> Any:
         """Проксируем все остальные атрибуты к оригинальной сессии."""
@@ -1,13 +1,31 @@
+import asyncio
 import ssl
-from typing import AsyncGenerator, Dict, Any, List
+from typing import AsyncGenerator, AsyncIterator, Dict, Any, List, Optional, Tuple
 
 from aiohttp import ClientSession, TCPConnector
 from fastapi import HTTPException
 
 import aiohttp
 
+from app.amocrm.circuit_breaker import CircuitBreakerOpenError
+from app.amocrm.rate_limiter import amocrm_rate_limiter
+from app.core.settings import config
 from app.core.logging import logger
 
+# AmoCRM позволяет получить до 250 сущностей за раз (filter[id][] и limit)
+LEADS_FILTER_LIMIT = 250
+
+# Размер буфера лидов при потоковом получении
+LEADS_STREAM_BUFFER = 1000
+
+# Максимальный размер страницы кастомных полей в AmoCRM
+CUSTOM_FIELDS_PAGE_LIMIT = 50
+
+
+def _api_url(subdomain: str, path: str) -> str:
+    """URL метода API аккаунта (базовый URL задается AMOCRM_API_BASE_URL)."""
+    return config.amocrm_cfg.API_BASE_URL.format(subdomain=subdomain) + path
+
 
 async def get_client_session() -> AsyncGenerator[aiohttp.ClientSession, None]:
     """Асинхронная сессия для запросов к AmoCRM (с отключенной проверкой SSL)"""
@@ -24,7 +42,7 @@ async def get_lead_by_id(
     lead_id: int, subdomain: str, headers: dict, client_session: ClientSession
 ) -> Dict[str, Any]:
     """Получение объекта лида по id"""
-    url = f"https://{subdomain}.amocrm.ru/api/v4/leads/{lead_id}"
+    url = _api_url(subdomain, f"/api/v4/leads/{lead_id}")
 
     try:
         async with client_session.get(url, headers=headers) as response:
@@ -50,6 +68,14 @@ async def get_lead_by_id(
                     detail=f"Failed to fetch lead with id {lead_id}. Error: {error_message}",
                 )
 
+    except HTTPException:
+        # Ошибки с уже выставленным статусом (404, 401 и т.д.) пробрасываем как есть
+        raise
+
+    except CircuitBreakerOpenError as breaker_err:
+        logger.warning("Запрос к AmoCRM отклонен circuit breaker'ом: %s", breaker_err)
+        raise HTTPException(status_code=503, detail="Service Unavailable - AmoCRM account is unavailable")
+
     except aiohttp.ClientError as client_err:
         logger.error("Сетевая ошибка при получении лида с id %s: %s", lead_id, client_err)
         raise HTTPException(status_code=502, detail="Bad Gateway - Error connecting to AmoCRM")
@@ -61,106 +87,306 @@ async def get_lead_by_id(
         )
 
 
-async def get_leads_by_ids(
-    lead_ids: List[int], subdomain: str, headers: dict, client_session: ClientSession
-) -> Dict[int, Dict[str, Any]]:
+async def _fetch_page(
+    url: str,
+    headers: dict,
+    client_session: ClientSession,
+    params: Optional[dict] = None,
+    entity_name: str = "leads",
+) -> Optional[Dict[str, Any]]:
     """
-    Получение нескольких лидов по их ID.
+    Получение одной страницы коллекции AmoCRM API.
 
     Args:
-        lead_ids: Список ID лидов
-        subdomain: Поддомен AmoCRM
-        headers: Заголовки для авторизации
-        client_session: HTTP сессия
+        url: URL коллекции (или href следующей страницы)
+        entity_name: Название сущностей для логов и текста ошибок
 
     Returns:
-        Словарь {lead_id: lead_data}
+        Распарсенный JSON ответа или None, если сущностей нет (204)
     """
-    if not lead_ids:
-        return {}
-
-    # AmoCRM позволяет получить до 250 лидов за раз через фильтр по ID
-    url = f"https://{subdomain}.amocrm.ru/api/v4/leads"
-
-    # Формируем параметры запроса с фильтром по ID
-    params = {}
-    for idx, lead_id in enumerate(lead_ids[:250]):  # Ограничиваем 250 лидами
-        params[f"filter[id][{idx}]"] = lead_id
-
     try:
         async with client_session.get(url, headers=headers, params=params) as response:
             if response.status == 200:
                 try:
-                    data = await response.json()
-                    leads = data.get("_embedded", {}).get("leads", [])
-
-                    # Преобразуем список лидов в словарь {id: lead_data}
-                    result = {lead["id"]: lead for lead in leads}
-
-                    logger.info("Получено %s лидов из %s запрошенных", len(result), len(lead_ids))
-                    return result
-
+                    return await response.json()
                 except Exception as json_err:
                     logger.error("Ошибка парсинга JSON из ответа: %s", json_err)
                     raise HTTPException(status_code=500, detail="Failed to parse server response")
             elif response.status == 204:
-                logger.info("Лиды не найдены (статус 204)")
-                return {}
+                logger.debug("Сущности %s не найдены (статус 204)", entity_name)
+                return None
             else:
                 error_message = await response.text()
                 logger.error(
-                    "Ошибка получения лидов (статус %s): %s",
+                    "Ошибка получения %s (статус %s): %s",
+                    entity_name,
                     response.status,
                     error_message,
                 )
                 raise HTTPException(
                     status_code=response.status,
-                    detail=f"Failed to fetch leads. Error: {error_message}",
+                    detail=f"Failed to fetch {entity_name}. Error: {error_message}",
                 )
 
+    except HTTPException:
+        # Ошибки с уже выставленным статусом (404, 401 и т.д.) пробрасываем как есть
+        raise
+
+    except CircuitBreakerOpenError as breaker_err:
+        logger.warning("Запрос к AmoCRM отклонен circuit breaker'ом: %s", breaker_err)
+        raise HTTPException(status_code=503, detail="Service Unavailable - AmoCRM account is unavailable")
+
     except aiohttp.ClientError as client_err:
-        logger.error("Сетевая ошибка при получении лидов: %s", client_err)
+        logger.error("Сетевая ошибка при получении %s: %s", entity_name, client_err)
         raise HTTPException(status_code=502, detail="Bad Gateway - Error connecting to AmoCRM")
 
     except Exception as e:
-        logger.error("Неожиданная ошибка при получении лидов: %s", e)
+        logger.error("Неожиданная ошибка при получении %s: %s", entity_name, e)
         raise HTTPException(
-            status_code=500, detail="Unexpected error while fetching leads"
+            status_code=500, detail=f"Unexpected error while fetching {entity_name}"
+        )
+
+
+async def _fetch_leads_page(
+    url: str, headers: dict, client_session: ClientSession, params: Optional[dict] = None
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Получение одной страницы списка лидов.
+
+    Returns:
+        Кортеж (лиды страницы, URL следующей страницы или None)
+    """
+    data = await _fetch_page(url, headers, client_session, params, entity_name="leads")
+    if data is None:
+        return [], None
+
+    leads = data.get("_embedded", {}).get("leads", [])
+    next_url = data.get("_links", {}).get("next", {}).get("href")
+    return leads, next_url
+
+
+async def get_leads_page(
+    subdomain: str,
+    headers: dict,
+    client_session: ClientSession,
+    page_url: Optional[str] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Страница списка всех сделок аккаунта (по 250 сделок) - для обхода аккаунта целиком.
+
+    Args:
+        page_url: URL следующей страницы из предыдущего вызова (None - первая страница)
+
+    Returns:
+        Кортеж (сделки страницы, URL следующей страницы или None)
+    """
+    if page_url is None:
+        return await _fetch_leads_page(
+            _api_url(subdomain, "/api/v4/leads"), headers, client_session, {"limit": LEADS_FILTER_LIMIT}
         )
+    return await _fetch_leads_page(page_url, headers, client_session)
+
+
+async def iter_leads_by_ids(
+    lead_ids: List[int],
+    subdomain: str,
+    headers: dict,
+    client_session: ClientSession,
+    concurrency: Optional[int] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Потоковое получение лидов по списку ID любого размера.
+
+    Список разбивается на пачки по 250 ID (лимит фильтра AmoCRM), пачки
+    запрашиваются параллельно с учетом пагинации _links.next. Лиды отдаются
+    по мере получения через ограниченную очередь, поэтому потребление памяти
+    не зависит от количества лидов. Порядок лидов не гарантируется.
+
+    Args:
+        lead_ids: Список ID лидов
+        subdomain: Поддомен AmoCRM
+        headers: Заголовки для авторизации
+        client_session: HTTP сессия (RateLimitedClientSession)
+        concurrency: Количество параллельно запрашиваемых пачек.
+            По умолчанию - burst rate limiter'а AmoCRM
+
+    Yields:
+        Данные лида
+
+    Example:
+        >>> async for lead in iter_leads_by_ids(ids, "example", headers, session):
+        ...     process(lead)
+    """
+    if not lead_ids:
+        return
+
+    url = _api_url(subdomain, "/api/v4/leads")
+    chunks = iter(
+        [lead_ids[i:i + LEADS_FILTER_LIMIT] for i in range(0, len(lead_ids), LEADS_FILTER_LIMIT)]
+    )
+    workers_count = concurrency or amocrm_rate_limiter.burst
+
+    # None в очереди - сигнал о завершении одного воркера
+    queue: asyncio.Queue = asyncio.Queue(maxsize=LEADS_STREAM_BUFFER)
+
+    async def worker() -> None:
+        try:
+            for chunk in chunks:
+                # limit обязателен: по умолчанию AmoCRM отдает только 50 сущностей на страницу
+                params = {"limit": LEADS_FILTER_LIMIT}
+                for idx, lead_id in enumerate(chunk):
+                    params[f"filter[id][{idx}]"] = lead_id
+
+                page_url: Optional[str] = url
+                while page_url:
+                    leads, page_url = await _fetch_leads_page(page_url, headers, client_session, params)
+                    # В next href параметры фильтра уже есть
+                    params = None
+                    for lead in leads:
+                        await queue.put(lead)
+        except asyncio.CancelledError:
+            # Потребитель остановился раньше (break, aclose, исключение): очередь
+            # никто не читает, и put сигнала завершения в полную очередь завис бы
+            raise
+        except Exception as e:
+            await queue.put(e)
+        await queue.put(None)
+
+    workers = [asyncio.create_task(worker()) for _ in range(workers_count)]
+    try:
+        finished = 0
+        while finished < len(workers):
+            item = await queue.get()
+            if item is None:
+                finished += 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield item
+    finally:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+
+async def get_leads_by_ids(
+    lead_ids: List[int], subdomain: str, headers: dict, client_session: ClientSession
+) -> Dict[int, Dict[str, Any]]:
+    """
+    Получение нескольких лидов по их ID.
+
+    Количество ID не ограничено: запросы разбиваются на пачки по 250 ID
+    (см. iter_leads_by_ids). Для больших списков лучше использовать
+    iter_leads_by_ids напрямую, чтобы не держать все лиды в памяти.
+
+    Args:
+        lead_ids: Список ID лидов
+        subdomain: Поддомен AmoCRM
+        headers: Заголовки для авторизации
+        client_session: HTTP сессия
+
+    Returns:
+        Словарь {lead_id: lead_data}
+    """
+    result = {}
+    async for lead in iter_leads_by_ids(lead_ids, subdomain, headers, client_session):
+        result[lead["id"]] = lead
+
+    logger.info("Получено %s лидов из %s запрошенных", len(result), len(lead_ids))
+    return result
+
+
+async def get_custom_fields(
+    entity_type: str, subdomain: str, headers: dict, client_session: ClientSession
+) -> List[Dict[str, Any]]:
+    """
+    Получение всех кастомных полей сущности (все страницы).
+
+    Первая страница запрашивается сразу, остальные - параллельно, если AmoCRM
+    сообщает количество страниц (_page_count / _total_items), иначе
+    последовательно по _links.next.
+
+    Args:
+        entity_type: Тип сущности: leads, contacts или companies
+        subdomain: Поддомен AmoCRM
+        headers: Заголовки для авторизации
+        client_session: HTTP сессия
+
+    Returns:
+        Список полей с их метаданными
+    """
+    url = _api_url(subdomain, f"/api/v4/{entity_type}/custom_fields")
+    entity_name = f"{entity_type} custom fields"
+
+    data = await _fetch_page(
+        url, headers, client_session, {"limit": CUSTOM_FIELDS_PAGE_LIMIT}, entity_name=entity_name
+    )
+    if data is None:
+        return []
+
+    fields = data.get("_embedded", {}).get("custom_fields", [])
+    next_url = data.get("_links", {}).get("next", {}).get("href")
+
+    page_count = data.get("_page_count")
+    if page_count is None and data.get("_total_items") is not None:
+        page_count = -(-data["_total_items"] // CUSTOM_FIELDS_PAGE_LIMIT)
+
+    if next_url and page_count:
+        # Количество страниц известно - запрашиваем оставшиеся параллельно
+        pages = await asyncio.gather(*(
+            _fetch_page(
+                url,
+                headers,
+                client_session,
+                {"limit": CUSTOM_FIELDS_PAGE_LIMIT, "page": page},
+                entity_name=entity_name,
+            )
+            for page in range(2, page_count + 1)
+        ))
+        for page_data in pages:
+            if page_data is not None:
+                fields.extend(page_data.get("_embedded", {}).get("custom_fields", []))
+    else:
+        while next_url:
+            page_data = await _fetch_page(next_url, headers, client_session, entity_name=entity_name)
+            if page_data is None:
+                break
+            fields.extend(page_data.get("_embedded", {}).get("custom_fields", []))
+            next_url = page_data.get("_links", {}).get("next", {}).get("href")
+
+    logger.info("Получено %s кастомных полей для %s", len(fields), entity_type)
+    return fields
+
+
+async def get_pipelines(
+    subdomain: str, headers: dict, client_session: ClientSession
+) -> List[Dict[str, Any]]:
+    """
+    Получение воронок сделок вместе со статусами (_embedded.statuses).
+
+    AmoCRM отдает все воронки одной страницей (не более 50 воронок в аккаунте).
+
+    Returns:
+        Список воронок
+    """
+    url = _api_url(subdomain, "/api/v4/leads/pipelines")
+
+    data = await _fetch_page(url, headers, client_session, entity_name="pipelines")
+    if data is None:
+        return []
+
+    pipelines = data.get("_embedded", {}).get("pipelines", [])
+    logger.info("Получено %s воронок", len(pipelines))
+    return pipelines
 
 
 async def get_custom_fields_for_leads(
     subdomain: str, headers: dict, client_session: ClientSession
 ) -> List[Dict[str, Any]]:
     """
-    Получение списка кастомных полей для лидов.
+    Получение списка кастомных полей для лидов (все страницы).
 
     Returns:
         Список полей с их метаданными
     """
-    url = f"https://{subdomain}.amocrm.ru/api/v4/leads/custom_fields"
-
-    try:
-        async with client_session.get(url, headers=headers) as response:
-            if response.status == 200:
-                try:
-                    data = await response.json()
-                    fields = data.get("_embedded", {}).get("custom_fields", [])
-                    logger.info("Получено %s кастомных полей для лидов", len(fields))
-                    return fields
-                except Exception as json_err:
-                    logger.error("Ошибка парсинга JSON: %s", json_err)
-                    raise HTTPException(status_code=500, detail="Failed to parse server response")
-            else:
-                error_message = await response.text()
-                logger.error("Ошибка получения полей (статус %s): %s", response.status, error_message)
-                raise HTTPException(
-                    status_code=response.status,
-                    detail=f"Failed to fetch custom fields. Error: {error_message}",
-                )
-    except aiohttp.ClientError as client_err:
-        logger.error("Сетевая ошибка при получении полей: %s", client_err)
-        raise HTTPException(status_code=502, detail="Bad Gateway - Error connecting to AmoCRM")
-    except Exception as e:
-        logger.error("Неожиданная ошибка при получении полей: %s", e)
-        raise HTTPException(status_code=500, detail="Internal server error")
+    return await get_custom_fields("leads", subdomain, headers, client_session)
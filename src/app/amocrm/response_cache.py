@@ -0,0 +1,232 @@
+"""
+Кеш ответов AmoCRM API для редко меняющихся GET эндпоинтов.
+
+Ответы хранятся в памяти процесса и (опционально) в SQLite файле, общем
+для всех процессов хоста. Свежие ответы отдаются без запроса к AmoCRM и
+без расхода токенов rate limiter'а. Устаревшие ответы перепроверяются
+условным запросом (If-None-Match / If-Modified-Since), если AmoCRM
+прислал ETag или Last-Modified.
+"""
+
+import asyncio
+import json
+import re
+import sqlite3
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+from app.core.settings import config
+from app.core.logging import logger
+from app.utils.sqlite_files import create_private_db_file, restrict_db_files
+
+# Эндпоинты, ответы которых можно кешировать (метаданные аккаунта)
+CACHEABLE_PATHS = (
+    re.compile(r"/api/v4/(leads|contacts|companies)/custom_fields/?$"),
+    re.compile(r"/api/v4/leads/pipelines/?$"),
+)
+
+# Максимальное количество ответов в памяти процесса
+MEMORY_CACHE_SIZE = 1000
+
+
+def is_cacheable_path(path: str) -> bool:
+    """Можно ли кешировать ответы для указанного пути URL."""
+    return any(pattern.search(path) for pattern in CACHEABLE_PATHS)
+
+
+class CachedResponse:
+    """
+    Ответ из кеша с тем же интерфейсом, что использует код поверх
+    aiohttp.ClientResponse (status, headers, json(), text(), read()).
+    """
+
+    from_cache = True
+
+    def __init__(self, entry: Dict[str, Any]):
+        self.status = entry["status"]
+        self.headers = entry["headers"]
+        self._body: bytes = entry["body"]
+
+    async def read(self) -> bytes:
+        return self._body
+
+    async def text(self, encoding: str = "utf-8") -> str:
+        return self._body.decode(encoding)
+
+    async def json(self, **kwargs) -> Any:
+        return json.loads(self._body) if self._body else None
+
+    def release(self) -> None:
+        pass
+
+    async def __aenter__(self) -> "CachedResponse":
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        pass
+
+
+class ResponseCache:
+    """
+    Двухуровневый кеш ответов: LRU в памяти и SQLite файл.
+
+    Запись кеша: {"status", "headers", "body", "expires_at"}, где headers
+    содержит только Content-Type, ETag и Last-Modified.
+    """
+
+    def __init__(self, ttl: int, path: Optional[str] = None, memory_size: int = MEMORY_CACHE_SIZE):
+        """
+        Args:
+            ttl: Время жизни ответа в секундах
+            path: Путь к SQLite файлу. None - только кеш в памяти
+            memory_size: Максимальное количество ответов в памяти
+        """
+        self.ttl = ttl
+        self.path = path
+        self._memory_size = memory_size
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+        if self.path:
+            self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=5, isolation_level=None)
+
+    def _init_db(self) -> None:
+        # Тела ответов AmoCRM (в том числе в -wal) - доступ только владельцу
+        create_private_db_file(self.path)
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    status INTEGER NOT NULL,
+                    headers TEXT NOT NULL,
+                    body BLOB NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+                """
+            )
+
+        restrict_db_files(self.path)
+
+    def _get_from_db(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT status, headers, body, expires_at FROM responses WHERE key = ?",
+                (key,),
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        return {
+            "status": row[0],
+            "headers": json.loads(row[1]),
+            "body": bytes(row[2]),
+            "expires_at": row[3],
+        }
+
+    def _put_to_db(self, key: str, entry: Dict[str, Any]) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, status, headers, body, expires_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, entry["status"], json.dumps(entry["headers"]), entry["body"], entry["expires_at"]),
+            )
+
+    def _delete_from_db(self, prefix: str) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM responses WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
+
+    def _remember(self, key: str, entry: Dict[str, Any]) -> None:
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._memory_size:
+            self._memory.popitem(last=False)
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Запись кеша по ключу (в том числе устаревшая - для перепроверки).
+
+        Returns:
+            Запись кеша или None
+        """
+        entry = self._memory.get(key)
+        if entry is not None:
+            self._memory.move_to_end(key)
+            # Другой процесс мог уже обновить запись в общем файле
+            if entry["expires_at"] > time.time() or not self.path:
+                return entry
+
+        if self.path:
+            try:
+                stored = await asyncio.to_thread(self._get_from_db, key)
+            except sqlite3.Error as e:
+                logger.warning("Ошибка чтения кеша ответов AmoCRM: %s", e)
+                stored = None
+
+            if stored is not None and (entry is None or stored["expires_at"] > entry["expires_at"]):
+                self._remember(key, stored)
+                return stored
+
+        return entry
+
+    async def put(self, key: str, status: int, headers: Dict[str, str], body: bytes) -> Dict[str, Any]:
+        """Сохранение ответа с TTL кеша."""
+        entry = {
+            "status": status,
+            "headers": headers,
+            "body": body,
+            "expires_at": time.time() + self.ttl,
+        }
+        self._remember(key, entry)
+
+        if self.path:
+            try:
+                await asyncio.to_thread(self._put_to_db, key, entry)
+            except sqlite3.Error as e:
+                logger.warning("Ошибка записи кеша ответов AmoCRM: %s", e)
+
+        return entry
+
+    async def invalidate(self, prefix: str) -> None:
+        """
+        Удаление ответов, ключ которых начинается с prefix.
+
+        Ключ имеет вид "<host> <url>", поэтому prefix "example.amocrm.ru "
+        сбрасывает все ответы аккаунта.
+        """
+        for key in [key for key in self._memory if key.startswith(prefix)]:
+            del self._memory[key]
+
+        if self.path:
+            try:
+                await asyncio.to_thread(self._delete_from_db, prefix)
+            except sqlite3.Error as e:
+                logger.warning("Ошибка очистки кеша ответов AmoCRM: %s", e)
+
+    async def revalidated(self, key: str, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """Продление TTL записи после ответа 304 Not Modified."""
+        return await self.put(key, entry["status"], entry["headers"], entry["body"])
+
+
+@lru_cache(maxsize=1)
+def get_response_cache() -> Optional[ResponseCache]:
+    """
+    Кеш ответов AmoCRM из конфигурации.
+
+    Returns:
+        ResponseCache или None, если AMOCRM_RESPONSE_CACHE_TTL = 0
+    """
+    if config.amocrm_cfg.RESPONSE_CACHE_TTL <= 0:
+        return None
+
+    return ResponseCache(
+        ttl=config.amocrm_cfg.RESPONSE_CACHE_TTL,
+        path=config.amocrm_cfg.RESPONSE_CACHE_PATH or None,
+    )
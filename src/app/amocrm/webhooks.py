@@ -0,0 +1,356 @@
+"""
+Обработка вебхуков AmoCRM: разбор payload и пакетное применение событий.
+
+HTTP приемник проверяет токен аккаунта в URL вебхука, публикует сырое тело
+в очередь и сразу отвечает AmoCRM.
+Воркер разбирает payload в события и накапливает их по субдоменам в
+WebhookBatcher; по истечении короткого окна (или при заполнении пачки)
+события передаются всем зарегистрированным обработчикам (sink) одним вызовом.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import re
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qsl
+
+from app.amocrm.metadata import metadata_cache
+from app.amocrm.response_cache import get_response_cache
+from app.core.settings import config
+from app.core.logging import logger
+
+# Сущности, события которых обрабатываются
+WEBHOOK_ENTITY_TYPES = ("leads", "contacts", "companies")
+
+# Обработчик пачки событий одного субдомена
+WebhookSink = Callable[[str, List[Dict[str, Any]]], Awaitable[None]]
+
+_KEY_PART = re.compile(r"\[([^\]]*)\]")
+
+
+def _to_int(value: Any) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _listify(node: Any) -> Any:
+    """Словари с числовыми ключами ("0", "1", ...) превращаем в списки."""
+    if not isinstance(node, dict):
+        return node
+
+    items = {key: _listify(value) for key, value in node.items()}
+    if items and all(key.isdigit() for key in items):
+        return [items[key] for key in sorted(items, key=int)]
+    return items
+
+
+def parse_form_payload(body: str) -> Dict[str, Any]:
+    """
+    Разбор form-urlencoded тела вебхука AmoCRM во вложенную структуру.
+
+    "leads[update][0][id]=1" -> {"leads": {"update": [{"id": "1"}]}}
+    """
+    result: Dict[str, Any] = {}
+
+    for key, value in parse_qsl(body, keep_blank_values=True):
+        head, _, rest = key.partition("[")
+        parts = [head] + _KEY_PART.findall("[" + rest) if rest else [head]
+
+        node = result
+        for part in parts[:-1]:
+            child = node.get(part)
+            if not isinstance(child, dict):
+                child = {}
+                node[part] = child
+            node = child
+        node[parts[-1]] = value
+
+    return _listify(result)
+
+
+def parse_webhook(body: str) -> Tuple[Optional[str], List[Dict[str, Any]]]:
+    """
+    Разбор вебхука AmoCRM в список событий.
+
+    Returns:
+        Кортеж (субдомен, события). Событие:
+        {"entity": "leads", "action": "update", "id": 1, "pipeline_id": 2,
+         "status_id": 3, "tags": ["d1"], "data": {...}}
+    """
+    payload = parse_form_payload(body)
+    account = payload.get("account") or {}
+    subdomain = account.get("subdomain") if isinstance(account, dict) else None
+
+    events = []
+    for entity in WEBHOOK_ENTITY_TYPES:
+        actions = payload.get(entity)
+        if not isinstance(actions, dict):
+            continue
+
+        for action, items in actions.items():
+            if isinstance(items, dict):
+                items = [items]
+            if not isinstance(items, list):
+                continue
+
+            for item in items:
+                if not isinstance(item, dict):
+                    continue
+
+                tags = item.get("tags") or []
+                if isinstance(tags, dict):
+                    tags = [tags]
+
+                events.append({
+                    "entity": entity,
+                    "action": action,
+                    "id": _to_int(item.get("id")),
+                    "pipeline_id": _to_int(item.get("pipeline_id")),
+                    "status_id": _to_int(item.get("status_id")),
+                    "tags": [tag.get("name") for tag in tags if isinstance(tag, dict) and tag.get("name")],
+                    "data": item,
+                })
+
+    return subdomain, events
+
+
+def webhook_token(subdomain: str) -> str:
+    """
+    Токен вебхуков аккаунта: HMAC-SHA256 субдомена с секретом AMOCRM_WEBHOOK_SECRET.
+
+    Raises:
+        ValueError: Секрет не задан
+    """
+    secret = config.amocrm_cfg.WEBHOOK_SECRET
+    if not secret:
+        raise ValueError("AMOCRM_WEBHOOK_SECRET is not set")
+    return hmac.new(secret.encode("utf-8"), subdomain.lower().encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def is_valid_webhook_token(subdomain: str, token: Optional[str]) -> bool:
+    """Токен вебхука выдан для этого субдомена (без секрета вебхуки не принимаются)."""
+    if not config.amocrm_cfg.WEBHOOK_SECRET or not token:
+        return False
+    return hmac.compare_digest(token, webhook_token(subdomain))
+
+
+class WebhookBatcher:
+    """
+    Накопление событий вебхуков по субдоменам и пакетная передача в sink'и.
+
+    add() возвращается после того, как пачка с событиями обработана всеми
+    sink'ами, поэтому сообщение из очереди подтверждается только после
+    применения событий. При ошибке любого sink'а ошибку получают все
+    сообщения пачки, поэтому sink'и должны быть идемпотентными.
+
+    Пачки одного субдомена обрабатываются последовательно: следующая пачка
+    ждет окончания предыдущей, поэтому события применяются в порядке получения.
+    """
+
+    def __init__(
+        self,
+        window: Optional[float] = None,
+        max_size: Optional[int] = None,
+        sinks: Optional[List[WebhookSink]] = None,
+    ):
+        """
+        Args:
+            window: Окно накопления событий в секундах (по умолчанию из конфигурации)
+            max_size: Размер пачки, при котором она обрабатывается сразу
+            sinks: Обработчики пачек событий
+        """
+        self.window = window if window is not None else config.worker_cfg.WEBHOOK_BATCH_WINDOW
+        self.max_size = max_size if max_size is not None else config.worker_cfg.WEBHOOK_BATCH_MAX_SIZE
+        self._sinks: List[WebhookSink] = list(sinks or [])
+
+        self._events: Dict[str, List[Dict[str, Any]]] = {}
+        self._results: Dict[str, asyncio.Future] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._lock_users: Dict[str, int] = {}
+        # Обработки, запущенные таймерами (ссылки держатся до завершения)
+        self._flush_tasks: Set[asyncio.Task] = set()
+
+    def add_sink(self, sink: WebhookSink) -> WebhookSink:
+        """Регистрация обработчика пачек (можно использовать как декоратор)."""
+        self._sinks.append(sink)
+        return sink
+
+    async def add(self, subdomain: str, events: List[Dict[str, Any]]) -> None:
+        """
+        Добавление событий в пачку субдомена и ожидание ее обработки.
+
+        Raises:
+            Exception: Ошибка sink'а, обработавшего пачку
+        """
+        if not events:
+            return
+
+        batch = self._events.setdefault(subdomain, [])
+        batch.extend(events)
+
+        result = self._results.get(subdomain)
+        if result is None:
+            result = asyncio.get_running_loop().create_future()
+            self._results[subdomain] = result
+
+        if len(batch) >= self.max_size:
+            self._schedule_flush(subdomain, delay=0)
+        elif subdomain not in self._timers:
+            self._schedule_flush(subdomain, delay=self.window)
+
+        await asyncio.shield(result)
+
+    def _schedule_flush(self, subdomain: str, delay: float) -> None:
+        timer = self._timers.pop(subdomain, None)
+        if timer is not None:
+            timer.cancel()
+
+        loop = asyncio.get_running_loop()
+        self._timers[subdomain] = loop.call_later(delay, self._start_flush, subdomain)
+
+    def _start_flush(self, subdomain: str) -> None:
+        task = asyncio.ensure_future(self.flush(subdomain))
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def flush(self, subdomain: str) -> None:
+        """Немедленная обработка накопленной пачки субдомена."""
+        timer = self._timers.pop(subdomain, None)
+        if timer is not None:
+            timer.cancel()
+
+        events = self._events.pop(subdomain, None)
+        result = self._results.pop(subdomain, None)
+        if not events or result is None:
+            return
+
+        # Пачка, собранная во время обработки предыдущей, ждет ее окончания
+        lock = self._locks.setdefault(subdomain, asyncio.Lock())
+        self._lock_users[subdomain] = self._lock_users.get(subdomain, 0) + 1
+        try:
+            async with lock:
+                error = await self._run_sinks(subdomain, events)
+        finally:
+            self._lock_users[subdomain] -= 1
+            if not self._lock_users[subdomain]:
+                del self._lock_users[subdomain]
+                del self._locks[subdomain]
+
+        if not result.done():
+            if error is None:
+                result.set_result(None)
+            else:
+                result.set_exception(error)
+
+    async def _run_sinks(self, subdomain: str, events: List[Dict[str, Any]]) -> Optional[BaseException]:
+        """Передача пачки всем sink'ам. Returns: первая ошибка sink'а или None."""
+        logger.info("Обработка пачки вебхуков | subdomain: %s, events: %s", subdomain, len(events))
+
+        error: Optional[BaseException] = None
+        for sink in self._sinks:
+            try:
+                await sink(subdomain, events)
+            except Exception as e:
+                logger.error(
+                    "Ошибка обработки пачки вебхуков | subdomain: %s, sink: %s, error: %s",
+                    subdomain,
+                    getattr(sink, "__name__", sink),
+                    e,
+                )
+                error = error or e
+        return error
+
+    async def flush_all(self) -> None:
+        """Обработка всех накопленных пачек и ожидание начатых обработок (при остановке воркера)."""
+        await asyncio.gather(
+            *(self.flush(subdomain) for subdomain in list(self._events)),
+            *list(self._flush_tasks),
+        )
+
+
+async def invalidate_stale_metadata(subdomain: str, events: List[Dict[str, Any]]) -> None:
+    """
+    Sink: сбрасывает метаданные аккаунта, если события ссылаются на
+    неизвестные воронки или статусы (их создали после загрузки метаданных).
+    """
+    metadata = metadata_cache.peek(subdomain)
+    if metadata is None:
+        return
+
+    pipelines = {pipeline["id"] for pipeline in metadata.get("pipelines", [])}
+    statuses = {
+        status["id"]
+        for pipeline in metadata.get("pipelines", [])
+        for status in pipeline.get("statuses", [])
+    }
+
+    unknown = any(
+        (event["pipeline_id"] is not None and event["pipeline_id"] not in pipelines)
+        or (event["status_id"] is not None and event["status_id"] not in statuses)
+        for event in events
+    )
+    if not unknown:
+        return
+
+    logger.info("Вебхук ссылается на неизвестную воронку или статус, сбрасываем метаданные | subdomain: %s", subdomain)
+    metadata_cache.invalidate(subdomain)
+
+    response_cache = get_response_cache()
+    if response_cache is not None:
+        await response_cache.invalidate(f"{subdomain}.amocrm.ru ")
+
+
+async def index_lead_events(subdomain: str, events: List[Dict[str, Any]]) -> None:
+    """
+    Sink: обновляет индекс сделок (lead_index) и пересчитывает скрытые
+    наборы менеджеров только для изменившихся сделок. В пачки попадают
+    только вебхуки с проверенным токеном аккаунта (handle_amocrm_webhook).
+    """
+    # Последнее событие по сделке в пачке определяет ее состояние
+    changed: Dict[int, Dict[str, Any]] = {}
+    deleted: Dict[int, bool] = {}
+    for event in events:
+        if event["entity"] != "leads" or event["id"] is None:
+            continue
+        if event["action"] == "delete":
+            deleted[event["id"]] = True
+            changed.pop(event["id"], None)
+        else:
+            deleted.pop(event["id"], None)
+            changed[event["id"]] = {
+                "lead_id": event["id"],
+                "pipeline_id": event["pipeline_id"],
+                "tags": event["tags"],
+            }
+
+    if not changed and not deleted:
+        return
+
+    # Импорт внутри, чтобы модуль можно было использовать без БД
+    from app.db.async_session import async_session
+    from app.services.lead_index_service import (
+        delete_leads,
+        recompute_hidden_for_leads,
+        upsert_leads,
+    )
+
+    async with async_session() as session:
+        await delete_leads(subdomain, list(deleted), session, commit=False)
+        await upsert_leads(subdomain, list(changed.values()), session, commit=False)
+        await recompute_hidden_for_leads(subdomain, list(changed), session, commit=False)
+        await session.commit()
+
+    logger.info(
+        "Индекс сделок обновлен по вебхукам | subdomain: %s, changed: %s, deleted: %s",
+        subdomain,
+        len(changed),
+        len(deleted),
+    )
+
+
+# Глобальный батчер вебхуков процесса
+webhook_batcher = WebhookBatcher(sinks=[invalidate_stale_metadata, index_lead_events])
@@ -1,7 +1,10 @@
 from fastapi import APIRouter
-from app.api.api_v1.endpoints import healthcheck, permissions
+from app.api.api_v1.endpoints import healthcheck, hidden_leads, metadata, permissions, webhooks
 
 api_router = APIRouter()
 
 api_router.include_router(healthcheck.router)
 api_router.include_router(permissions.router, prefix="/api", tags=["permissions"])
+api_router.include_router(metadata.router, prefix="/api", tags=["metadata"])
+api_router.include_router(hidden_leads.router, prefix="/api", tags=["hidden-leads"])
+api_router.include_router(webhooks.router, prefix="/webhooks", tags=["webhooks"])
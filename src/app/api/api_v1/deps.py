@@ -0,0 +1,27 @@
+from typing import Optional
+from fastapi import Header, HTTPException, status
+from app.core.broker.config import PRIORITY_BULK, PRIORITY_INTERACTIVE
+
+# Значения заголовка X-Request-Priority -> приоритет RPC сообщения
+REQUEST_PRIORITIES = {
+    "interactive": PRIORITY_INTERACTIVE,
+    "bulk": PRIORITY_BULK,
+}
+
+
+def request_priority(
+    x_request_priority: Optional[str] = Header(None, description="interactive (по умолчанию) или bulk")
+) -> int:
+    """
+    Приоритет RPC запроса по заголовку X-Request-Priority.
+
+    Запросы виджета идут с высоким приоритетом, массовые и административные
+    операции (bulk) - с низким, чтобы не задерживать пользователей.
+    """
+    value = (x_request_priority or "interactive").strip().lower()
+    if value not in REQUEST_PRIORITIES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"X-Request-Priority must be one of: {', '.join(REQUEST_PRIORITIES)}"
+        )
+    return REQUEST_PRIORITIES[value]
@@ -1,16 +1,16 @@
 """
 Health check endpoint через RabbitMQ RPC.
 """
+
 from fastapi import APIRouter
 
 from app.core.logging import logger
-from app.core.broker.app import broker
-from app.core.broker.config import QueueNames
+from app.core.broker.codec import decode
+from app.core.broker.rpc_client import rpc_client
+from app.core.broker.config import QueueNames, deadline_options, rpc_timeout
 
 router = APIRouter(tags=["Health (RPC Proxy)"])
 
-RPC_TIMEOUT = 10.0
-
 
 @router.get("/health")
 async def health_check():
@@ -22,11 +22,12 @@ async def health_check():
     """
     logger.info("HTTP -> RabbitMQ RPC: health check")
 
-    response = await broker.publish(
+    timeout = rpc_timeout(QueueNames.HEALTH)
+    response_msg = await rpc_client.request(
         {},
         queue=QueueNames.HEALTH,
-        rpc=True,
-        rpc_timeout=RPC_TIMEOUT,
+        timeout=timeout,
+        **deadline_options(timeout),
     )
 
-    return response
+    return decode(response_msg.body, response_msg.content_type)
@@ -0,0 +1,62 @@
+from fastapi import APIRouter, Depends, Query, HTTPException, status
+from typing import Dict, Any, Optional
+from app.schemas.permissions import APIResponse
+from app.api.api_v1.deps import request_priority
+from app.core.broker.codec import decode
+from app.core.broker.rpc_client import rpc_client
+from app.core.broker.config import QueueNames, deadline_options, rpc_timeout
+
+router = APIRouter()
+
+
+@router.get("/hidden-leads/{subdomain}", response_model=APIResponse)
+async def get_hidden_leads(
+    subdomain: str,
+    manager_id: int = Query(..., description="ID менеджера", gt=0),
+    lead_id: Optional[int] = Query(None, description="Проверить одну сделку", gt=0),
+    after: int = Query(0, description="Вернуть сделки с ID больше указанного", ge=0),
+    limit: int = Query(10000, description="Размер страницы", gt=0, le=10000),
+    priority: int = Depends(request_priority),
+) -> Dict[str, Any]:
+    """
+    Сделки, скрытые от менеджера правилами pipelines и tags_logic.
+    С lead_id - проверка одной сделки, без него - постраничный список ID
+    (следующая страница: after=next_after).
+    """
+    try:
+        timeout = rpc_timeout(QueueNames.HIDDEN_LEADS_GET)
+        response_msg = await rpc_client.request(
+            {
+                "subdomain": subdomain,
+                "manager_id": manager_id,
+                "lead_id": lead_id,
+                "after": after,
+                "limit": limit,
+            },
+            queue=QueueNames.HIDDEN_LEADS_GET,
+            timeout=timeout,
+            priority=priority,
+            subdomain=subdomain,
+            **deadline_options(timeout),
+        )
+
+        # Десериализация ответа
+        response = decode(response_msg.body, response_msg.content_type)
+
+        if not response or not response.get("success"):
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=response.get("error", "Failed to fetch hidden leads")
+            )
+
+        return {
+            "success": True,
+            "data": response.get("data")
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
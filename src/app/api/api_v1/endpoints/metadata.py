@@ -0,0 +1,53 @@
+from fastapi import APIRouter, Depends, Query, HTTPException, status
+from typing import Dict, Any
+from app.schemas.permissions import APIResponse
+from app.api.api_v1.deps import request_priority
+from app.core.broker.codec import decode
+from app.core.broker.rpc_client import rpc_client
+from app.core.broker.config import QueueNames, deadline_options, rpc_timeout
+
+router = APIRouter()
+
+
+@router.get("/metadata/{subdomain}", response_model=APIResponse)
+async def get_metadata(
+    subdomain: str,
+    refresh: bool = Query(False, description="Перезагрузить метаданные из AmoCRM"),
+    priority: int = Depends(request_priority),
+) -> Dict[str, Any]:
+    """
+    Получение метаданных аккаунта AmoCRM: кастомные поля сделок, контактов
+    и компаний, воронки и статусы. Отдаются из кеша, refresh=true
+    принудительно обновляет их.
+    """
+    try:
+        timeout = rpc_timeout(QueueNames.METADATA_GET)
+        response_msg = await rpc_client.request(
+            {"subdomain": subdomain, "refresh": refresh},
+            queue=QueueNames.METADATA_GET,
+            timeout=timeout,
+            priority=priority,
+            subdomain=subdomain,
+            **deadline_options(timeout),
+        )
+
+        # Десериализация ответа
+        response = decode(response_msg.body, response_msg.content_type)
+
+        if not response or not response.get("success"):
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail=response.get("error", "Failed to fetch metadata")
+            )
+
+        return {
+            "success": True,
+            "data": response.get("data")
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
@@ -1,33 +1,64 @@
-import json
-from fastapi import APIRouter, Query, HTTPException, status
-from typing import Dict, Any
+from fastapi import APIRouter, Depends, Header, Query, HTTPException, status
+from fastapi.responses import JSONResponse
+from typing import Dict, Any, Optional
 from app.schemas.permissions import (
     SaveSettingsRequest,
-    GetSettingsResponse,
-    DeleteSettingsRequest,
+    BatchSettingsRequest,
     APIResponse,
 )
-from app.core.broker.app import broker
-from app.core.broker.config import QueueNames, RPC_TIMEOUT
+from app.api.api_v1.deps import request_priority
+from app.core.broker.codec import decode
+from app.core.broker.rpc_client import rpc_client
+from app.core.broker.config import QueueNames, deadline_options, rpc_timeout, settings_write_options
+from app.utils.id_set_codec import BLOOM, DELTA_VARINT, encode_hidden
 
 router = APIRouter()
 
+# Media types компактного кодирования списков скрытых ID (см. app.utils.id_set_codec)
+HIDDEN_MEDIA_TYPES = {
+    "application/vnd.hiding-data.delta+json": DELTA_VARINT,
+    "application/vnd.hiding-data.bloom+json": BLOOM,
+}
+
+
+def _negotiate_hidden_encoding(accept: Optional[str]) -> tuple[str, str]:
+    """
+    Выбор кодирования скрытых ID по заголовку Accept.
+
+    Returns:
+        Кортеж (кодирование, media type ответа)
+    """
+    for media_range in (accept or "").split(","):
+        media_type = media_range.split(";", 1)[0].strip().lower()
+        if media_type in HIDDEN_MEDIA_TYPES:
+            return HIDDEN_MEDIA_TYPES[media_type], media_type
+    return "json", "application/json"
+
 
 @router.post("/settings", response_model=APIResponse)
-async def save_settings(request: SaveSettingsRequest) -> Dict[str, Any]:
+async def save_settings(
+    request: SaveSettingsRequest,
+    priority: int = Depends(request_priority),
+) -> Dict[str, Any]:
     """
     Сохранение настроек permissions для менеджера.
     Если настройки уже существуют - удаляет старые и создаёт новые.
     """
     try:
-        response_msg = await broker.request(
-            request.model_dump(),
+        timeout = rpc_timeout(QueueNames.SETTINGS_SAVE)
+        response_msg = await rpc_client.request(
+            request.model_dump(mode="json"),
             queue=QueueNames.SETTINGS_SAVE,
-            timeout=RPC_TIMEOUT,
+            timeout=timeout,
+            priority=priority,
+            subdomain=request.subdomain,
+            # Запрос уже провалидирован FastAPI - воркер не валидирует его повторно
+            trusted=True,
+            **settings_write_options(timeout),
         )
 
-        # Десериализация ответа из RabbitMessage
-        response = json.loads(response_msg.body)
+        # Десериализация ответа
+        response = decode(response_msg.body, response_msg.content_type)
 
         if not response or not response.get("success"):
             raise HTTPException(
@@ -46,28 +77,99 @@ async def save_settings(request: SaveSettingsRequest) -> Dict[str, Any]:
         )
 
 
+@router.post("/settings/batch", response_model=APIResponse)
+async def batch_settings(
+    request: BatchSettingsRequest,
+    accept: Optional[str] = Header(None),
+    priority: int = Depends(request_priority),
+) -> JSONResponse:
+    """
+    Пакет операций get/save/delete с настройками одним RPC запросом.
+
+    Операции выполняются воркером по порядку в одной сессии БД, data -
+    массив результатов в порядке операций ({"success", "data"} или
+    {"success": false, "error"}). Ошибка одной операции не отменяет остальные.
+    Скрытые ID в результатах get кодируются по заголовку Accept, как в GET /settings.
+    """
+    try:
+        # Субдомен в заголовке - для логов воркера, если все операции одного аккаунта
+        subdomains = {operation.subdomain for operation in request.operations}
+
+        timeout = rpc_timeout(QueueNames.SETTINGS_BATCH)
+        response_msg = await rpc_client.request(
+            request.model_dump(mode="json"),
+            queue=QueueNames.SETTINGS_BATCH,
+            timeout=timeout,
+            priority=priority,
+            subdomain=subdomains.pop() if len(subdomains) == 1 else "multiple",
+            **settings_write_options(timeout),
+        )
+
+        # Десериализация ответа
+        response = decode(response_msg.body, response_msg.content_type)
+
+        if not response or not response.get("success"):
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=response.get("error", "Failed to process batch")
+            )
+
+        results = response.get("data") or []
+        encoding, media_type = _negotiate_hidden_encoding(accept)
+        for result in results:
+            data = result.get("data")
+            if data and data.get("hidden"):
+                data["hidden"] = encode_hidden(data["hidden"], encoding)
+
+        return JSONResponse(
+            {"success": True, "data": results},
+            media_type=media_type,
+            headers={"Vary": "Accept"},
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+
 @router.get("/settings/{subdomain}", response_model=APIResponse)
 async def get_settings(
     subdomain: str,
-    manager_id: int = Query(..., description="ID менеджера", gt=0)
-) -> Dict[str, Any]:
+    manager_id: int = Query(..., description="ID менеджера", gt=0),
+    include_leads: bool = Query(False, description="Добавить в hidden скрытые сделки из индекса"),
+    accept: Optional[str] = Header(None),
+    priority: int = Depends(request_priority),
+) -> JSONResponse:
     """
-    Получение настроек permissions для менеджера
+    Получение настроек permissions для менеджера.
+
+    Списки скрытых ID в hidden кодируются по заголовку Accept:
+    application/vnd.hiding-data.delta+json - delta+varint в base64,
+    application/vnd.hiding-data.bloom+json - фильтр Блума для очень больших
+    множеств (остальные - delta+varint), иначе - обычные JSON массивы.
     """
     try:
         request_data = {
             "subdomain": subdomain,
-            "manager_id": manager_id
+            "manager_id": manager_id,
+            "include_leads": include_leads
         }
 
-        response_msg = await broker.request(
+        timeout = rpc_timeout(QueueNames.SETTINGS_GET)
+        response_msg = await rpc_client.request(
             request_data,
             queue=QueueNames.SETTINGS_GET,
-            timeout=RPC_TIMEOUT,
+            timeout=timeout,
+            priority=priority,
+            subdomain=subdomain,
+            **deadline_options(timeout),
         )
 
-        # Десериализация ответа из RabbitMessage
-        response = json.loads(response_msg.body)
+        # Десериализация ответа
+        response = decode(response_msg.body, response_msg.content_type)
 
         if not response or not response.get("success"):
             raise HTTPException(
@@ -75,10 +177,16 @@ async def get_settings(
                 detail=response.get("error", "Settings not found")
             )
 
-        return {
-            "success": True,
-            "data": response.get("data")
-        }
+        data = response.get("data")
+        encoding, media_type = _negotiate_hidden_encoding(accept)
+        if data and data.get("hidden"):
+            data["hidden"] = encode_hidden(data["hidden"], encoding)
+
+        return JSONResponse(
+            {"success": True, "data": data},
+            media_type=media_type,
+            headers={"Vary": "Accept"},
+        )
     except HTTPException:
         raise
     except Exception as e:
@@ -91,7 +199,8 @@ async def get_settings(
 @router.delete("/settings/{subdomain}", response_model=APIResponse)
 async def delete_settings(
     subdomain: str,
-    manager_id: int = Query(..., description="ID менеджера", gt=0)
+    manager_id: int = Query(..., description="ID менеджера", gt=0),
+    priority: int = Depends(request_priority),
 ) -> Dict[str, Any]:
     """
     Удаление настроек permissions для менеджера
@@ -102,14 +211,18 @@ async def delete_settings(
             "manager_id": manager_id
         }
 
-        response_msg = await broker.request(
+        timeout = rpc_timeout(QueueNames.SETTINGS_DELETE)
+        response_msg = await rpc_client.request(
             request_data,
             queue=QueueNames.SETTINGS_DELETE,
-            timeout=RPC_TIMEOUT,
+            timeout=timeout,
+            priority=priority,
+            subdomain=subdomain,
+            **settings_write_options(timeout),
         )
 
-        # Десериализация ответа из RabbitMessage
-        response = json.loads(response_msg.body)
+        # Десериализация ответа
+        response = decode(response_msg.body, response_msg.content_type)
 
         if not response or not response.get("success"):
             raise HTTPException(
@@ -0,0 +1,54 @@
+import time
+from fastapi import APIRouter, Header, HTTPException, Query, Request, status
+from typing import Dict, Any, Optional
+from app.amocrm.webhooks import is_valid_webhook_token
+from app.core.broker.app import broker
+from app.core.broker.config import QueueNames, SUBDOMAIN_HEADER
+from app.core.logging import logger
+
+router = APIRouter()
+
+
+@router.post("/amocrm/{subdomain}")
+async def receive_amocrm_webhook(
+    subdomain: str,
+    request: Request,
+    token: Optional[str] = Query(None, description="Токен вебхуков аккаунта"),
+    x_webhook_token: Optional[str] = Header(None),
+) -> Dict[str, Any]:
+    """
+    Прием вебхуков AmoCRM (добавление, изменение и удаление сделок,
+    контактов и компаний).
+
+    URL вебхука аккаунта содержит субдомен и его токен (python manage.py
+    webhook-url); токен можно передать и заголовком X-Webhook-Token.
+    Запросы без верного токена отклоняются и в очередь не попадают.
+
+    Тело запроса не разбирается: сырой payload публикуется в очередь и
+    обрабатывается воркером пачками, поэтому время ответа AmoCRM не зависит
+    от обработки событий.
+    """
+    token = token or x_webhook_token
+    if not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Webhook token is required"
+        )
+    if not is_valid_webhook_token(subdomain, token):
+        logger.warning("Вебхук с неверным токеном отклонен | subdomain: %s", subdomain)
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Invalid webhook token"
+        )
+
+    body = await request.body()
+
+    await broker.publish(
+        # subdomain - аккаунт, для которого проверен токен
+        {"body": body.decode("utf-8", errors="replace"), "subdomain": subdomain, "received_at": time.time()},
+        queue=QueueNames.WEBHOOKS,
+        headers={SUBDOMAIN_HEADER: subdomain},
+        persist=True,
+    )
+
+    return {"success": True}
@@ -8,6 +8,10 @@
 from faststream import FastStream
 
 from app.core.broker.app import broker
+from app.amocrm.webhooks import webhook_batcher
+from app.core.broker.routers.permissions import save_coalescer
+from app.core.broker.rpc_client import rpc_client
+from app.utils.tokens import start_token_refresher, stop_token_refresher
 from app.core.logging import setup_logging, logger
 
 # Настраиваем логирование для воркера
@@ -27,6 +31,7 @@ async def startup_hook():
 @app.after_startup
 async def after_startup_hook():
     """Хук выполняется после успешного старта."""
+    start_token_refresher()
     logger.info("FastStream воркер успешно запущен")
     logger.info("Слушаем очереди RabbitMQ...")
 
@@ -35,6 +40,10 @@ async def after_startup_hook():
 async def shutdown_hook():
     """Хук выполняется при остановке воркера."""
     logger.info("FastStream воркер останавливается...")
+    await webhook_batcher.flush_all()
+    await save_coalescer.flush_all()
+    await stop_token_refresher()
+    await rpc_client.close()
 
 
 @app.after_shutdown
@@ -2,3 +2,8 @@ from .base import cli
 from .run_devserver import run_dev_server
 from .run_prodserver import run_prod_server
 from .run_worker import run_worker
+from .run_amocrm_stub import run_amocrm_stub
+from .backfill_lead_index import backfill_lead_index
+from .simulate_visibility import simulate_visibility
+from .delete_legacy_queues import delete_legacy_queues
+from .webhook_url import webhook_url
@@ -0,0 +1,65 @@
+"""Первичное заполнение индекса сделок из AmoCRM"""
+
+import asyncio
+
+import click
+from aiohttp import ClientSession, TCPConnector
+
+from app.amocrm.auth import call_with_token_refresh
+from app.amocrm.rate_limited_session import RateLimitedClientSession
+from app.amocrm.requests_amocrm import get_leads_page
+from app.core.broker.rpc_client import rpc_client
+from app.core.logging import logger
+from app.db.async_session import async_session
+from app.services.lead_index_service import rebuild_hidden_for_subdomain, upsert_leads
+from app.utils.visibility import lead_tag_names
+
+from .base import cli
+
+
+async def _backfill(subdomain: str) -> int:
+    total = 0
+    page_url = None
+
+    try:
+        async with ClientSession(connector=TCPConnector(ssl=False)) as session:
+            http_session = RateLimitedClientSession(session)
+
+            while True:
+                leads, page_url = await call_with_token_refresh(
+                    get_leads_page, subdomain, client_session=http_session, page_url=page_url
+                )
+
+                async with async_session() as db_session:
+                    total += await upsert_leads(
+                        subdomain,
+                        [
+                            {
+                                "lead_id": lead["id"],
+                                "pipeline_id": lead.get("pipeline_id"),
+                                "tags": lead_tag_names(lead),
+                            }
+                            for lead in leads
+                        ],
+                        db_session,
+                    )
+
+                logger.info("Backfill индекса сделок | subdomain: %s, leads: %s", subdomain, total)
+                if not page_url:
+                    break
+
+        async with async_session() as db_session:
+            managers = await rebuild_hidden_for_subdomain(subdomain, db_session)
+            logger.info("Скрытые наборы пересобраны | subdomain: %s, managers: %s", subdomain, managers)
+    finally:
+        await rpc_client.close()
+
+    return total
+
+
+@cli.command()
+@click.argument("subdomain")
+def backfill_lead_index(subdomain: str):
+    """Заполнить индекс сделок субдомена из AmoCRM и пересобрать скрытые наборы менеджеров"""
+    total = asyncio.run(_backfill(subdomain))
+    click.echo(f"Проиндексировано сделок: {total}")
@@ -0,0 +1,47 @@
+"""Удаление старых RPC очередей без приоритетов после миграции"""
+
+import asyncio
+
+import aio_pika
+import click
+from aiormq.exceptions import ChannelNotFoundEntity, ChannelPreconditionFailed
+
+from app.core.broker.config import LEGACY_QUEUE_NAMES
+from app.core.settings import config
+
+from .base import cli
+
+
+async def _delete_legacy_queues(dry_run: bool) -> None:
+    connection = await aio_pika.connect_robust(config.rabbit_cfg.rabbitmq_uri)
+    try:
+        for queue, legacy in LEGACY_QUEUE_NAMES.items():
+            channel = await connection.channel()
+            try:
+                declared = await channel.declare_queue(legacy, passive=True)
+            except ChannelNotFoundEntity:
+                click.echo(f"{legacy}: не существует")
+                continue
+
+            count = declared.declaration_result.message_count
+            if count or dry_run:
+                click.echo(f"{legacy}: сообщений {count} (замена: {queue}), не удаляется")
+                continue
+
+            try:
+                await declared.delete(if_unused=False, if_empty=True)
+                click.echo(f"{legacy}: удалена")
+            except ChannelPreconditionFailed:
+                click.echo(f"{legacy}: появились новые сообщения, не удаляется")
+    finally:
+        await connection.close()
+
+
+@cli.command()
+@click.option("--dry-run", is_flag=True, help="Только показать количество сообщений в старых очередях")
+def delete_legacy_queues(dry_run: bool):
+    """Удалить пустые RPC очереди без приоритетов (после перехода на RABBITMQ_PRIORITY_QUEUES)"""
+    if not LEGACY_QUEUE_NAMES:
+        raise click.ClickException("Приоритетные очереди не включены (RABBITMQ_PRIORITY_QUEUES=false)")
+
+    asyncio.run(_delete_legacy_queues(dry_run))
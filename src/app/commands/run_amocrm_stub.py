@@ -0,0 +1,54 @@
+"""Запуск локального стенда AmoCRM API"""
+
+import asyncio
+
+import click
+
+from app.testing.amocrm_stub import AmoCRMStub, StubConfig
+
+from .base import cli
+
+
+async def _serve(stub: AmoCRMStub) -> None:
+    async with stub:
+        await asyncio.Event().wait()
+
+
+@cli.command()
+@click.option("--host", default="127.0.0.1", show_default=True, help="Адрес для прослушивания")
+@click.option("--port", default=8800, show_default=True, help="Порт")
+@click.option("--leads", "leads_count", default=1000, show_default=True, help="Сделок в аккаунте")
+@click.option("--custom-fields", "custom_fields_count", default=120, show_default=True, help="Кастомных полей сущности")
+@click.option("--latency", default=0.0, show_default=True, help="Задержка ответа, секунд")
+@click.option("--latency-jitter", default=0.0, show_default=True, help="Случайная добавка к задержке, секунд")
+@click.option("--rps", default=7, show_default=True, help="Лимит запросов в секунду на аккаунт (0 - без лимита)")
+@click.option("--token-ttl", default=0.0, show_default=True, help="Время жизни токена, секунд (0 - бессрочно)")
+def run_amocrm_stub(
+    host: str,
+    port: int,
+    leads_count: int,
+    custom_fields_count: int,
+    latency: float,
+    latency_jitter: float,
+    rps: int,
+    token_ttl: float,
+):
+    """Запуск локального стенда AmoCRM API для нагрузочного тестирования"""
+    stub = AmoCRMStub(
+        StubConfig(
+            leads_count=leads_count,
+            custom_fields_count=custom_fields_count,
+            latency=latency,
+            latency_jitter=latency_jitter,
+            rps=rps,
+            token_ttl=token_ttl,
+        ),
+        host=host,
+        port=port,
+    )
+    click.echo(f"Стенд AmoCRM API: {stub.base_url} (AMOCRM_API_BASE_URL={stub.base_url})")
+
+    try:
+        asyncio.run(_serve(stub))
+    except KeyboardInterrupt:
+        pass
@@ -1,10 +1,13 @@
 """Запуск Воркера FastStream"""
 
+import os
 import signal
 import subprocess
+from typing import List, Tuple
 
 import click
 
+from app.core.broker.config import QueueClasses
 from app.core.settings import config
 
 from .base import cli
@@ -17,16 +20,7 @@ def sigterm_handler(signum, frame):
     exit_signal = True
 
 
-@cli.command()
-@click.option("-d", "--devel", is_flag=True, help="Development mode with reload")
-def run_worker(devel: bool = False):
-    """Запуск Воркера FastStream"""
-
-    global exit_signal
-
-    signal.signal(signal.SIGINT, sigterm_handler)
-    signal.signal(signal.SIGTERM, sigterm_handler)
-
+def _worker_args(devel: bool) -> List[str]:
     args = ["faststream", "run", "app.broker_app:app"]
     if devel:
         args.append("--reload")
@@ -39,11 +33,57 @@ def run_worker(devel: bool = False):
                 str(config.worker_cfg.MAX_TASKS_PER_CHILD),
             ],
         )
-    proc = subprocess.Popen(args)
-    while not exit_signal:
+    return args
+
+
+def _validate_queue_classes(ctx, param, value: Tuple[str, ...]) -> Tuple[str, ...]:
+    for group in value:
+        unknown = {item.strip() for item in group.split(",")} - set(QueueClasses.ALL)
+        if unknown:
+            raise click.BadParameter(
+                f"неизвестные классы {', '.join(sorted(unknown))}, допустимые: {', '.join(QueueClasses.ALL)}"
+            )
+    return value
+
+
+@cli.command()
+@click.option("-d", "--devel", is_flag=True, help="Development mode with reload")
+@click.option(
+    "-q",
+    "--queue-class",
+    "queue_classes",
+    multiple=True,
+    callback=_validate_queue_classes,
+    help=(
+        "Отдельная группа процессов для класса очередей (read, write, amocrm, webhooks; "
+        "несколько классов в одной группе - через запятую). Можно указать несколько раз"
+    ),
+)
+def run_worker(devel: bool = False, queue_classes: Tuple[str, ...] = ()):
+    """Запуск Воркера FastStream"""
+
+    signal.signal(signal.SIGINT, sigterm_handler)
+    signal.signal(signal.SIGTERM, sigterm_handler)
+
+    args = _worker_args(devel)
+
+    # Без --queue-class одна группа процессов обслуживает классы из WORKER_QUEUE_CLASSES (по умолчанию все)
+    procs = []
+    for group in queue_classes or (None,):
+        env = None
+        if group is not None:
+            env = {**os.environ, "WORKER_QUEUE_CLASSES": group}
+            click.echo(f"Запуск группы воркеров для классов очередей: {group}")
+        procs.append(subprocess.Popen(args, env=env))
+
+    while not exit_signal and all(proc.poll() is None for proc in procs):
         try:
-            proc.wait(0.25)
+            procs[0].wait(0.25)
         except subprocess.TimeoutExpired:
             pass
-    proc.send_signal(signal.SIGINT)
-    proc.wait()
+
+    for proc in procs:
+        if proc.poll() is None:
+            proc.send_signal(signal.SIGINT)
+    for proc in procs:
+        proc.wait()
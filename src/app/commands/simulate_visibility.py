@@ -0,0 +1,337 @@
+"""
+Офлайн симуляция видимости сделок для оценки правил до их включения.
+
+Сделки из выгрузки (JSONL или Parquet) кодируются в массивы NumPy:
+воронка - int64 (-1 для сделки без воронки), теги - словарь названий и
+CSR (indptr, indices) с номерами тегов каждой сделки. Сделки с одинаковой
+воронкой и набором тегов сворачиваются в профили, правила менеджеров
+вычисляются над профилями булевыми матрицами (правило x профиль), а
+количество видимых сделок - взвешенной суммой по профилям.
+
+Семантика совпадает с app.utils.visibility.is_lead_hidden_by_rules.
+Требует необязательных зависимостей: pip install "hiding-data[simulator]".
+"""
+
+import asyncio
+import json
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import click
+
+from app.utils.visibility import _to_ids, is_lead_hidden_by_rules, lead_tag_names
+
+from .base import cli
+
+# Ограничение размера промежуточной матрицы (правило x тег сделки), элементов
+MATRIX_CHUNK_ELEMENTS = 50_000_000
+
+
+def _import_numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise click.ClickException('Не установлен numpy: pip install "hiding-data[simulator]"')
+    return numpy
+
+
+def _lead_tags(lead: Dict[str, Any]) -> List[str]:
+    """Теги сделки из объекта AmoCRM API или строки индекса ({"tags": ["d1"]})."""
+    tags = lead.get("tags")
+    if isinstance(tags, list) and all(isinstance(tag, str) for tag in tags):
+        return tags
+    return lead_tag_names(lead)
+
+
+def load_jsonl(path: str):
+    """
+    Загрузка выгрузки сделок в формате JSONL (одна сделка на строку).
+
+    Returns:
+        Кортеж (pipeline_ids, indptr, indices, tag_names)
+    """
+    np = _import_numpy()
+
+    tag_index: Dict[str, int] = {}
+    pipelines: List[int] = []
+    indptr: List[int] = [0]
+    indices: List[int] = []
+
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            lead = json.loads(line)
+            pipeline_id = lead.get("pipeline_id")
+            pipelines.append(-1 if pipeline_id is None else int(pipeline_id))
+            for tag in _lead_tags(lead):
+                indices.append(tag_index.setdefault(tag, len(tag_index)))
+            indptr.append(len(indices))
+
+    return (
+        np.asarray(pipelines, dtype=np.int64),
+        np.asarray(indptr, dtype=np.int64),
+        np.asarray(indices, dtype=np.int64),
+        list(tag_index),
+    )
+
+
+def load_parquet(path: str):
+    """
+    Загрузка выгрузки сделок в формате Parquet.
+
+    Ожидаются колонки pipeline_id (целое) и tags (список строк или
+    список структур с полем name).
+
+    Returns:
+        Кортеж (pipeline_ids, indptr, indices, tag_names)
+    """
+    np = _import_numpy()
+    try:
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise click.ClickException('Не установлен pyarrow: pip install "hiding-data[simulator]"')
+
+    table = pq.read_table(path, columns=["pipeline_id", "tags"])
+
+    pipelines = table.column("pipeline_id").fill_null(-1).to_numpy().astype(np.int64)
+
+    tags = table.column("tags").combine_chunks()
+    lengths = pc.list_value_length(tags).fill_null(0).to_numpy().astype(np.int64)
+    indptr = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=indptr[1:])
+
+    values = pc.list_flatten(tags)
+    if hasattr(values.type, "get_field_index"):
+        values = pc.struct_field(values, "name")
+    encoded = values.dictionary_encode()
+
+    return (
+        pipelines,
+        indptr,
+        encoded.indices.to_numpy(zero_copy_only=False).astype(np.int64),
+        encoded.dictionary.to_pylist(),
+    )
+
+
+def build_profiles(pipelines, indptr, indices, tag_count: int):
+    """
+    Свертка сделок с одинаковой воронкой и набором тегов в профили.
+
+    Набор тегов сделки хешируется суммой случайных 64-битных значений
+    тегов (не зависит от порядка), вместе с воронкой - ключ профиля.
+
+    Returns:
+        Кортеж (profile_pipelines, profile_indptr, profile_indices, profile_counts, lead_profile)
+    """
+    np = _import_numpy()
+
+    rng = np.random.default_rng(0)
+    tag_hashes = rng.integers(1, 2 ** 63, size=max(tag_count, 1), dtype=np.uint64)
+
+    cumulative = np.zeros(len(indices) + 1, dtype=np.uint64)
+    np.cumsum(tag_hashes[indices], out=cumulative[1:])
+    with np.errstate(over="ignore"):
+        row_hashes = cumulative[indptr[1:]] - cumulative[indptr[:-1]]
+        keys = row_hashes * np.uint64(0x9E3779B97F4A7C15) + pipelines.astype(np.uint64)
+
+    _, first_rows, lead_profile, profile_counts = np.unique(
+        keys, return_index=True, return_inverse=True, return_counts=True
+    )
+
+    starts = indptr[first_rows]
+    lengths = indptr[first_rows + 1] - starts
+    profile_indptr = np.zeros(len(first_rows) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=profile_indptr[1:])
+    # Позиции тегов представителя каждого профиля в исходном indices
+    offsets = np.arange(profile_indptr[-1], dtype=np.int64) - np.repeat(profile_indptr[:-1], lengths)
+    profile_indices = indices[np.repeat(starts, lengths) + offsets]
+
+    return pipelines[first_rows], profile_indptr, profile_indices, profile_counts, lead_profile.ravel()
+
+
+def _rule_key(permissions: Dict[str, Any]) -> str:
+    """Ключ правил, влияющих на видимость сделок (одинаковые правила считаются один раз)."""
+    return json.dumps(
+        [permissions.get("pipelines", {}), permissions.get("tags_logic", {}).get("leads", {})],
+        sort_keys=True,
+        default=str,
+    )
+
+
+def evaluate_hidden(
+    rules: List[Dict[str, Any]],
+    profile_pipelines,
+    profile_indptr,
+    profile_indices,
+    tag_names: List[str],
+):
+    """
+    Матрица скрытия (правило x профиль) для списка документов permissions.
+
+    Returns:
+        Булева матрица numpy формы (len(rules), количество профилей)
+    """
+    np = _import_numpy()
+
+    tag_index = {name: i for i, name in enumerate(tag_names)}
+    hidden = np.zeros((len(rules), len(profile_pipelines)), dtype=bool)
+
+    # Воронки
+    for i, permissions in enumerate(rules):
+        rule = permissions.get("pipelines", {})
+        mode = rule.get("mode", "none")
+        values = np.asarray(_to_ids(rule.get("values", [])), dtype=np.int64)
+        if mode == "blacklist" and len(values):
+            hidden[i] |= np.isin(profile_pipelines, values)
+        elif mode == "whitelist":
+            hidden[i] |= ~np.isin(profile_pipelines, values)
+
+    # Теги: матрица (правило x тег) "тег в списке правила"
+    tag_rules = [permissions.get("tags_logic", {}).get("leads", {}) for permissions in rules]
+    listed = np.zeros((len(rules), len(tag_names)), dtype=bool)
+    for i, rule in enumerate(tag_rules):
+        ids = [tag_index[str(value)] for value in rule.get("values", []) if str(value) in tag_index]
+        listed[i, ids] = True
+
+    # Количество тегов из списка у профиля: префиксные суммы по CSR,
+    # пачками правил, чтобы ограничить размер матрицы (правило x тег профиля)
+    chunk = max(1, MATRIX_CHUNK_ELEMENTS // max(len(profile_indices), 1))
+    has_listed = np.zeros_like(hidden)
+    for start in range(0, len(rules), chunk):
+        block = listed[start:start + chunk, profile_indices]
+        cumulative = np.zeros((block.shape[0], block.shape[1] + 1), dtype=np.int32)
+        np.cumsum(block, axis=1, out=cumulative[:, 1:])
+        has_listed[start:start + chunk] = (
+            cumulative[:, profile_indptr[1:]] - cumulative[:, profile_indptr[:-1]]
+        ) > 0
+
+    for i, rule in enumerate(tag_rules):
+        mode = rule.get("mode", "none")
+        if mode == "blacklist" and rule.get("values"):
+            hidden[i] |= has_listed[i]
+        elif mode == "whitelist":
+            hidden[i] |= ~has_listed[i]
+
+    return hidden
+
+
+async def _load_permissions_from_db(subdomain: str) -> List[Tuple[int, Dict[str, Any]]]:
+    from app.db.async_session import async_session
+    from app.services.permissions_service import get_all_permissions_for_subdomain
+
+    async with async_session() as session:
+        records = await get_all_permissions_for_subdomain(subdomain, session)
+    return [(record.manager_id, record.permissions) for record in records]
+
+
+def _load_permissions_from_file(path: str) -> List[Tuple[int, Dict[str, Any]]]:
+    """Файл JSON: список {"manager_id": 1, "permissions": {...}}."""
+    with open(path, encoding="utf-8") as f:
+        items = json.load(f)
+    return [(int(item["manager_id"]), item.get("permissions") or {}) for item in items]
+
+
+def _verify_sample(
+    managers: List[Tuple[int, Dict[str, Any]]],
+    visible: Dict[int, Any],
+    pipelines,
+    indptr,
+    indices,
+    tag_names: List[str],
+    lead_profile,
+    sample: int,
+) -> int:
+    """Сверка с эталонной is_lead_hidden_by_rules на случайной выборке сделок."""
+    np = _import_numpy()
+
+    rng = np.random.default_rng()
+    rows = rng.choice(len(pipelines), size=min(sample, len(pipelines)), replace=False)
+    mismatches = 0
+    for manager_id, permissions in managers:
+        profile_visible = visible[manager_id]
+        for row in rows:
+            pipeline_id = int(pipelines[row])
+            tags = [tag_names[i] for i in indices[indptr[row]:indptr[row + 1]]]
+            expected = is_lead_hidden_by_rules(permissions, None if pipeline_id == -1 else pipeline_id, tags)
+            if expected == bool(profile_visible[lead_profile[row]]):
+                mismatches += 1
+    return mismatches
+
+
+@cli.command()
+@click.argument("subdomain")
+@click.argument("dump_path", type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "--permissions-file",
+    type=click.Path(exists=True, dir_okay=False),
+    default=None,
+    help="JSON со списком {manager_id, permissions} вместо загрузки из БД",
+)
+@click.option("--verify-sample", type=int, default=0, help="Сверить N случайных сделок с эталонной логикой")
+def simulate_visibility(
+    subdomain: str,
+    dump_path: str,
+    permissions_file: Optional[str],
+    verify_sample: int,
+):
+    """Посчитать видимые сделки каждого менеджера субдомена по выгрузке сделок (JSONL/Parquet)"""
+    np = _import_numpy()
+
+    started = time.perf_counter()
+    if dump_path.endswith(".parquet"):
+        pipelines, indptr, indices, tag_names = load_parquet(dump_path)
+    else:
+        pipelines, indptr, indices, tag_names = load_jsonl(dump_path)
+
+    if permissions_file:
+        managers = _load_permissions_from_file(permissions_file)
+    else:
+        managers = asyncio.run(_load_permissions_from_db(subdomain))
+    loaded = time.perf_counter()
+
+    profile_pipelines, profile_indptr, profile_indices, profile_counts, lead_profile = build_profiles(
+        pipelines, indptr, indices, len(tag_names)
+    )
+    encoded = time.perf_counter()
+
+    rule_keys = [_rule_key(permissions) for _, permissions in managers]
+    unique_rules: Dict[str, int] = {}
+    rules: List[Dict[str, Any]] = []
+    for key, (_, permissions) in zip(rule_keys, managers):
+        if key not in unique_rules:
+            unique_rules[key] = len(rules)
+            rules.append(permissions)
+
+    hidden = evaluate_hidden(rules, profile_pipelines, profile_indptr, profile_indices, tag_names)
+    visible_counts = (~hidden).astype(np.int64) @ profile_counts.astype(np.int64)
+    evaluated = time.perf_counter()
+
+    total = len(pipelines)
+    click.echo(f"Субдомен: {subdomain}")
+    click.echo(
+        f"Сделок: {total}, тегов: {len(tag_names)}, профилей: {len(profile_counts)}, "
+        f"менеджеров: {len(managers)}, уникальных правил: {len(rules)}"
+    )
+    click.echo(f"{'manager_id':>12} {'visible':>12} {'hidden':>12} {'visible %':>10}")
+    for key, (manager_id, _) in zip(rule_keys, managers):
+        visible = int(visible_counts[unique_rules[key]])
+        share = 100 * visible / total if total else 0.0
+        click.echo(f"{manager_id:>12} {visible:>12} {total - visible:>12} {share:>10.2f}")
+
+    click.echo(
+        f"Время: загрузка {loaded - started:.3f} с, кодирование {encoded - loaded:.3f} с, "
+        f"расчет {evaluated - encoded:.3f} с"
+    )
+
+    if verify_sample > 0:
+        visible_by_manager = {
+            manager_id: ~hidden[unique_rules[key]] for key, (manager_id, _) in zip(rule_keys, managers)
+        }
+        mismatches = _verify_sample(
+            managers, visible_by_manager, pipelines, indptr, indices, tag_names, lead_profile, verify_sample
+        )
+        click.echo(f"Сверка с эталонной логикой: расхождений {mismatches}")
+        if mismatches:
+            raise click.ClickException("Результат симуляции расходится с is_lead_hidden_by_rules")
@@ -0,0 +1,20 @@
+"""URL вебхука аккаунта AmoCRM с токеном"""
+
+import click
+
+from app.amocrm.webhooks import webhook_token
+
+from .base import cli
+
+
+@cli.command()
+@click.argument("subdomain")
+@click.option("--base-url", default="", help="Внешний адрес сервиса, например https://hiding-data.example.com")
+def webhook_url(subdomain: str, base_url: str):
+    """Показать URL вебхука аккаунта (токен - HMAC субдомена с AMOCRM_WEBHOOK_SECRET)"""
+    try:
+        token = webhook_token(subdomain)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+
+    click.echo(f"{base_url.rstrip('/')}/webhooks/amocrm/{subdomain}?token={token}")
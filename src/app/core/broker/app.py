@@ -6,10 +6,18 @@ from faststream.rabbit import RabbitBroker, Channel
 
 from app.core.settings import config
 from app.core.logging import logger
+from app.core.broker.codec import broker_decoder
+from app.core.broker.middlewares.codec_middleware import ReplyCodecMiddleware
+from app.core.broker.middlewares.deadline_middleware import DeadlineMiddleware
 from app.core.broker.middlewares.logging_middleware import LoggingMiddleware
 from app.core.broker.middlewares.retry_middleware import RetryMiddleware
-from app.core.broker.routers.permissions import permissions_router
+from app.core.broker.channels import enabled_queue_classes
+from app.core.broker.config import QueueClasses
+from app.core.broker.routers.permissions import permissions_read_router, permissions_write_router
+from app.core.broker.routers.metadata import metadata_router
+from app.core.broker.routers.hidden_leads import hidden_leads_router
 from app.core.broker.routers.health import health_router
+from app.core.broker.routers.webhooks import webhooks_router
 
 
 # Создаем RabbitMQ брокер с настройками
@@ -17,12 +25,28 @@ broker = RabbitBroker(
     url=config.rabbit_cfg.rabbitmq_uri,
     logger=logger,
     middlewares=[
-        RetryMiddleware,  # Сначала retry (внешний слой)
-        LoggingMiddleware,  # Потом logging (внутренний слой)
+        DeadlineMiddleware,  # Сначала отбрасываем запросы с истекшим дедлайном
+        RetryMiddleware,  # Потом retry
+        LoggingMiddleware,  # Потом logging
+        ReplyCodecMiddleware,  # Ответ в формате запроса (внутренний слой)
     ],
+    decoder=broker_decoder,
     default_channel=Channel(prefetch_count=config.worker_cfg.PREFETCH_COUNT),
 )
 
-# Подключаем роутеры
-broker.include_router(permissions_router)
+# Роутеры по классам очередей
+ROUTERS_BY_QUEUE_CLASS = {
+    QueueClasses.READ: [permissions_read_router, hidden_leads_router],
+    QueueClasses.WRITE: [permissions_write_router],
+    QueueClasses.AMOCRM: [metadata_router],
+    QueueClasses.WEBHOOKS: [webhooks_router],
+}
+
+# Подключаем роутеры классов, которые обслуживает процесс (WORKER_QUEUE_CLASSES)
+for queue_class in QueueClasses.ALL:
+    if queue_class in enabled_queue_classes():
+        for router in ROUTERS_BY_QUEUE_CLASS[queue_class]:
+            broker.include_router(router)
+
+# Healthcheck отвечает любой процесс воркера
 broker.include_router(health_router)
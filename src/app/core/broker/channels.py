@@ -0,0 +1,67 @@
+"""
+Каналы RabbitMQ по классам очередей.
+
+Подписчики одного класса используют общий канал с prefetch этого класса,
+поэтому медленные записи и запросы в AmoCRM не занимают слоты чтений.
+"""
+
+from functools import lru_cache
+from typing import Set
+
+from faststream.rabbit import Channel
+
+from app.core.broker.config import QUEUE_CLASSES, QueueClasses, QueueNames
+from app.core.settings import config
+
+
+def class_prefetch_count(queue_class: str) -> int:
+    """Prefetch канала класса очередей из конфигурации воркера."""
+    return {
+        QueueClasses.READ: config.worker_cfg.READ_PREFETCH_COUNT,
+        QueueClasses.WRITE: config.worker_cfg.WRITE_PREFETCH_COUNT,
+        QueueClasses.AMOCRM: config.worker_cfg.AMOCRM_PREFETCH_COUNT,
+        QueueClasses.WEBHOOKS: config.worker_cfg.WEBHOOK_PREFETCH_COUNT,
+    }.get(queue_class, config.worker_cfg.PREFETCH_COUNT)
+
+
+@lru_cache(maxsize=None)
+def class_channel(queue_class: str) -> Channel:
+    """
+    Канал класса очередей. FastStream открывает один AMQP канал на объект
+    Channel, поэтому объект кешируется.
+    """
+    return Channel(prefetch_count=class_prefetch_count(queue_class))
+
+
+@lru_cache(maxsize=None)
+def coalesced_save_channel() -> Channel:
+    """
+    Канал очереди SAVE при включенном окне объединения: сохранения ждут
+    конца окна неподтвержденными, поэтому у них свой prefetch.
+    """
+    return Channel(prefetch_count=config.worker_cfg.SAVE_PREFETCH_COUNT)
+
+
+def queue_channel(queue: str) -> Channel:
+    """Канал для подписчика очереди (по ее классу)."""
+    if queue == QueueNames.SETTINGS_SAVE and config.worker_cfg.SAVE_COALESCE_WINDOW > 0:
+        return coalesced_save_channel()
+    return class_channel(QUEUE_CLASSES[queue])
+
+
+def enabled_queue_classes() -> Set[str]:
+    """
+    Классы очередей, которые обслуживает процесс (WORKER_QUEUE_CLASSES).
+
+    Raises:
+        ValueError: Неизвестный класс очередей
+    """
+    value = config.worker_cfg.QUEUE_CLASSES.strip()
+    if not value:
+        return set(QueueClasses.ALL)
+
+    classes = {item.strip() for item in value.split(",") if item.strip()}
+    unknown = classes - set(QueueClasses.ALL)
+    if unknown:
+        raise ValueError(f"Unknown queue classes: {', '.join(sorted(unknown))}")
+    return classes
@@ -0,0 +1,181 @@
+"""
+Объединение частых сохранений настроек одного менеджера.
+
+Админка сохраняет настройки на каждый клик, поэтому за одну сессию
+редактирования приходят десятки SAVE одного менеджера, и каждый делает
+полное удаление и вставку. SaveCoalescer копит их в коротком окне по ключу
+(subdomain, manager_id) и записывает только документ с наибольшей версией;
+все сообщения окна получают результат этой записи.
+
+Окно и блокировки действуют внутри процесса. Порядок записей между
+процессами обеспечивает версия записи (claim_settings_version): writer
+применяет документ, только если не применена более новая версия.
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from app.core.settings import config
+from app.core.logging import logger
+from app.core.metrics import metrics
+
+SaveKey = Tuple[str, int]
+# Запись документа: (subdomain, manager_id, document, version) -> ответ в формате handler'а
+SaveWriter = Callable[[str, int, Dict[str, Any], int], Awaitable[Dict[str, Any]]]
+
+
+class SaveCoalescer:
+    """
+    Окно объединения сохранений по ключу (subdomain, manager_id).
+
+    Окно отсчитывается от первого сохранения ключа, поэтому ответ задерживается
+    не больше чем на window секунд даже при непрерывных кликах. Записи одного
+    ключа выполняются последовательно: сохранение, пришедшее во время записи,
+    попадает в следующее окно.
+    """
+
+    def __init__(self, writer: SaveWriter, window: Optional[float] = None, timeout: Optional[float] = None):
+        """
+        Args:
+            writer: Запись последнего документа окна
+            window: Окно объединения в секундах, 0 - выключено (по умолчанию из конфигурации)
+            timeout: Таймаут RPC сохранения: окно должно быть не больше его половины,
+                остальное - на очередь и запись
+
+        Raises:
+            ValueError: Окно не укладывается в таймаут сохранения
+        """
+        self.window = window if window is not None else config.worker_cfg.SAVE_COALESCE_WINDOW
+        if timeout is not None and self.window * 2 > timeout:
+            raise ValueError(
+                f"SAVE_COALESCE_WINDOW ({self.window} s) must not exceed half of the save RPC timeout ({timeout} s)"
+            )
+        self._writer = writer
+
+        # Документ окна с наибольшей версией: (версия, документ)
+        self._documents: Dict[SaveKey, Tuple[int, Dict[str, Any]]] = {}
+        self._results: Dict[SaveKey, asyncio.Future] = {}
+        self._timers: Dict[SaveKey, asyncio.TimerHandle] = {}
+        self._locks: Dict[SaveKey, asyncio.Lock] = {}
+        self._lock_users: Dict[SaveKey, int] = {}
+        # Записи, запущенные таймерами окон (ссылки держатся до завершения)
+        self._flush_tasks: Set[asyncio.Task] = set()
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    async def save(
+        self,
+        subdomain: str,
+        manager_id: int,
+        document: Dict[str, Any],
+        version: int
+    ) -> Dict[str, Any]:
+        """
+        Добавление документа в окно ключа и ожидание записи документа окна
+        с наибольшей версией.
+
+        Args:
+            subdomain: Субдомен amoCRM
+            manager_id: ID менеджера
+            document: Провалидированный документ настроек
+            version: Версия записи (x-settings-version)
+
+        Returns:
+            Ответ записи (общий для всех сохранений окна)
+
+        Raises:
+            Exception: Ошибка записи
+        """
+        key = (subdomain, manager_id)
+
+        pending = self._documents.get(key)
+        if pending is not None:
+            # Из двух документов окна записан будет только более новый
+            metrics.inc("settings_saves_coalesced_total")
+        if pending is None or version >= pending[0]:
+            self._documents[key] = (version, document)
+
+        result = self._results.get(key)
+        if result is None:
+            loop = asyncio.get_running_loop()
+            result = loop.create_future()
+            self._results[key] = result
+            self._timers[key] = loop.call_later(self.window, self._start_flush, key)
+
+        return await asyncio.shield(result)
+
+    def _start_flush(self, key: SaveKey) -> None:
+        task = asyncio.ensure_future(self.flush(key))
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def flush(self, key: SaveKey) -> None:
+        """Немедленная запись документа окна ключа."""
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+
+        pending = self._documents.pop(key, None)
+        result = self._results.pop(key, None)
+        if pending is None or result is None:
+            return
+        version, document = pending
+
+        async with self._key_lock(key):
+            logger.info(
+                "Запись объединенных сохранений | subdomain: %s, manager_id: %s",
+                key[0],
+                key[1]
+            )
+            metrics.inc("settings_saves_written_total")
+            try:
+                value = await self._writer(key[0], key[1], document, version)
+            except Exception as e:
+                logger.error(
+                    "Ошибка записи объединенных сохранений | subdomain: %s, manager_id: %s, error: %s",
+                    key[0],
+                    key[1],
+                    e
+                )
+                if not result.done():
+                    result.set_exception(e)
+            else:
+                if not result.done():
+                    result.set_result(value)
+
+    async def settle(self, subdomain: str, manager_id: int) -> None:
+        """
+        Запись открытого окна ключа и ожидание текущей записи. Вызывается
+        перед удалением настроек и записями пакета, чтобы отложенное
+        сохранение было применено (или отклонено по версии) до них.
+        """
+        key = (subdomain, manager_id)
+        if key in self._documents:
+            await self.flush(key)
+        elif key in self._locks:
+            async with self._key_lock(key):
+                pass
+
+    @asynccontextmanager
+    async def _key_lock(self, key: SaveKey) -> AsyncIterator[None]:
+        """Последовательные записи ключа; блокировка удаляется, когда не нужна."""
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        self._lock_users[key] = self._lock_users.get(key, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._lock_users[key] -= 1
+            if not self._lock_users[key]:
+                del self._lock_users[key]
+                del self._locks[key]
+
+    async def flush_all(self) -> None:
+        """Запись всех открытых окон и ожидание начатых записей (при остановке воркера)."""
+        await asyncio.gather(
+            *(self.flush(key) for key in list(self._documents)),
+            *list(self._flush_tasks),
+        )
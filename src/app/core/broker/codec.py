@@ -0,0 +1,90 @@
+"""
+Кодирование тел сообщений брокера: JSON или msgpack.
+
+Формат определяется content-type сообщения. Web кодирует RPC запросы в
+msgpack, если включен RABBITMQ_MSGPACK и установлен пакет msgpack; воркер
+декодирует оба формата и отвечает в формате запроса, поэтому старые
+клиенты (и сервис токенов) продолжают работать с JSON.
+"""
+
+import json
+from typing import Any, Optional
+
+from pydantic_core import to_jsonable_python
+
+from app.core.settings import config
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - msgpack - опциональная зависимость
+    msgpack = None
+
+
+JSON_CONTENT_TYPE = "application/json"
+MSGPACK_CONTENT_TYPE = "application/msgpack"
+
+
+def broker_content_type() -> str:
+    """Content-type RPC запросов к воркеру с учетом настройки и наличия msgpack."""
+    if config.rabbit_cfg.MSGPACK and msgpack is not None:
+        return MSGPACK_CONTENT_TYPE
+    return JSON_CONTENT_TYPE
+
+
+def is_msgpack(content_type: Optional[str]) -> bool:
+    return content_type == MSGPACK_CONTENT_TYPE
+
+
+def encode(data: Any, content_type: str = JSON_CONTENT_TYPE) -> bytes:
+    """
+    Кодирование тела сообщения.
+
+    Args:
+        data: Данные (dict, list, pydantic-совместимые значения)
+        content_type: Формат: JSON_CONTENT_TYPE или MSGPACK_CONTENT_TYPE
+
+    Returns:
+        Тело сообщения
+    """
+    if is_msgpack(content_type):
+        if msgpack is None:
+            raise RuntimeError("msgpack не установлен")
+        return msgpack.packb(data, default=to_jsonable_python)
+    return json.dumps(data, default=to_jsonable_python).encode("utf-8")
+
+
+def decode(body: Any, content_type: Optional[str] = None) -> Any:
+    """
+    Декодирование тела сообщения по content-type (по умолчанию JSON).
+
+    Args:
+        body: Тело сообщения (bytes, str или уже декодированные данные)
+        content_type: Content-type сообщения
+
+    Returns:
+        Декодированные данные
+    """
+    if not isinstance(body, (bytes, bytearray, str)):
+        return body
+    if is_msgpack(content_type):
+        if msgpack is None:
+            raise RuntimeError("msgpack не установлен")
+        return msgpack.unpackb(body)
+    return json.loads(body)
+
+
+async def raw_body_decoder(msg, original_decoder) -> bytes:
+    """
+    Декодер FastStream для обработчиков, которые разбирают тело сами
+    (например, TypeAdapter.validate_json по сырым bytes).
+    """
+    return msg.body
+
+
+async def broker_decoder(msg, original_decoder) -> Any:
+    """
+    Декодер FastStream: msgpack по content-type, остальное - стандартным декодером.
+    """
+    if is_msgpack(msg.content_type):
+        return decode(msg.body, msg.content_type)
+    return await original_decoder(msg)
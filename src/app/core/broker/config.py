@@ -2,19 +2,177 @@
 Конфигурация RabbitMQ очередей для hiding-data виджета
 """
 
+import time
+from typing import Any, Dict, Optional
+
+from app.core.settings import config
+
+# Приоритеты RPC запросов (x-max-priority очередей - MAX_PRIORITY)
+MAX_PRIORITY = 10
+PRIORITY_INTERACTIVE = 8  # Запросы виджета, которые ждет пользователь
+PRIORITY_BULK = 1  # Массовые и административные операции
+
+# Версия RPC очередей с приоритетами
+PRIORITY_QUEUE_VERSION = "v2"
+
+
+def _rpc_queue(name: str) -> str:
+    """Имя RPC очереди: с включенными приоритетами - новая версия очереди."""
+    if config.rabbit_cfg.PRIORITY_QUEUES:
+        return f"{name}.{PRIORITY_QUEUE_VERSION}"
+    return name
+
 
 class QueueNames:
     """Названия очередей RabbitMQ"""
     # Операции с настройками permissions
-    SETTINGS_SAVE = "hiding_data_settings_save"
-    SETTINGS_GET = "hiding_data_settings_get"
-    SETTINGS_DELETE = "hiding_data_settings_delete"
+    SETTINGS_SAVE = _rpc_queue("hiding_data_settings_save")
+    SETTINGS_GET = _rpc_queue("hiding_data_settings_get")
+    SETTINGS_DELETE = _rpc_queue("hiding_data_settings_delete")
+    # Пакет операций get/save/delete одним сообщением
+    SETTINGS_BATCH = _rpc_queue("hiding_data_settings_batch")
+
+    # Метаданные аккаунта AmoCRM (поля, воронки, статусы)
+    METADATA_GET = _rpc_queue("hiding_data_metadata_get")
+
+    # Скрытые от менеджера сделки (индекс lead_index / hidden_leads)
+    HIDDEN_LEADS_GET = _rpc_queue("hiding_data_hidden_leads_get")
+
+    # Сырые вебхуки AmoCRM (публикуются HTTP приемником)
+    WEBHOOKS = "hiding_data_amocrm_webhooks"
 
     # Healthcheck
     HEALTH = "hiding_data_health"
 
 
+# RPC очереди с приоритетами -> очереди без приоритетов, которые они заменяют
+LEGACY_QUEUE_NAMES = {
+    queue: queue.rsplit(".", 1)[0]
+    for queue in (
+        QueueNames.SETTINGS_SAVE,
+        QueueNames.SETTINGS_GET,
+        QueueNames.SETTINGS_DELETE,
+        QueueNames.SETTINGS_BATCH,
+        QueueNames.METADATA_GET,
+        QueueNames.HIDDEN_LEADS_GET,
+    )
+} if config.rabbit_cfg.PRIORITY_QUEUES else {}
+
+
+class QueueClasses:
+    """
+    Классы очередей: у каждого класса свой канал и prefetch, воркер можно
+    запустить только для части классов (run_worker --queue-class)
+    """
+    # Быстрые чтения, от которых ждет ответа виджет
+    READ = "read"
+    # Запись в БД с пересчетом скрытых наборов
+    WRITE = "write"
+    # Запросы, ходящие в AmoCRM API (ограничены rate limit)
+    AMOCRM = "amocrm"
+    # Пакетная обработка вебхуков
+    WEBHOOKS = "webhooks"
+
+    ALL = (READ, WRITE, AMOCRM, WEBHOOKS)
+
+
+# Класс каждой очереди
+QUEUE_CLASSES = {
+    QueueNames.SETTINGS_GET: QueueClasses.READ,
+    QueueNames.HIDDEN_LEADS_GET: QueueClasses.READ,
+    QueueNames.HEALTH: QueueClasses.READ,
+    QueueNames.SETTINGS_SAVE: QueueClasses.WRITE,
+    QueueNames.SETTINGS_DELETE: QueueClasses.WRITE,
+    # Пакет может содержать записи
+    QueueNames.SETTINGS_BATCH: QueueClasses.WRITE,
+    QueueNames.METADATA_GET: QueueClasses.AMOCRM,
+    QueueNames.WEBHOOKS: QueueClasses.WEBHOOKS,
+}
+
+
 # Таймауты и retry настройки
-RPC_TIMEOUT = 30  # секунд
-MAX_RETRY_COUNT = 3
-RETRY_DELAY = 5  # секунд
+RPC_TIMEOUT = 30  # секунд, для очередей без своего таймаута
+
+# Таймауты RPC по очередям: столько web ждет ответа, после этого
+# запрос считается брошенным и воркер его не обрабатывает
+RPC_TIMEOUTS = {
+    QueueNames.SETTINGS_SAVE: 15,
+    QueueNames.SETTINGS_GET: 5,
+    QueueNames.SETTINGS_DELETE: 10,
+    QueueNames.SETTINGS_BATCH: 30,
+    # Может ждать загрузки метаданных из AmoCRM (rate limit)
+    QueueNames.METADATA_GET: 30,
+    QueueNames.HIDDEN_LEADS_GET: 10,
+    QueueNames.HEALTH: 10,
+}
+
+# Заголовок с абсолютным дедлайном запроса (unix time, секунды)
+DEADLINE_HEADER = "x-deadline"
+# Поля маршрутизации для логов воркера (читаются без декодирования тела)
+SUBDOMAIN_HEADER = "x-subdomain"
+REQUEST_ID_HEADER = "x-request-id"
+# HMAC подпись тела, провалидированного web (см. app.core.broker.signing)
+SIGNATURE_HEADER = "x-signature"
+# Версия записи настроек менеджера (time_ns web при публикации, см. settings_write_options)
+SETTINGS_VERSION_HEADER = "x-settings-version"
+
+# Задержки перед повторными попытками (по одной на попытку), секунд
+RETRY_DELAYS = (5, 15, 60)
+MAX_RETRY_COUNT = len(RETRY_DELAYS)
+# Заголовок с номером повторной попытки
+RETRY_COUNT_HEADER = "x-retry-count"
+
+
+def rpc_timeout(queue: str) -> float:
+    """Таймаут RPC запроса в очередь."""
+    return RPC_TIMEOUTS.get(queue, RPC_TIMEOUT)
+
+
+def deadline_options(timeout: float) -> Dict[str, Any]:
+    """
+    Параметры публикации RPC запроса с дедлайном: AMQP expiration (RabbitMQ
+    удалит сообщение, не дождавшееся consumer'а) и заголовок x-deadline
+    (воркер отбросит сообщение, полученное после дедлайна).
+
+    Args:
+        timeout: Сколько секунд вызывающая сторона ждет ответа
+    """
+    return {
+        "expiration": timeout,
+        "headers": {DEADLINE_HEADER: time.time() + timeout},
+    }
+
+
+def settings_write_options(timeout: float) -> Dict[str, Any]:
+    """
+    Параметры публикации записи настроек (SAVE, DELETE, пакет): дедлайн и
+    версия записи. Воркеры применяют записи менеджера только в порядке
+    возрастания версии, даже если сообщения обработаны не по порядку.
+
+    Args:
+        timeout: Сколько секунд вызывающая сторона ждет ответа
+    """
+    options = deadline_options(timeout)
+    options["headers"][SETTINGS_VERSION_HEADER] = time.time_ns()
+    return options
+
+
+def settings_write_version(headers: Optional[Dict[str, Any]]) -> int:
+    """
+    Версия записи настроек из заголовков сообщения. Для сообщений без
+    версии (клиенты до x-settings-version) - время получения воркером.
+    """
+    version = (headers or {}).get(SETTINGS_VERSION_HEADER)
+    if isinstance(version, int):
+        return version
+    return time.time_ns()
+
+
+def retry_queue_name(queue: str, delay: int) -> str:
+    """
+    Очередь задержки для повторной попытки.
+
+    Сообщения лежат в ней delay секунд (x-message-ttl), после чего
+    dead-lettering возвращает их в исходную очередь.
+    """
+    return f"{queue}.retry.{delay}"
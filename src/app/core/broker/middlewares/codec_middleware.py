@@ -0,0 +1,30 @@
+"""
+Middleware для кодирования RPC ответов в формате запроса.
+"""
+
+from typing import Any
+
+from faststream import BaseMiddleware, Response
+from faststream.rabbit import RabbitResponse
+
+from app.core.broker.codec import MSGPACK_CONTENT_TYPE, encode, is_msgpack
+
+
+class ReplyCodecMiddleware(BaseMiddleware):
+    """
+    Middleware, кодирующий ответ обработчика в msgpack, если запрос пришел в msgpack.
+
+    Ответы на JSON запросы не меняются (их кодирует FastStream), поэтому
+    клиенты без поддержки msgpack получают JSON как раньше.
+    """
+
+    async def consume_scope(self, call_next, msg) -> Any:
+        result = await call_next(msg)
+
+        if not is_msgpack(msg.content_type) or isinstance(result, Response):
+            return result
+
+        return RabbitResponse(
+            encode(result, MSGPACK_CONTENT_TYPE),
+            content_type=MSGPACK_CONTENT_TYPE,
+        )
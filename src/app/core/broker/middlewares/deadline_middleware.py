@@ -0,0 +1,48 @@
+"""
+Middleware для отбрасывания запросов с истекшим дедлайном.
+"""
+
+import time
+from typing import Any, Optional
+
+from faststream import BaseMiddleware
+from faststream.exceptions import AckMessage
+
+from app.core.broker.config import DEADLINE_HEADER
+from app.core.logging import logger
+from app.core.metrics import metrics
+
+
+def message_deadline(headers: Optional[dict]) -> Optional[float]:
+    """Абсолютный дедлайн сообщения из заголовка x-deadline (None - без дедлайна)."""
+    value = (headers or {}).get(DEADLINE_HEADER)
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class DeadlineMiddleware(BaseMiddleware):
+    """
+    Middleware, отбрасывающий сообщения, дедлайн которых уже прошел.
+
+    Web ждет RPC ответ ограниченное время; если сообщение дошло до воркера
+    позже, ответ уже никому не нужен. Такое сообщение подтверждается без
+    обработки (до обращения к БД), отброшенные считаются в метрике
+    broker_expired_total.
+    """
+
+    async def consume_scope(self, call_next, msg) -> Any:
+        deadline = message_deadline(msg.headers)
+
+        if deadline is not None and time.time() > deadline:
+            queue = getattr(msg.raw_message, "routing_key", None) or "unknown"
+            logger.warning(
+                "Сообщение отброшено: дедлайн истек %.3f сек назад | queue: %s",
+                time.time() - deadline,
+                queue
+            )
+            metrics.inc("broker_expired_total", labels={"queue": queue})
+            raise AckMessage()
+
+        return await call_next(msg)
@@ -2,93 +2,75 @@
 Middleware для логирования сообщений.
 """
 
-import json
 import uuid
-from types import TracebackType
+from typing import Any, Optional
 
 from faststream import BaseMiddleware
+from faststream.exceptions import HandlerException
 
+from app.core.broker.config import REQUEST_ID_HEADER, SUBDOMAIN_HEADER
 from app.core.logging import logger, subdomain_var, request_id_var
 
 
+async def _message_subdomain(msg) -> Optional[str]:
+    """
+    Субдомен сообщения: из заголовка x-subdomain, а для сообщений без него
+    (старые клиенты, вебхуки) - из тела.
+
+    Тело декодируется через msg.decode(): результат кешируется в сообщении
+    и переиспользуется FastStream для обработчика, поэтому повторного
+    разбора не происходит.
+    """
+    subdomain = (msg.headers or {}).get(SUBDOMAIN_HEADER)
+    if subdomain:
+        return subdomain
+
+    body = await msg.decode()
+    if isinstance(body, dict):
+        # Извлекаем subdomain из разных возможных ключей
+        return body.get("subdomain") or body.get("account[subdomain]")
+    return None
+
+
 class LoggingMiddleware(BaseMiddleware):
     """
     Middleware для установки контекста логирования.
 
-    Устанавливает subdomain и request_id из сообщения в contextvars,
-    логирует начало и конец обработки.
+    Устанавливает subdomain и request_id из заголовков сообщения
+    (x-subdomain, x-request-id) в contextvars, логирует начало и конец
+    обработки.
     """
 
-    async def on_receive(self) -> None:
-        """
-        Вызывается при получении сообщения из RabbitMQ.
-        Устанавливает контекст логирования (subdomain, request_id).
-        """
+    async def consume_scope(self, call_next, msg) -> Any:
+        headers = msg.headers or {}
+        request_id = headers.get(REQUEST_ID_HEADER) or str(uuid.uuid4())[:12]
+
         try:
-            # Получаем body как bytes и декодируем вручную
-            body_bytes = getattr(self.msg, "body", b"")
-
-            # Декодируем JSON из bytes
-            if isinstance(body_bytes, bytes):
-                body_str = body_bytes.decode("utf-8")
-                body = json.loads(body_str)
-            elif isinstance(body_bytes, str):
-                body = json.loads(body_bytes)
-            else:
-                body = body_bytes  # Уже dict
-
-            # Извлекаем subdomain из разных возможных ключей
-            subdomain = body.get("subdomain") or body.get("account[subdomain]") or "unknown"
-
-            # Генерируем request_id
-            request_id = str(uuid.uuid4())[:12]
-
-            # Устанавливаем contextvars
-            self._subdomain_token = subdomain_var.set(subdomain)
-            self._request_id_token = request_id_var.set(request_id)
-
-            # Получаем имя очереди из routing_key
-            queue_name = "unknown"
-            routing_key = getattr(self.msg, "routing_key", None)
-            consumer_tag = getattr(self.msg, "consumer_tag", None)
-
-            if routing_key:
-                queue_name = routing_key
-            elif consumer_tag:
-                queue_name = consumer_tag
+            subdomain = await _message_subdomain(msg) or "unknown"
+        except Exception as e:
+            logger.error("Ошибка в LoggingMiddleware: не удалось определить subdomain: %s", e)
+            subdomain = "unknown"
 
-            logger.info("Получено сообщение из очереди [%s]", queue_name)
+        subdomain_token = subdomain_var.set(subdomain)
+        request_id_token = request_id_var.set(request_id)
 
-        except Exception as e:
-            logger.error("Ошибка в LoggingMiddleware.on_receive: %s", e, exc_info=True)
-            # Устанавливаем дефолтные значения
-            self._subdomain_token = subdomain_var.set("unknown")
-            self._request_id_token = request_id_var.set(str(uuid.uuid4())[:12])
-
-    async def after_processed(
-        self,
-        exc_type: type[BaseException] | None = None,
-        exc_val: BaseException | None = None,
-        exc_tb: TracebackType | None = None,
-    ) -> bool | None:
-        """
-        Вызывается после обработки сообщения.
-        Логирует результат и сбрасывает контекст.
-        """
         try:
-            if exc_type is None:
-                logger.info("Сообщение успешно обработано")
-            else:
-                logger.error(
-                    "Ошибка при обработке сообщения: %s: %s",
-                    exc_type.__name__,
-                    exc_val,
-                )
+            queue_name = getattr(msg.raw_message, "routing_key", None) or "unknown"
+            logger.info("Получено сообщение из очереди [%s]", queue_name)
+
+            try:
+                result = await call_next(msg)
+            except HandlerException as e:
+                # Ack/Nack/Reject, выброшенные middleware (например, отправка на повтор)
+                logger.info("Обработка сообщения завершена: %s", type(e).__name__)
+                raise
+            except Exception as e:
+                logger.error("Ошибка при обработке сообщения: %s: %s", type(e).__name__, e)
+                raise
+
+            logger.info("Сообщение успешно обработано")
+            return result
         finally:
             # Сбрасываем contextvars
-            if hasattr(self, "_subdomain_token"):
-                subdomain_var.reset(self._subdomain_token)
-            if hasattr(self, "_request_id_token"):
-                request_id_var.reset(self._request_id_token)
-
-        return await super().after_processed(exc_type, exc_val, exc_tb)
+            subdomain_var.reset(subdomain_token)
+            request_id_var.reset(request_id_token)
@@ -1,17 +1,33 @@
 """
 Middleware для автоматических retry попыток при ошибках.
+
+Воркер не ждет задержку, удерживая сообщение: при ошибке сообщение
+публикуется в очередь задержки "<очередь>.retry.<секунд>" с x-message-ttl
+и dead-lettering обратно в исходную очередь, а исходное сообщение
+подтверждается. Номер попытки передается в заголовке x-retry-count,
+reply_to и correlation_id сохраняются, поэтому RPC ответ после успешной
+повторной попытки дойдет до вызывающей стороны.
 """
 
-import asyncio
-from types import TracebackType
+import time
+from typing import Any, Set
 
 from faststream import BaseMiddleware
+from faststream.exceptions import AckMessage, HandlerException
+from faststream.rabbit import RabbitQueue
 
+from app.core.broker.config import (
+    MAX_RETRY_COUNT,
+    RETRY_COUNT_HEADER,
+    RETRY_DELAYS,
+    retry_queue_name,
+)
+from app.core.broker.middlewares.deadline_middleware import message_deadline
 from app.core.logging import logger
-from app.core.settings import config
-# Config constants
-MAX_RETRY_COUNT = 3
-RETRY_DELAY = 5  # MAX_RETRY_COUNT, RETRY_DELAY
+from app.core.metrics import metrics
+
+# Очереди задержки, уже объявленные этим процессом
+_declared_retry_queues: Set[str] = set()
 
 
 class RetryMiddleware(BaseMiddleware):
@@ -19,47 +35,87 @@ class RetryMiddleware(BaseMiddleware):
     Middleware для автоматических retry попыток при ошибках обработки сообщений.
     """
 
-    async def on_receive(self) -> None:
-        """Вызывается при получении сообщения."""
-        # Инициализируем счетчик попыток
-        self._attempt = 0
-        self._max_retries = MAX_RETRY_COUNT
-
-    async def after_processed(
-        self,
-        exc_type: type[BaseException] | None = None,
-        exc_val: BaseException | None = None,
-        exc_tb: TracebackType | None = None,
-    ) -> bool | None:
+    async def consume_scope(self, call_next, msg) -> Any:
         """
-        Вызывается после обработки сообщения.
-
-        Если произошла ошибка и не исчерпаны попытки - повторяет обработку.
+        Обработка сообщения; при ошибке - отложенная повторная попытка
+        через очередь задержки.
         """
-        if exc_type is not None:
-            self._attempt += 1
-
-            if self._attempt < self._max_retries:
-                logger.warning(
-                    "Ошибка обработки сообщения (попытка %s/%s): %s. Повтор через %s сек",
-                    self._attempt,
-                    self._max_retries,
-                    exc_val,
-                    RETRY_DELAY
-                )
+        try:
+            return await call_next(msg)
+        except HandlerException:
+            raise
+        except Exception as e:
+            attempt = int((msg.headers or {}).get(RETRY_COUNT_HEADER, 0)) + 1
+            queue = getattr(msg.raw_message, "routing_key", None)
 
-                # Ждем перед повторной попыткой
-                await asyncio.sleep(RETRY_DELAY)
-
-                # Возвращаем False чтобы сообщение не было подтверждено
-                # и обработано повторно
-                return False
-            else:
+            if attempt > MAX_RETRY_COUNT or not queue:
                 logger.error(
                     "Исчерпаны все попытки обработки сообщения (%s/%s): %s",
-                    self._attempt,
-                    self._max_retries,
-                    exc_val
+                    attempt - 1,
+                    MAX_RETRY_COUNT,
+                    e
+                )
+                metrics.inc("broker_retry_exhausted_total", labels={"queue": queue or "unknown"})
+                raise
+
+            delay = RETRY_DELAYS[attempt - 1]
+            deadline = message_deadline(msg.headers)
+            if deadline is not None and time.time() + delay > deadline:
+                logger.error(
+                    "Повтор не выполняется: дедлайн запроса истечет раньше (попытка %s/%s): %s",
+                    attempt,
+                    MAX_RETRY_COUNT,
+                    e
+                )
+                metrics.inc("broker_retry_exhausted_total", labels={"queue": queue})
+                raise
+
+            try:
+                await self._publish_retry(msg, queue, delay, attempt)
+            except Exception as publish_error:
+                logger.error("Не удалось отправить сообщение на повтор: %s", publish_error)
+                raise e
+
+            logger.warning(
+                "Ошибка обработки сообщения (попытка %s/%s): %s. Повтор через %s сек",
+                attempt,
+                MAX_RETRY_COUNT,
+                e,
+                delay
+            )
+            metrics.inc("broker_retries_total", labels={"queue": queue})
+
+            # Копия отправлена в очередь задержки - исходное сообщение подтверждаем
+            raise AckMessage()
+
+    async def _publish_retry(self, msg, queue: str, delay: int, attempt: int) -> None:
+        broker = self.context.get("broker")
+        name = retry_queue_name(queue, delay)
+
+        if name not in _declared_retry_queues:
+            await broker.declare_queue(
+                RabbitQueue(
+                    name,
+                    durable=True,
+                    arguments={
+                        "x-message-ttl": delay * 1000,
+                        "x-dead-letter-exchange": "",
+                        "x-dead-letter-routing-key": queue,
+                    },
                 )
+            )
+            _declared_retry_queues.add(name)
 
-        return await super().after_processed(exc_type, exc_val, exc_tb)
+        raw = msg.raw_message
+        await broker.publish(
+            msg.body,
+            routing_key=name,
+            headers={**(msg.headers or {}), RETRY_COUNT_HEADER: attempt},
+            content_type=raw.content_type,
+            content_encoding=raw.content_encoding,
+            correlation_id=raw.correlation_id,
+            reply_to=raw.reply_to,
+            message_id=raw.message_id,
+            priority=raw.priority,
+            persist=True,
+        )
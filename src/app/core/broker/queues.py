@@ -0,0 +1,40 @@
+"""
+Объявления RPC очередей с учетом приоритетов и миграции на них.
+
+Аргументы существующей очереди RabbitMQ (в том числе x-max-priority) изменить
+нельзя. Поэтому с RABBITMQ_PRIORITY_QUEUES=true RPC идет через новые очереди
+"<имя>.v2" с x-max-priority, а старые очереди воркеры дочитывают, пока
+включен RABBITMQ_DRAIN_LEGACY_QUEUES (см. команду delete-legacy-queues).
+"""
+
+from typing import Any, Callable
+
+from faststream.rabbit import RabbitQueue, RabbitRouter
+
+from app.core.broker.channels import queue_channel
+from app.core.broker.config import LEGACY_QUEUE_NAMES, MAX_PRIORITY
+from app.core.settings import config
+
+
+def rpc_queue(queue: str) -> RabbitQueue:
+    """Объявление RPC очереди (с x-max-priority, если приоритеты включены)."""
+    if queue in LEGACY_QUEUE_NAMES:
+        return RabbitQueue(queue, durable=True, arguments={"x-max-priority": MAX_PRIORITY})
+    return RabbitQueue(queue, durable=True)
+
+
+def drain_legacy_queue(router: RabbitRouter, queue: str, **options: Any) -> Callable:
+    """
+    Декоратор handler'а: на время миграции handler также читает старую
+    очередь без приоритетов, которую заменила queue.
+
+    Args:
+        router: Роутер handler'а
+        queue: Очередь handler'а
+        **options: Параметры subscriber'а основной очереди (например, decoder)
+    """
+    legacy = LEGACY_QUEUE_NAMES.get(queue)
+    if legacy is None or not config.rabbit_cfg.DRAIN_LEGACY_QUEUES:
+        return lambda handler: handler
+
+    return router.subscriber(RabbitQueue(legacy, durable=True), channel=queue_channel(queue), **options)
@@ -6,15 +6,19 @@ from typing import Dict, Any
 
 from faststream.rabbit import RabbitRouter, RabbitQueue
 
+from app.amocrm.circuit_breaker import amocrm_circuit_breakers
+from app.core.broker.channels import queue_channel
 from app.core.broker.config import QueueNames
 from app.core.logging import logger
+from app.core.metrics import metrics
 
 
 health_router = RabbitRouter()
 
 
 @health_router.subscriber(
-    RabbitQueue(QueueNames.HEALTH, durable=True)
+    RabbitQueue(QueueNames.HEALTH, durable=True),
+    channel=queue_channel(QueueNames.HEALTH),
 )
 async def handle_health_check(data: dict) -> Dict[str, Any]:
     """
@@ -24,11 +28,13 @@ async def handle_health_check(data: dict) -> Dict[str, Any]:
         data: Данные из RabbitMQ сообщения (может быть пустым)
 
     Returns:
-        Dict со статусом сервиса
+        Dict со статусом сервиса, состояниями circuit breaker'ов AmoCRM и метриками
     """
     logger.debug("Health check запрос")
 
     return {
         "status": "ok",
-        "service": "hiding-data"
+        "service": "hiding-data",
+        "circuit_breakers": amocrm_circuit_breakers.states(),
+        "metrics": metrics.snapshot(),
     }
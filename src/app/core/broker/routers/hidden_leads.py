@@ -0,0 +1,91 @@
+from typing import Dict, Any, Annotated
+from faststream import Depends
+from faststream.rabbit import RabbitRouter
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.broker.channels import queue_channel
+from app.core.broker.config import QueueNames
+from app.core.broker.queues import drain_legacy_queue, rpc_queue
+from app.core.broker.dependencies import get_db_session
+from app.core.logging import logger, subdomain_var
+from app.services.lead_index_service import is_lead_hidden, list_hidden_leads
+
+hidden_leads_router = RabbitRouter()
+
+# Максимальный размер страницы списка скрытых сделок
+HIDDEN_LEADS_PAGE_LIMIT = 10000
+
+
+@hidden_leads_router.subscriber(
+    rpc_queue(QueueNames.HIDDEN_LEADS_GET),
+    channel=queue_channel(QueueNames.HIDDEN_LEADS_GET),
+)
+@drain_legacy_queue(hidden_leads_router, QueueNames.HIDDEN_LEADS_GET)
+async def handle_get_hidden_leads(
+    data: dict,
+    db_session: Annotated[AsyncSession, Depends(get_db_session)],
+) -> Dict[str, Any]:
+    """
+    Handler для проверки скрытых от менеджера сделок по индексу.
+    С lead_id - проверка одной сделки, без него - страница списка скрытых ID.
+    """
+    try:
+        subdomain = data.get("subdomain")
+        manager_id = data.get("manager_id")
+        lead_id = data.get("lead_id")
+
+        if not subdomain or not manager_id:
+            logger.warning(
+                "Некорректный запрос HIDDEN_LEADS | missing_params: subdomain=%s, manager_id=%s",
+                subdomain is None,
+                manager_id is None
+            )
+            return {
+                "success": False,
+                "error": "subdomain and manager_id are required"
+            }
+
+        # Устанавливаем subdomain для логов
+        subdomain_var.set(subdomain)
+
+        logger.info(
+            "Получено сообщение HIDDEN_LEADS | subdomain: %s, manager_id: %s, lead_id: %s, queue: %s",
+            subdomain,
+            manager_id,
+            lead_id,
+            QueueNames.HIDDEN_LEADS_GET
+        )
+
+        if lead_id:
+            hidden = await is_lead_hidden(subdomain, manager_id, lead_id, db_session)
+            return {
+                "success": True,
+                "data": {"lead_id": lead_id, "hidden": hidden}
+            }
+
+        limit = min(int(data.get("limit") or HIDDEN_LEADS_PAGE_LIMIT), HIDDEN_LEADS_PAGE_LIMIT)
+        lead_ids = await list_hidden_leads(
+            subdomain,
+            manager_id,
+            db_session,
+            after_lead_id=int(data.get("after") or 0),
+            limit=limit
+        )
+
+        return {
+            "success": True,
+            "data": {
+                "lead_ids": lead_ids,
+                "next_after": lead_ids[-1] if len(lead_ids) == limit else None,
+            }
+        }
+    except Exception as e:
+        logger.error(
+            "Ошибка обработки HIDDEN_LEADS | error: %s, error_type: %s",
+            str(e),
+            type(e).__name__
+        )
+        return {
+            "success": False,
+            "error": str(e)
+        }
@@ -0,0 +1,70 @@
+from typing import Dict, Any, Annotated
+from faststream import Depends
+from faststream.rabbit import RabbitRouter
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.amocrm.metadata import metadata_cache
+from app.amocrm.rate_limited_session import RateLimitedClientSession
+from app.core.broker.channels import queue_channel
+from app.core.broker.config import QueueNames
+from app.core.broker.queues import drain_legacy_queue, rpc_queue
+from app.core.broker.dependencies import get_db_session, get_http_session
+from app.core.logging import logger, subdomain_var
+from app.services.permissions_service import refresh_hidden_ids_for_subdomain
+
+metadata_router = RabbitRouter()
+
+
+@metadata_router.subscriber(
+    rpc_queue(QueueNames.METADATA_GET),
+    channel=queue_channel(QueueNames.METADATA_GET),
+)
+@drain_legacy_queue(metadata_router, QueueNames.METADATA_GET)
+async def handle_get_metadata(
+    data: dict,
+    http_session: Annotated[RateLimitedClientSession, Depends(get_http_session)],
+    db_session: Annotated[AsyncSession, Depends(get_db_session)],
+) -> Dict[str, Any]:
+    """
+    Handler для получения метаданных аккаунта AmoCRM (поля, воронки, статусы).
+    При refresh=True метаданные перезагружаются из AmoCRM.
+    Если метаданные изменились - пересчитывает скрытые ID менеджеров субдомена.
+    """
+    try:
+        subdomain = data.get("subdomain")
+        refresh = bool(data.get("refresh", False))
+
+        if not subdomain:
+            logger.warning("Некорректный запрос METADATA | missing_params: subdomain")
+            return {
+                "success": False,
+                "error": "subdomain is required"
+            }
+
+        # Устанавливаем subdomain для логов
+        subdomain_var.set(subdomain)
+
+        logger.info(
+            "Получено сообщение METADATA | subdomain: %s, refresh: %s, queue: %s",
+            subdomain,
+            refresh,
+            QueueNames.METADATA_GET
+        )
+
+        metadata = await metadata_cache.get(subdomain, http_session, force_refresh=refresh)
+        await refresh_hidden_ids_for_subdomain(subdomain, metadata, db_session)
+
+        return {
+            "success": True,
+            "data": metadata
+        }
+    except Exception as e:
+        logger.error(
+            "Ошибка обработки METADATA | error: %s, error_type: %s",
+            str(e),
+            type(e).__name__
+        )
+        return {
+            "success": False,
+            "error": str(e)
+        }
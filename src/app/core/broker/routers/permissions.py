@@ -1,26 +1,276 @@
-from typing import Dict, Any, Annotated
+from typing import Dict, Any, Annotated, List, Optional, Tuple
+from aiohttp import ClientSession, TCPConnector
 from faststream import Depends
-from faststream.rabbit import RabbitQueue, RabbitRouter
+from faststream.rabbit import RabbitRouter
+from faststream.rabbit.annotations import RabbitMessage
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.broker.config import QueueNames
+from app.amocrm.metadata import metadata_cache
+from app.amocrm.rate_limited_session import RateLimitedClientSession
+from app.core.broker.channels import queue_channel
+from app.core.broker.coalescing import SaveCoalescer
+from app.core.broker.codec import decode, is_msgpack, raw_body_decoder
+from app.core.broker.config import QueueNames, rpc_timeout, settings_write_version
+from app.core.broker.queues import drain_legacy_queue, rpc_queue
 from app.core.broker.dependencies import get_db_session
+from app.core.broker.signing import is_trusted
 from app.core.logging import logger, subdomain_var
+from app.db.async_session import async_session
+from app.models.user_permissions import UserPermissions
+from app.services.lead_index_service import (
+    delete_hidden_for_manager,
+    list_hidden_leads,
+    rebuild_hidden_for_manager,
+)
 from app.services.permissions_service import (
     get_permissions_by_manager,
-    save_permissions,
+    get_permissions_for_managers,
+    save_permissions_document,
     delete_permissions,
+    claim_settings_version,
+    refresh_hidden_ids,
 )
-from app.schemas.permissions import SaveSettingsRequest
+from app.schemas.permissions import SAVE_SETTINGS_ADAPTER, BatchOperation, BatchSettingsRequest
+
+# Чтения и записи - разные классы очередей (свои каналы и процессы воркера)
+permissions_read_router = RabbitRouter()
+permissions_write_router = RabbitRouter()
+
+
+async def _account_metadata(subdomain: str) -> Dict[str, Any]:
+    """
+    Метаданные аккаунта для расчета скрытых ID: из кеша (память или
+    PostgreSQL), а если их еще нет - загрузка из AmoCRM через rate limiter.
+    Процессы классов read/write не обслуживают METADATA_GET, поэтому без
+    загрузки у них не было бы метаданных вовсе.
+    """
+    metadata = await metadata_cache.get_cached(subdomain)
+    if metadata is not None:
+        return metadata
+
+    async with ClientSession(connector=TCPConnector(ssl=False)) as session:
+        return await metadata_cache.get(subdomain, RateLimitedClientSession(session))
+
+
+async def _ensure_hidden_ids(permissions: UserPermissions, db_session: AsyncSession) -> None:
+    """
+    Пересчет скрытых ID менеджера, если изменились настройки или метаданные.
+    Устаревшие метаданные из кеша используются как есть; AmoCRM запрашивается
+    только при их отсутствии.
+    """
+    try:
+        metadata = await _account_metadata(permissions.subdomain)
+        await refresh_hidden_ids(permissions, metadata, db_session)
+    except Exception as e:
+        logger.warning(
+            "Не удалось рассчитать скрытые ID | subdomain: %s, manager_id: %s, error: %s",
+            permissions.subdomain,
+            permissions.manager_id,
+            e
+        )
+
+
+async def _rebuild_hidden_leads(permissions: UserPermissions, version: int, db_session: AsyncSession) -> None:
+    """
+    Пересборка набора скрытых сделок менеджера по новым правилам. Версия
+    захватывается повторно: если уже применена более новая запись, набор
+    пересоберет она.
+    """
+    try:
+        if not await claim_settings_version(permissions.subdomain, permissions.manager_id, version, db_session):
+            await db_session.rollback()
+            return
+        await rebuild_hidden_for_manager(
+            permissions.subdomain, permissions.manager_id, permissions.permissions, db_session
+        )
+    except Exception as e:
+        await db_session.rollback()
+        logger.warning(
+            "Не удалось пересобрать скрытые сделки | subdomain: %s, manager_id: %s, error: %s",
+            permissions.subdomain,
+            permissions.manager_id,
+            e
+        )
+
+
+def _parse_save_request(body: bytes, message: RabbitMessage) -> Tuple[str, int, Dict[str, Any]]:
+    """
+    Разбор тела SAVE: (субдомен, ID менеджера, документ настроек).
+
+    Тело, подписанное web (уже провалидированное FastAPI), только декодируется.
+    Остальные сообщения валидируются заранее собранным SAVE_SETTINGS_ADAPTER:
+    JSON - validate_json по сырым bytes за один проход.
+    """
+    if is_trusted(body, message.headers):
+        data = decode(body, message.content_type)
+        return data["subdomain"], data["manager_id"], data["permissions"]
+
+    if is_msgpack(message.content_type):
+        request = SAVE_SETTINGS_ADAPTER.validate_python(decode(body, message.content_type))
+    else:
+        request = SAVE_SETTINGS_ADAPTER.validate_json(body)
+    return request.subdomain, request.manager_id, request.permissions.model_dump()
+
+
+def _settings_data(permissions: UserPermissions, hidden: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Данные настроек менеджера для ответа."""
+    return {
+        "subdomain": permissions.subdomain,
+        "manager_id": permissions.manager_id,
+        "permissions": permissions.permissions,
+        "hidden": hidden,
+        "created_at": permissions.created_at.isoformat() if permissions.created_at else None,
+        "updated_at": permissions.updated_at.isoformat() if permissions.updated_at else None,
+    }
+
+
+async def _get_result(
+    permissions: UserPermissions,
+    include_leads: bool,
+    db_session: AsyncSession
+) -> Dict[str, Any]:
+    """Ответ GET для найденных настроек (с пересчетом скрытых ID при необходимости)."""
+    await _ensure_hidden_ids(permissions, db_session)
+
+    hidden = permissions.hidden_ids
+    if include_leads:
+        # Скрытые сделки из индекса (могут быть большими - клиенту лучше запрашивать компактное кодирование)
+        hidden = {
+            **(hidden or {}),
+            "leads": await list_hidden_leads(permissions.subdomain, permissions.manager_id, db_session),
+        }
+
+    return {
+        "success": True,
+        "data": _settings_data(permissions, hidden)
+    }
+
+
+async def _save_result(
+    subdomain: str,
+    manager_id: int,
+    document: Dict[str, Any],
+    version: int,
+    db_session: AsyncSession
+) -> Dict[str, Any]:
+    """
+    Сохранение провалидированного документа настроек с пересчетом скрытых ID
+    и скрытых сделок. Устаревшее сохранение (уже применена запись с большей
+    версией) не записывается и отвечает текущими настройками.
+    """
+    if not await claim_settings_version(subdomain, manager_id, version, db_session):
+        await db_session.rollback()
+        current = await get_permissions_by_manager(subdomain, manager_id, db_session)
+        return {
+            "success": True,
+            "data": _settings_data(current, current.hidden_ids) if current else None
+        }
+
+    permissions = await save_permissions_document(subdomain, manager_id, document, db_session)
+    await _ensure_hidden_ids(permissions, db_session)
+    await _rebuild_hidden_leads(permissions, version, db_session)
+
+    logger.info(
+        "Отправка успешного ответа | subdomain: %s, manager_id: %s, record_id: %s",
+        permissions.subdomain,
+        permissions.manager_id,
+        permissions.id
+    )
+
+    return {
+        "success": True,
+        "data": _settings_data(permissions, permissions.hidden_ids)
+    }
+
+
+async def _delete_result(
+    subdomain: str,
+    manager_id: int,
+    version: int,
+    db_session: AsyncSession
+) -> Dict[str, Any]:
+    """
+    Удаление настроек и скрытых сделок менеджера. Устаревшее удаление (уже
+    применено более новое сохранение) ничего не удаляет.
+    """
+    if not await claim_settings_version(subdomain, manager_id, version, db_session):
+        await db_session.rollback()
+        return {
+            "success": True
+        }
+
+    # Удаление фиксируется вместе с захваченной версией
+    deleted = await delete_permissions(
+        subdomain=subdomain,
+        manager_id=manager_id,
+        session=db_session
+    )
+
+    if not deleted:
+        logger.info(
+            "Отправка ответа NOT_FOUND | subdomain: %s, manager_id: %s",
+            subdomain,
+            manager_id
+        )
+        return {
+            "success": False,
+            "error": "Settings not found or already deleted"
+        }
+
+    try:
+        if await claim_settings_version(subdomain, manager_id, version, db_session):
+            await delete_hidden_for_manager(subdomain, manager_id, db_session)
+        else:
+            await db_session.rollback()
+    except Exception as e:
+        await db_session.rollback()
+        logger.warning(
+            "Не удалось удалить скрытые сделки | subdomain: %s, manager_id: %s, error: %s",
+            subdomain,
+            manager_id,
+            e
+        )
+
+    logger.info(
+        "Отправка успешного ответа DELETE | subdomain: %s, manager_id: %s",
+        subdomain,
+        manager_id
+    )
+
+    return {
+        "success": True
+    }
+
+
+async def _write_coalesced_save(
+    subdomain: str,
+    manager_id: int,
+    document: Dict[str, Any],
+    version: int
+) -> Dict[str, Any]:
+    """
+    Запись последнего документа окна объединения: своя сессия БД (сессии
+    handler'ов окна к этому моменту могут быть закрыты), те же шаги, что и
+    у одиночного SAVE.
+    """
+    async with async_session() as db_session:
+        return await _save_result(subdomain, manager_id, document, version, db_session)
 
-permissions_router = RabbitRouter()
 
+# Объединение автосохранений одного менеджера (WORKER_SAVE_COALESCE_WINDOW)
+save_coalescer = SaveCoalescer(_write_coalesced_save, timeout=rpc_timeout(QueueNames.SETTINGS_SAVE))
 
-@permissions_router.subscriber(
-    RabbitQueue(QueueNames.SETTINGS_SAVE, durable=True)
+
+@permissions_write_router.subscriber(
+    rpc_queue(QueueNames.SETTINGS_SAVE),
+    channel=queue_channel(QueueNames.SETTINGS_SAVE),
+    # Тело разбирается в handler'е (_parse_save_request), без промежуточного dict
+    decoder=raw_body_decoder,
 )
+@drain_legacy_queue(permissions_write_router, QueueNames.SETTINGS_SAVE, decoder=raw_body_decoder)
 async def handle_save_settings(
-    data: dict,
+    body: bytes,
+    message: RabbitMessage,
     db_session: Annotated[AsyncSession, Depends(get_db_session)],
 ) -> Dict[str, Any]:
     """
@@ -28,37 +278,21 @@ async def handle_save_settings(
     Если настройки уже существуют - удаляет старые и создаёт новые.
     """
     try:
-        # Валидация данных через Pydantic
-        request = SaveSettingsRequest(**data)
-        subdomain_var.set(request.subdomain)
+        subdomain, manager_id, document = _parse_save_request(body, message)
+        version = settings_write_version(message.headers)
+        subdomain_var.set(subdomain)
 
         logger.info(
             "Получено сообщение SAVE | subdomain: %s, manager_id: %s, queue: %s",
-            request.subdomain,
-            request.manager_id,
+            subdomain,
+            manager_id,
             QueueNames.SETTINGS_SAVE
         )
 
-        # Вызов сервисного слоя
-        permissions = await save_permissions(request, db_session)
-
-        logger.info(
-            "Отправка успешного ответа | subdomain: %s, manager_id: %s, record_id: %s",
-            permissions.subdomain,
-            permissions.manager_id,
-            permissions.id
-        )
-
-        return {
-            "success": True,
-            "data": {
-                "subdomain": permissions.subdomain,
-                "manager_id": permissions.manager_id,
-                "permissions": permissions.permissions,
-                "created_at": permissions.created_at.isoformat() if permissions.created_at else None,
-                "updated_at": permissions.updated_at.isoformat() if permissions.updated_at else None,
-            }
-        }
+        # Вызов сервисного слоя (с окном объединения - одна запись на окно)
+        if save_coalescer.enabled:
+            return await save_coalescer.save(subdomain, manager_id, document, version)
+        return await _save_result(subdomain, manager_id, document, version, db_session)
     except Exception as e:
         logger.error(
             "Ошибка обработки SAVE | error: %s, error_type: %s",
@@ -71,9 +305,11 @@ async def handle_save_settings(
         }
 
 
-@permissions_router.subscriber(
-    RabbitQueue(QueueNames.SETTINGS_GET, durable=True)
+@permissions_read_router.subscriber(
+    rpc_queue(QueueNames.SETTINGS_GET),
+    channel=queue_channel(QueueNames.SETTINGS_GET),
 )
+@drain_legacy_queue(permissions_read_router, QueueNames.SETTINGS_GET)
 async def handle_get_settings(
     data: dict,
     db_session: Annotated[AsyncSession, Depends(get_db_session)],
@@ -131,16 +367,7 @@ async def handle_get_settings(
             permissions.id
         )
 
-        return {
-            "success": True,
-            "data": {
-                "subdomain": permissions.subdomain,
-                "manager_id": permissions.manager_id,
-                "permissions": permissions.permissions,
-                "created_at": permissions.created_at.isoformat() if permissions.created_at else None,
-                "updated_at": permissions.updated_at.isoformat() if permissions.updated_at else None,
-            }
-        }
+        return await _get_result(permissions, bool(data.get("include_leads")), db_session)
     except Exception as e:
         logger.error(
             "Ошибка обработки GET | error: %s, error_type: %s",
@@ -153,11 +380,14 @@ async def handle_get_settings(
         }
 
 
-@permissions_router.subscriber(
-    RabbitQueue(QueueNames.SETTINGS_DELETE, durable=True)
+@permissions_write_router.subscriber(
+    rpc_queue(QueueNames.SETTINGS_DELETE),
+    channel=queue_channel(QueueNames.SETTINGS_DELETE),
 )
+@drain_legacy_queue(permissions_write_router, QueueNames.SETTINGS_DELETE)
 async def handle_delete_settings(
     data: dict,
+    message: RabbitMessage,
     db_session: Annotated[AsyncSession, Depends(get_db_session)],
 ) -> Dict[str, Any]:
     """
@@ -188,36 +418,129 @@ async def handle_delete_settings(
             QueueNames.SETTINGS_DELETE
         )
 
+        # Отложенное сохранение из окна объединения не должно восстановить настройки
+        await save_coalescer.settle(subdomain, manager_id)
+
         # Удаление настроек
-        deleted = await delete_permissions(
-            subdomain=subdomain,
-            manager_id=manager_id,
-            session=db_session
+        return await _delete_result(subdomain, manager_id, settings_write_version(message.headers), db_session)
+    except Exception as e:
+        logger.error(
+            "Ошибка обработки DELETE | error: %s, error_type: %s",
+            str(e),
+            type(e).__name__
         )
+        return {
+            "success": False,
+            "error": str(e)
+        }
 
-        if not deleted:
-            logger.info(
-                "Отправка ответа NOT_FOUND | subdomain: %s, manager_id: %s",
-                subdomain,
-                manager_id
-            )
-            return {
-                "success": False,
-                "error": "Settings not found or already deleted"
-            }
+
+async def _run_get_operations(
+    operations: List[BatchOperation],
+    db_session: AsyncSession
+) -> List[Dict[str, Any]]:
+    """GET операции пакета одним запросом к БД."""
+    found = await get_permissions_for_managers(
+        [(operation.subdomain, operation.manager_id) for operation in operations],
+        db_session
+    )
+
+    results = []
+    for operation in operations:
+        permissions = found.get((operation.subdomain, operation.manager_id))
+        if permissions is None:
+            results.append({"success": False, "error": "Settings not found"})
+        else:
+            results.append(await _get_result(permissions, operation.include_leads, db_session))
+    return results
+
+
+@permissions_write_router.subscriber(
+    rpc_queue(QueueNames.SETTINGS_BATCH),
+    channel=queue_channel(QueueNames.SETTINGS_BATCH),
+)
+@drain_legacy_queue(permissions_write_router, QueueNames.SETTINGS_BATCH)
+async def handle_batch_settings(
+    data: dict,
+    message: RabbitMessage,
+    db_session: Annotated[AsyncSession, Depends(get_db_session)],
+) -> Dict[str, Any]:
+    """
+    Handler для пакета операций get/save/delete в одной сессии БД.
+
+    Операции выполняются по порядку; подряд идущие GET читаются одним
+    запросом. Запись фиксируется отдельно для каждой операции, поэтому
+    ошибка одной операции не отменяет остальные. Результаты - в порядке
+    операций, в формате ответов одиночных handler'ов.
+    """
+    try:
+        request = BatchSettingsRequest(**data)
+        operations = request.operations
+        # Одна версия на пакет: записи пакета применяются по порядку операций
+        version = settings_write_version(message.headers)
 
         logger.info(
-            "Отправка успешного ответа DELETE | subdomain: %s, manager_id: %s",
-            subdomain,
-            manager_id
+            "Получено сообщение BATCH | operations: %s, queue: %s",
+            len(operations),
+            QueueNames.SETTINGS_BATCH
+        )
+
+        results: List[Dict[str, Any]] = []
+        i = 0
+        while i < len(operations):
+            if operations[i].op == "get":
+                j = i
+                while j < len(operations) and operations[j].op == "get":
+                    j += 1
+                try:
+                    results.extend(await _run_get_operations(operations[i:j], db_session))
+                except Exception as e:
+                    await db_session.rollback()
+                    results.extend({"success": False, "error": str(e)} for _ in range(j - i))
+                i = j
+                continue
+
+            operation = operations[i]
+            try:
+                # Записи пакета не должны обгонять отложенное сохранение того же менеджера
+                await save_coalescer.settle(operation.subdomain, operation.manager_id)
+                if operation.op == "save":
+                    results.append(await _save_result(
+                        operation.subdomain,
+                        operation.manager_id,
+                        operation.permissions.model_dump(),
+                        version,
+                        db_session
+                    ))
+                else:
+                    results.append(await _delete_result(
+                        operation.subdomain, operation.manager_id, version, db_session
+                    ))
+            except Exception as e:
+                await db_session.rollback()
+                logger.error(
+                    "Ошибка операции BATCH | op: %s, subdomain: %s, manager_id: %s, error: %s",
+                    operation.op,
+                    operation.subdomain,
+                    operation.manager_id,
+                    e
+                )
+                results.append({"success": False, "error": str(e)})
+            i += 1
+
+        logger.info(
+            "Отправка ответа BATCH | operations: %s, failed: %s",
+            len(results),
+            sum(1 for result in results if not result.get("success"))
         )
 
         return {
-            "success": True
+            "success": True,
+            "data": results
         }
     except Exception as e:
         logger.error(
-            "Ошибка обработки DELETE | error: %s, error_type: %s",
+            "Ошибка обработки BATCH | error: %s, error_type: %s",
             str(e),
             type(e).__name__
         )
@@ -0,0 +1,66 @@
+from typing import Dict, Any
+from faststream.rabbit import RabbitQueue, RabbitRouter
+
+from app.amocrm.webhooks import parse_webhook, webhook_batcher
+from app.core.broker.channels import queue_channel
+from app.core.broker.config import QueueNames
+from app.core.logging import logger, subdomain_var
+
+webhooks_router = RabbitRouter()
+
+
+@webhooks_router.subscriber(
+    RabbitQueue(QueueNames.WEBHOOKS, durable=True),
+    # Отдельный канал с большим prefetch: события накапливаются в пачки, пока
+    # сообщения ждут обработки пачки, и не занимают слоты RPC очередей
+    channel=queue_channel(QueueNames.WEBHOOKS),
+)
+async def handle_amocrm_webhook(data: dict) -> Dict[str, Any]:
+    """
+    Handler для сырых вебхуков AmoCRM.
+    Разбирает payload и добавляет события в пачку субдомена. Сообщение
+    подтверждается после обработки пачки всеми sink'ами.
+
+    Принимаются только вебхуки, прошедшие проверку токена в HTTP приемнике
+    (subdomain сообщения), и только если аккаунт в теле совпадает с ним:
+    события попадают в индекс сделок без повторного чтения из AmoCRM.
+    """
+    subdomain, events = parse_webhook(data.get("body", ""))
+    authenticated = data.get("subdomain")
+
+    if not subdomain:
+        logger.warning("Некорректный вебхук AmoCRM | missing_params: account[subdomain]")
+        return {
+            "success": False,
+            "error": "account[subdomain] is required"
+        }
+
+    if not authenticated or subdomain.lower() != authenticated.lower():
+        # Сообщения без проверенного аккаунта (опубликованные до проверки токенов
+        # или в обход приемника) не применяются
+        logger.warning(
+            "Вебхук без проверенного аккаунта отброшен | subdomain: %s, authenticated: %s",
+            subdomain,
+            authenticated
+        )
+        return {
+            "success": False,
+            "error": "Webhook account is not authenticated"
+        }
+
+    # Устанавливаем subdomain для логов
+    subdomain_var.set(subdomain)
+
+    logger.info(
+        "Получен вебхук AmoCRM | subdomain: %s, events: %s, queue: %s",
+        subdomain,
+        len(events),
+        QueueNames.WEBHOOKS
+    )
+
+    await webhook_batcher.add(subdomain, events)
+
+    return {
+        "success": True,
+        "data": {"events": len(events)}
+    }
@@ -6,14 +6,11 @@ import asyncio
 import json
 from typing import Dict, Any
 
+from app.core.broker.codec import JSON_CONTENT_TYPE
+from app.core.broker.rpc_client import rpc_client
 from app.core.logging import logger
 
 
-# Семафор для предотвращения одновременных RPC вызовов
-# Это необходимо для избежания ошибки "reply consumer already set"
-_rpc_semaphore = asyncio.Semaphore(1)
-
-
 async def send_rpc_request_and_wait_for_reply(
     subdomain: str,
     client_id: str,
@@ -43,29 +40,27 @@ async def send_rpc_request_and_wait_for_reply(
 
     for attempt in range(max_retries):
         try:
-            # Используем семафор для предотвращения конкурентных RPC вызовов
-            async with _rpc_semaphore:
-                logger.info(
-                    "Отправляем RPC запрос в сервис токенов (попытка %s/%s)",
-                    attempt + 1,
-                    max_retries
-                )
-
-                # Импортируем broker внутри функции, чтобы избежать циклических импортов
-                from app.core.broker.app import broker
+            logger.info(
+                "Отправляем RPC запрос в сервис токенов (попытка %s/%s)",
+                attempt + 1,
+                max_retries
+            )
 
-                # FastStream автоматически обрабатывает correlation_id и reply_to
-                response = await broker.request(
-                    message=request_data,
-                    queue="tokens_get_user",
-                    timeout=timeout,
-                )
+            # Ответ сопоставляется с запросом по correlation_id в rpc_client,
+            # поэтому запросы для разных субдоменов выполняются параллельно
+            response = await rpc_client.request(
+                message=request_data,
+                queue="tokens_get_user",
+                timeout=timeout,
+                # Сервис токенов принимает только JSON
+                content_type=JSON_CONTENT_TYPE,
+            )
 
-                # Десериализация ответа
-                tokens = json.loads(response.body)
+            # Десериализация ответа
+            tokens = json.loads(response.body)
 
-                logger.info("Получен ответ от сервиса токенов для subdomain=%s", subdomain)
-                return tokens
+            logger.info("Получен ответ от сервиса токенов для subdomain=%s", subdomain)
+            return tokens
 
         except TimeoutError:
             if attempt < max_retries - 1:
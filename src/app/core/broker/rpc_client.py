@@ -0,0 +1,203 @@
+"""
+Мультиплексированный RPC клиент поверх RabbitMQ direct reply-to.
+
+В отличие от broker.request, который на каждый вызов подписывается на
+amq.rabbitmq.reply-to под глобальной блокировкой, клиент держит один
+долгоживущий consumer и сопоставляет ответы с запросами по correlation_id.
+Благодаря этому RPC вызовы выполняются параллельно: тысячи запросов в
+полете на процесс стоят по одному Future, без отдельного consumer'а.
+
+Используется HTTP ручками (запросы к воркеру) и получением токенов.
+"""
+
+import asyncio
+import uuid
+from typing import Any, Dict, Optional, Union
+
+import aio_pika
+from aio_pika.abc import (
+    AbstractChannel,
+    AbstractIncomingMessage,
+    AbstractQueue,
+    AbstractRobustConnection,
+)
+
+from app.core.broker.codec import broker_content_type, encode
+from app.core.broker.config import REQUEST_ID_HEADER, SIGNATURE_HEADER, SUBDOMAIN_HEADER
+from app.core.broker.signing import sign
+from app.core.settings import config
+from app.core.logging import logger, request_id_var
+
+
+# Псевдо-очередь RabbitMQ для direct reply-to
+REPLY_TO_QUEUE = "amq.rabbitmq.reply-to"
+
+
+class RPCClient:
+    """
+    RPC клиент с одним reply consumer и картой correlation_id -> Future.
+
+    Публикация и получение ответов идут через один канал (требование
+    direct reply-to), поэтому ответ всегда приходит в тот процесс,
+    который отправил запрос.
+    """
+
+    def __init__(self, url: Optional[str] = None):
+        """
+        Args:
+            url: AMQP URI. По умолчанию берется из конфигурации RabbitMQ
+        """
+        self._url = url or config.rabbit_cfg.rabbitmq_uri
+        self._connection: Optional[AbstractRobustConnection] = None
+        self._channel: Optional[AbstractChannel] = None
+        self._reply_queue: Optional[AbstractQueue] = None
+        self._consumer_tag: Optional[str] = None
+        self._futures: Dict[str, asyncio.Future] = {}
+        self._start_lock = asyncio.Lock()
+
+    @property
+    def is_started(self) -> bool:
+        return self._consumer_tag is not None
+
+    async def start(self) -> None:
+        """Подключение к RabbitMQ и запуск reply consumer (идемпотентно)."""
+        async with self._start_lock:
+            if self.is_started:
+                return
+
+            self._connection = await aio_pika.connect_robust(self._url)
+            self._connection.reconnect_callbacks.add(self._on_reconnect)
+            self._channel = await self._connection.channel()
+            self._reply_queue = await self._channel.get_queue(REPLY_TO_QUEUE, ensure=False)
+            self._consumer_tag = await self._reply_queue.consume(self._on_reply, no_ack=True)
+
+            logger.info("RPC клиент подключен к RabbitMQ (direct reply-to)")
+
+    async def close(self) -> None:
+        """Остановка consumer и закрытие соединения."""
+        async with self._start_lock:
+            for future in self._futures.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("RPC client closed"))
+            self._futures.clear()
+
+            if self._connection is not None:
+                await self._connection.close()
+
+            self._connection = None
+            self._channel = None
+            self._reply_queue = None
+            self._consumer_tag = None
+
+            logger.info("RPC клиент отключен от RabbitMQ")
+
+    @property
+    def in_flight(self) -> int:
+        """Количество запросов, ожидающих ответа."""
+        return len(self._futures)
+
+    def _on_reconnect(self, *args: Any) -> None:
+        """
+        После переподключения ответы на отправленные ранее запросы не придут
+        (direct reply-to привязан к старому каналу) - завершаем их ошибкой
+        сразу, не дожидаясь таймаута.
+        """
+        if not self._futures:
+            return
+
+        logger.warning("RPC клиент переподключился, отменяем запросы в полете: %s", len(self._futures))
+        for future in self._futures.values():
+            if not future.done():
+                future.set_exception(ConnectionError("RPC connection was re-established"))
+        self._futures.clear()
+
+    async def _on_reply(self, message: AbstractIncomingMessage) -> None:
+        """Обработка ответа: находим ожидающий Future по correlation_id."""
+        future = self._futures.pop(message.correlation_id or "", None)
+
+        if future is None:
+            logger.warning(
+                "Получен RPC ответ с неизвестным correlation_id=%s (запрос уже отменен?)",
+                message.correlation_id,
+            )
+            return
+
+        if not future.done():
+            future.set_result(message)
+
+    async def request(
+        self,
+        message: Dict[str, Any],
+        queue: str,
+        timeout: float = 30,
+        headers: Optional[Dict[str, Any]] = None,
+        expiration: Optional[Union[int, float]] = None,
+        priority: Optional[int] = None,
+        content_type: Optional[str] = None,
+        subdomain: Optional[str] = None,
+        trusted: bool = False,
+    ) -> AbstractIncomingMessage:
+        """
+        Отправка RPC запроса и ожидание ответа.
+
+        Args:
+            message: Тело запроса
+            queue: Имя очереди-получателя
+            timeout: Таймаут ожидания ответа в секундах
+            headers: Заголовки сообщения
+            expiration: AMQP expiration сообщения в секундах
+            priority: Приоритет сообщения (для очередей с x-max-priority)
+            content_type: Формат тела (JSON или msgpack). По умолчанию -
+                формат RPC запросов к воркеру (RABBITMQ_MSGPACK)
+            subdomain: Субдомен запроса для заголовка x-subdomain (воркер
+                берет контекст логирования из заголовков, не разбирая тело)
+            trusted: Тело уже провалидировано - подписать его (x-signature),
+                чтобы воркер не валидировал повторно
+
+        Returns:
+            Входящее сообщение с ответом
+
+        Raises:
+            TimeoutError: Если ответ не получен за timeout секунд
+        """
+        if not self.is_started:
+            await self.start()
+
+        content_type = content_type or broker_content_type()
+        correlation_id = uuid.uuid4().hex
+
+        request_id = request_id_var.get()
+        headers = {
+            **(headers or {}),
+            REQUEST_ID_HEADER: request_id if request_id != "unknown" else correlation_id[:12],
+        }
+        if subdomain:
+            headers[SUBDOMAIN_HEADER] = subdomain
+
+        body = encode(message, content_type)
+        signature = sign(body) if trusted else None
+        if signature:
+            headers[SIGNATURE_HEADER] = signature
+        future = asyncio.get_running_loop().create_future()
+        self._futures[correlation_id] = future
+
+        try:
+            await self._channel.default_exchange.publish(
+                aio_pika.Message(
+                    body=body,
+                    content_type=content_type,
+                    correlation_id=correlation_id,
+                    reply_to=REPLY_TO_QUEUE,
+                    headers=headers,
+                    expiration=expiration,
+                    priority=priority,
+                ),
+                routing_key=queue,
+            )
+            return await asyncio.wait_for(future, timeout=timeout)
+        finally:
+            self._futures.pop(correlation_id, None)
+
+
+# Глобальный RPC клиент процесса
+rpc_client = RPCClient()
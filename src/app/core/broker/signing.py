@@ -0,0 +1,41 @@
+"""
+Подпись сообщений доверенного производителя (web).
+
+Web валидирует запросы схемами FastAPI и подписывает тело HMAC-SHA256 с
+общим секретом RABBITMQ_TRUSTED_SECRET. Воркер, проверив подпись, не
+валидирует такое тело повторно. Сообщения без подписи или с неверной
+подписью валидируются как обычно.
+"""
+
+import hashlib
+import hmac
+from typing import Any, Mapping, Optional
+
+from app.core.broker.config import SIGNATURE_HEADER
+from app.core.settings import config
+
+
+def _digest(secret: str, body: bytes) -> str:
+    return hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+
+
+def sign(body: bytes) -> Optional[str]:
+    """
+    Подпись тела сообщения.
+
+    Returns:
+        HMAC тела или None, если доверенный режим выключен
+    """
+    secret = config.rabbit_cfg.TRUSTED_SECRET
+    if not secret:
+        return None
+    return _digest(secret, body)
+
+
+def is_trusted(body: bytes, headers: Optional[Mapping[str, Any]]) -> bool:
+    """Тело подписано доверенным производителем."""
+    secret = config.rabbit_cfg.TRUSTED_SECRET
+    signature = (headers or {}).get(SIGNATURE_HEADER)
+    if not secret or not isinstance(signature, str):
+        return False
+    return hmac.compare_digest(signature, _digest(secret, body))
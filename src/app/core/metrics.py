@@ -0,0 +1,52 @@
+"""
+Простые метрики процесса: счетчики и gauge'и с метками.
+
+Метрики хранятся в памяти процесса и отдаются снимком (snapshot)
+в ответе healthcheck.
+"""
+
+from collections import defaultdict
+from typing import Dict, Optional, Tuple
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Optional[Dict[str, str]]) -> LabelKey:
+    return tuple(sorted((labels or {}).items()))
+
+
+def _format_labels(key: LabelKey) -> str:
+    return ",".join(f"{name}={value}" for name, value in key)
+
+
+class Metrics:
+    """Реестр счетчиков и gauge'ей процесса."""
+
+    def __init__(self):
+        self._counters: Dict[str, Dict[LabelKey, float]] = defaultdict(lambda: defaultdict(float))
+        self._gauges: Dict[str, Dict[LabelKey, float]] = defaultdict(dict)
+
+    def inc(self, name: str, value: float = 1, labels: Optional[Dict[str, str]] = None) -> None:
+        """Увеличить счетчик."""
+        self._counters[name][_label_key(labels)] += value
+
+    def set(self, name: str, value: float, labels: Optional[Dict[str, str]] = None) -> None:
+        """Установить значение gauge."""
+        self._gauges[name][_label_key(labels)] = value
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """
+        Текущие значения всех метрик.
+
+        Returns:
+            Dict вида {"имя_метрики": {"метка=значение": число}}
+        """
+        result: Dict[str, Dict[str, float]] = {}
+        for series in (self._counters, self._gauges):
+            for name, values in series.items():
+                result[name] = {_format_labels(key): value for key, value in values.items()}
+        return result
+
+
+# Глобальный реестр метрик процесса
+metrics = Metrics()
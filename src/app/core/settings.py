@@ -49,6 +49,22 @@ class RabbitConfig(BaseSettings):
     PASS: str = "guest"
     VHOST: str = "/"
 
+    # RPC очереди с приоритетами (x-max-priority). Аргументы существующей очереди
+    # изменить нельзя, поэтому включение переводит RPC на новые очереди с суффиксом
+    # версии; DRAIN_LEGACY_QUEUES - воркеры дочитывают старые очереди на время миграции
+    PRIORITY_QUEUES: bool = False
+    DRAIN_LEGACY_QUEUES: bool = False
+
+    # Кодирование RPC запросов web -> воркер в msgpack (нужен пакет msgpack).
+    # Воркер понимает оба формата и отвечает в формате запроса, поэтому
+    # включать в web после выкатки воркеров
+    MSGPACK: bool = False
+
+    # Общий секрет web и воркера для подписи уже провалидированных сообщений
+    # (HMAC-SHA256 тела в заголовке x-signature): воркер не валидирует их повторно.
+    # Пустое значение - доверенный режим выключен
+    TRUSTED_SECRET: str = ""
+
     @property
     def rabbitmq_uri(self) -> str:
         return f"amqp://{self.USER}:{self.PASS}@{self.HOST}:{self.PORT}/{self.VHOST}"
@@ -81,6 +97,27 @@ class WorkerConfig(BaseSettings):
     MAX_TASKS_PER_CHILD: int = 2500
     PREFETCH_COUNT: int = 10
 
+    # Классы очередей, которые обслуживает процесс (через запятую: read,write,amocrm,webhooks).
+    # Пустая строка - все классы
+    QUEUE_CLASSES: str = ""
+    # Prefetch отдельного канала каждого класса очередей
+    READ_PREFETCH_COUNT: int = 50
+    WRITE_PREFETCH_COUNT: int = 10
+    AMOCRM_PREFETCH_COUNT: int = 5
+
+    # Вебхуки AmoCRM: отдельный канал с большим prefetch, чтобы события успевали накапливаться в пачки
+    WEBHOOK_PREFETCH_COUNT: int = 200
+    WEBHOOK_BATCH_WINDOW: float = 1.0  # секунд
+    WEBHOOK_BATCH_MAX_SIZE: int = 500  # событий
+
+    # Окно объединения сохранений настроек одного менеджера (автосохранение админки):
+    # записывается только последний документ окна. 0 - выключено. Должно укладываться
+    # в половину таймаута RPC сохранения (RPC_TIMEOUTS)
+    SAVE_COALESCE_WINDOW: float = 0.0  # секунд
+    # Сообщения окна не подтверждаются до записи, поэтому при включенном окне очередь
+    # SAVE читается отдельным каналом со своим prefetch и не занимает слоты удалений и пакетов
+    SAVE_PREFETCH_COUNT: int = 100
+
     model_config = SettingsConfigDict(env_prefix="WORKER_", env_file=".env", extra="ignore")
 
 
@@ -93,10 +130,36 @@ class AmoCRMConfig(BaseSettings):
     CLIENT_ID: str = ""
     REDIRECT_URL: str = ""
 
+    # Базовый URL API аккаунта. Для локального стенда: http://127.0.0.1:8800
+    # (аккаунт определяется стендом по заголовку Host)
+    API_BASE_URL: str = "https://{subdomain}.amocrm.ru"
+
+    # Секрет токенов вебхуков: URL вебхука аккаунта содержит HMAC субдомена
+    # (python manage.py webhook-url). Пустая строка - вебхуки не принимаются
+    WEBHOOK_SECRET: str = ""
+
     # Rate limiting settings
     RATE_LIMIT: float = 6.0  # Запросов в секунду
     RATE_BURST: int = 6  # Burst capacity
 
+    # Общий для процессов хоста кеш токенов (SQLite файл). Пустая строка - отключен
+    TOKEN_CACHE_PATH: str = ""
+
+    # Кеш метаданных аккаунта (поля, воронки, статусы)
+    METADATA_CACHE_TTL: int = 10 * 60  # секунд
+    METADATA_PERSIST: bool = False  # Сохранять метаданные в PostgreSQL
+
+    # Кеш GET ответов для редко меняющихся эндпоинтов (поля, воронки)
+    RESPONSE_CACHE_TTL: int = 5 * 60  # секунд, 0 - кеш отключен
+    RESPONSE_CACHE_PATH: str = ""  # SQLite файл, общий для процессов хоста. Пусто - только память
+
+    # Circuit breaker по аккаунтам AmoCRM
+    CIRCUIT_FAILURE_RATE: float = 0.5  # Доля ошибок в окне, при которой breaker размыкается
+    CIRCUIT_MIN_REQUESTS: int = 10  # Минимум запросов в окне для оценки доли ошибок
+    CIRCUIT_WINDOW: int = 30  # Окно подсчета ошибок, секунд
+    CIRCUIT_OPEN_TIMEOUT: int = 30  # Время в разомкнутом состоянии до пробных запросов, секунд
+    CIRCUIT_HALF_OPEN_REQUESTS: int = 1  # Количество пробных запросов в полуоткрытом состоянии
+
     model_config = SettingsConfigDict(env_prefix="AMOCRM_", env_file=".env", extra="ignore")
 
 
@@ -1,3 +1,6 @@
 from app.models.user_permissions import UserPermissions
+from app.models.account_metadata import AccountMetadata
+from app.models.lead_index import LeadIndex, HiddenLead
+from app.models.settings_version import SettingsVersion
 
-__all__ = ["UserPermissions"]
+__all__ = ["UserPermissions", "AccountMetadata", "LeadIndex", "HiddenLead", "SettingsVersion"]
@@ -0,0 +1,25 @@
+from typing import Optional
+from datetime import datetime
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import JSON
+from app.db.base_class import Base
+
+
+class AccountMetadata(Base):
+    """
+    Модель для хранения закешированных метаданных аккаунта AmoCRM
+    (кастомные поля сделок/контактов/компаний, воронки и статусы)
+    """
+    __tablename__ = "account_metadata"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    subdomain: Mapped[str] = mapped_column(unique=True, index=True, nullable=False)
+
+    # JSON структура с метаданными
+    # Пример: {"custom_fields": {"leads": [...], "contacts": [...], "companies": [...]}, "pipelines": [...]}
+    data: Mapped[dict] = mapped_column(JSON, nullable=False, default=dict)
+
+    fetched_at: Mapped[Optional[datetime]] = mapped_column(nullable=True)
+
+    def __repr__(self):
+        return f"<AccountMetadata(subdomain={self.subdomain}, fetched_at={self.fetched_at})>"
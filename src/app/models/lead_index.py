@@ -0,0 +1,50 @@
+from typing import List, Optional
+from datetime import datetime
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import BigInteger, Index, String
+from sqlalchemy.dialects.postgresql import ARRAY
+from app.db.base_class import Base
+
+
+class LeadIndex(Base):
+    """
+    Локальный индекс сделок AmoCRM: воронка и теги, по которым применяются
+    правила pipelines и tags_logic. Заполняется вебхуками и backfill командой.
+    """
+    __tablename__ = "lead_index"
+
+    subdomain: Mapped[str] = mapped_column(primary_key=True)
+    lead_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    pipeline_id: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
+    # Названия тегов сделки (в tags_logic правила задаются названиями)
+    tags: Mapped[List[str]] = mapped_column(ARRAY(String), nullable=False, default=list)
+
+    updated_at: Mapped[Optional[datetime]] = mapped_column(nullable=True)
+
+    __table_args__ = (
+        Index("ix_lead_index_subdomain_pipeline_id", "subdomain", "pipeline_id"),
+        Index("ix_lead_index_tags", "tags", postgresql_using="gin"),
+    )
+
+    def __repr__(self):
+        return f"<LeadIndex(subdomain={self.subdomain}, lead_id={self.lead_id})>"
+
+
+class HiddenLead(Base):
+    """
+    Материализованный набор сделок, скрытых от менеджера правилами
+    pipelines и tags_logic (одна строка - одна скрытая сделка).
+    """
+    __tablename__ = "hidden_leads"
+
+    subdomain: Mapped[str] = mapped_column(primary_key=True)
+    manager_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    lead_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+
+    __table_args__ = (
+        # Пересчет по изменившимся сделкам идет по (subdomain, lead_id)
+        Index("ix_hidden_leads_subdomain_lead_id", "subdomain", "lead_id"),
+    )
+
+    def __repr__(self):
+        return f"<HiddenLead(subdomain={self.subdomain}, manager_id={self.manager_id}, lead_id={self.lead_id})>"
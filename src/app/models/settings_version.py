@@ -0,0 +1,22 @@
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import BigInteger
+from app.db.base_class import Base
+
+
+class SettingsVersion(Base):
+    """
+    Версия последней примененной записи (SAVE или DELETE) настроек менеджера.
+
+    Версию ставит web при публикации записи. Воркер захватывает ее в той же
+    транзакции, что и запись (compare-and-set), поэтому устаревшая запись,
+    пришедшая позже более новой (другой воркер, повтор, окно объединения),
+    не перезаписывает настройки. Строка остается и после DELETE.
+    """
+    __tablename__ = "settings_versions"
+
+    subdomain: Mapped[str] = mapped_column(primary_key=True)
+    manager_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    version: Mapped[int] = mapped_column(BigInteger, nullable=False)
+
+    def __repr__(self):
+        return f"<SettingsVersion(subdomain={self.subdomain}, manager_id={self.manager_id}, version={self.version})>"
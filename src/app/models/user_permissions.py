@@ -19,6 +19,12 @@ class UserPermissions(Base):
     # Пример: {"menu": {"mode": "blacklist", "values": [...]}, "pipelines": {...}, ...}
     permissions: Mapped[dict] = mapped_column(JSON, nullable=False, default=dict)
 
+    # Явные списки скрытых ID, рассчитанные по permissions и метаданным аккаунта
+    # Пример: {"pipelines": [...], "statuses": [...], "fields": {"leads": [...], ...}}
+    hidden_ids: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)
+    # Версия метаданных, по которой рассчитаны hidden_ids
+    metadata_version: Mapped[Optional[str]] = mapped_column(nullable=True)
+
     created_at: Mapped[Optional[datetime]] = mapped_column(nullable=True)
     updated_at: Mapped[Optional[datetime]] = mapped_column(nullable=True)
 
@@ -7,6 +7,7 @@ from app.schemas.permissions import (
     GetSettingsResponse,
     DeleteSettingsRequest,
     APIResponse,
+    SAVE_SETTINGS_ADAPTER,
 )
 
 __all__ = [
@@ -18,4 +19,5 @@ __all__ = [
     "GetSettingsResponse",
     "DeleteSettingsRequest",
     "APIResponse",
+    "SAVE_SETTINGS_ADAPTER",
 ]
@@ -1,6 +1,6 @@
 from typing import Any, Dict, List, Literal, Optional
 from datetime import datetime
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, TypeAdapter, model_validator
 
 
 class PermissionMode(BaseModel):
@@ -108,6 +108,7 @@ class GetSettingsResponse(BaseModel):
     subdomain: str
     manager_id: int
     permissions: Dict[str, Any]
+    hidden: Optional[Dict[str, Any]] = None
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
 
@@ -121,7 +122,34 @@ class DeleteSettingsRequest(BaseModel):
     manager_id: int = Field(..., description="ID менеджера", gt=0)
 
 
+class BatchOperation(BaseModel):
+    """Операция пакетного запроса настроек"""
+    op: Literal["get", "save", "delete"] = Field(..., description="Операция")
+    subdomain: str = Field(..., description="Субдомен amoCRM", min_length=1)
+    manager_id: int = Field(..., description="ID менеджера", gt=0)
+    permissions: Optional[Permissions] = Field(None, description="Настройки permissions (для save)")
+    include_leads: bool = Field(False, description="Добавить в hidden скрытые сделки из индекса (для get)")
+
+    @model_validator(mode="after")
+    def check_permissions(self) -> "BatchOperation":
+        if self.op == "save" and self.permissions is None:
+            raise ValueError("permissions is required for save")
+        return self
+
+
+class BatchSettingsRequest(BaseModel):
+    """Пакетный запрос: несколько операций с настройками одним RPC сообщением"""
+    operations: List[BatchOperation] = Field(..., min_length=1, max_length=500)
+
+
 class APIResponse(BaseModel):
     """Стандартный ответ API"""
     success: bool
     data: Optional[Any] = None
+
+
+# === Precompiled adapters ===
+
+# Схема валидации строится один раз при импорте; validate_json разбирает и
+# валидирует сырые bytes сообщения за один проход
+SAVE_SETTINGS_ADAPTER: TypeAdapter[SaveSettingsRequest] = TypeAdapter(SaveSettingsRequest)
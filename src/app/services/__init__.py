@@ -1,13 +1,47 @@
 from app.services.permissions_service import (
     get_permissions_by_manager,
+    get_permissions_for_managers,
     save_permissions,
+    save_permissions_document,
     delete_permissions,
+    claim_settings_version,
     get_all_permissions_for_subdomain,
+    refresh_hidden_ids,
+    refresh_hidden_ids_for_subdomain,
+)
+from app.services.metadata_service import (
+    get_account_metadata,
+    save_account_metadata,
+)
+from app.services.lead_index_service import (
+    upsert_leads,
+    delete_leads,
+    recompute_hidden_for_leads,
+    rebuild_hidden_for_manager,
+    rebuild_hidden_for_subdomain,
+    delete_hidden_for_manager,
+    is_lead_hidden,
+    list_hidden_leads,
 )
 
 __all__ = [
     "get_permissions_by_manager",
+    "get_permissions_for_managers",
     "save_permissions",
+    "save_permissions_document",
     "delete_permissions",
+    "claim_settings_version",
     "get_all_permissions_for_subdomain",
+    "refresh_hidden_ids",
+    "refresh_hidden_ids_for_subdomain",
+    "get_account_metadata",
+    "save_account_metadata",
+    "upsert_leads",
+    "delete_leads",
+    "recompute_hidden_for_leads",
+    "rebuild_hidden_for_manager",
+    "rebuild_hidden_for_subdomain",
+    "delete_hidden_for_manager",
+    "is_lead_hidden",
+    "list_hidden_leads",
 ]
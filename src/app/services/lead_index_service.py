@@ -0,0 +1,320 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import String, select, delete, exists, or_, not_, true, false, literal
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from app.models.lead_index import LeadIndex, HiddenLead
+from app.models.user_permissions import UserPermissions
+from app.core.logging import logger
+from app.utils.visibility import _to_ids, is_lead_hidden_by_rules
+
+# Строк в одном INSERT (asyncpg ограничивает количество параметров запроса)
+INSERT_CHUNK_SIZE = 5000
+
+
+def hidden_leads_condition(permissions: Dict[str, Any]):
+    """
+    SQL условие над lead_index: сделка скрыта правилами pipelines и tags_logic.leads.
+
+    SQL версия app.utils.visibility.is_lead_hidden_by_rules - при изменении
+    правил их нужно менять вместе.
+
+    Args:
+        permissions: Документ permissions менеджера
+    """
+    conditions = []
+
+    pipelines_rule = permissions.get("pipelines", {})
+    pipelines_mode = pipelines_rule.get("mode", "none")
+    pipeline_values = _to_ids(pipelines_rule.get("values", []))
+
+    if pipelines_mode == "blacklist" and pipeline_values:
+        conditions.append(LeadIndex.pipeline_id.in_(pipeline_values))
+    elif pipelines_mode == "whitelist":
+        conditions.append(
+            or_(LeadIndex.pipeline_id.is_(None), LeadIndex.pipeline_id.not_in(pipeline_values))
+            if pipeline_values else true()
+        )
+
+    tags_rule = permissions.get("tags_logic", {}).get("leads", {})
+    tags_mode = tags_rule.get("mode", "none")
+    tag_values = [str(value) for value in tags_rule.get("values", [])]
+    # && по GIN индексу: у сделки есть хотя бы один тег из списка
+    has_listed_tag = LeadIndex.tags.overlap(literal(tag_values, ARRAY(String))) if tag_values else false()
+
+    if tags_mode == "blacklist" and tag_values:
+        conditions.append(has_listed_tag)
+    elif tags_mode == "whitelist":
+        conditions.append(not_(has_listed_tag))
+
+    return or_(*conditions) if conditions else false()
+
+
+async def upsert_leads(
+    subdomain: str,
+    leads: List[Dict[str, Any]],
+    session: AsyncSession,
+    commit: bool = True
+) -> int:
+    """
+    Добавить или обновить сделки в индексе
+
+    Args:
+        subdomain: Субдомен amoCRM
+        leads: Сделки вида {"lead_id": 1, "pipeline_id": 2, "tags": ["d1"]}
+        session: Асинхронная сессия БД
+        commit: Зафиксировать транзакцию
+
+    Returns:
+        Количество обработанных сделок
+    """
+    if not leads:
+        return 0
+
+    now = datetime.now()
+    stmt = insert(LeadIndex).values([
+        {
+            "subdomain": subdomain,
+            "lead_id": lead["lead_id"],
+            "pipeline_id": lead.get("pipeline_id"),
+            "tags": list(lead.get("tags") or []),
+            "updated_at": now,
+        }
+        for lead in leads
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[LeadIndex.subdomain, LeadIndex.lead_id],
+        set_={
+            "pipeline_id": stmt.excluded.pipeline_id,
+            "tags": stmt.excluded.tags,
+            "updated_at": stmt.excluded.updated_at,
+        },
+    )
+
+    await session.execute(stmt)
+    if commit:
+        await session.commit()
+
+    return len(leads)
+
+
+async def delete_leads(
+    subdomain: str,
+    lead_ids: List[int],
+    session: AsyncSession,
+    commit: bool = True
+) -> int:
+    """
+    Удалить сделки из индекса и из скрытых наборов менеджеров
+
+    Returns:
+        Количество удаленных сделок индекса
+    """
+    if not lead_ids:
+        return 0
+
+    await session.execute(
+        delete(HiddenLead).where(HiddenLead.subdomain == subdomain, HiddenLead.lead_id.in_(lead_ids))
+    )
+    result = await session.execute(
+        delete(LeadIndex).where(LeadIndex.subdomain == subdomain, LeadIndex.lead_id.in_(lead_ids))
+    )
+    if commit:
+        await session.commit()
+
+    return result.rowcount
+
+
+async def recompute_hidden_for_leads(
+    subdomain: str,
+    lead_ids: List[int],
+    session: AsyncSession,
+    commit: bool = True
+) -> int:
+    """
+    Пересчитать скрытые наборы всех менеджеров субдомена для изменившихся сделок.
+    Сделки должны быть уже обновлены в индексе.
+
+    Args:
+        subdomain: Субдомен amoCRM
+        lead_ids: ID изменившихся сделок
+        session: Асинхронная сессия БД
+        commit: Зафиксировать транзакцию
+
+    Returns:
+        Количество строк hidden_leads после пересчета для этих сделок
+    """
+    if not lead_ids:
+        return 0
+
+    permissions_list = (await session.execute(
+        select(UserPermissions.manager_id, UserPermissions.permissions)
+        .where(UserPermissions.subdomain == subdomain)
+    )).all()
+
+    leads = (await session.execute(
+        select(LeadIndex.lead_id, LeadIndex.pipeline_id, LeadIndex.tags)
+        .where(LeadIndex.subdomain == subdomain, LeadIndex.lead_id.in_(lead_ids))
+    )).all()
+
+    rows = [
+        {"subdomain": subdomain, "manager_id": manager_id, "lead_id": lead.lead_id}
+        for manager_id, permissions in permissions_list
+        for lead in leads
+        if is_lead_hidden_by_rules(permissions, lead.pipeline_id, lead.tags)
+    ]
+
+    await session.execute(
+        delete(HiddenLead).where(HiddenLead.subdomain == subdomain, HiddenLead.lead_id.in_(lead_ids))
+    )
+    for i in range(0, len(rows), INSERT_CHUNK_SIZE):
+        await session.execute(
+            insert(HiddenLead).values(rows[i:i + INSERT_CHUNK_SIZE]).on_conflict_do_nothing()
+        )
+    if commit:
+        await session.commit()
+
+    return len(rows)
+
+
+async def rebuild_hidden_for_manager(
+    subdomain: str,
+    manager_id: int,
+    permissions: Dict[str, Any],
+    session: AsyncSession
+) -> int:
+    """
+    Пересобрать скрытый набор менеджера по его правилам (после сохранения настроек).
+    Выполняется одним INSERT ... SELECT по индексу сделок.
+
+    Returns:
+        Количество скрытых сделок менеджера
+    """
+    await session.execute(
+        delete(HiddenLead).where(HiddenLead.subdomain == subdomain, HiddenLead.manager_id == manager_id)
+    )
+
+    result = await session.execute(
+        insert(HiddenLead).from_select(
+            ["subdomain", "manager_id", "lead_id"],
+            select(
+                LeadIndex.subdomain,
+                literal(manager_id).label("manager_id"),
+                LeadIndex.lead_id,
+            ).where(
+                LeadIndex.subdomain == subdomain,
+                hidden_leads_condition(permissions),
+            ),
+        )
+    )
+    await session.commit()
+
+    logger.info(
+        "Скрытые сделки пересчитаны | subdomain: %s, manager_id: %s, hidden: %s",
+        subdomain,
+        manager_id,
+        result.rowcount
+    )
+
+    return result.rowcount
+
+
+async def rebuild_hidden_for_subdomain(
+    subdomain: str,
+    session: AsyncSession
+) -> int:
+    """
+    Пересобрать скрытые наборы всех менеджеров субдомена (после backfill)
+
+    Returns:
+        Количество пересчитанных менеджеров
+    """
+    permissions_list = (await session.execute(
+        select(UserPermissions.manager_id, UserPermissions.permissions)
+        .where(UserPermissions.subdomain == subdomain)
+    )).all()
+
+    for manager_id, permissions in permissions_list:
+        await rebuild_hidden_for_manager(subdomain, manager_id, permissions, session)
+
+    return len(permissions_list)
+
+
+async def delete_hidden_for_manager(
+    subdomain: str,
+    manager_id: int,
+    session: AsyncSession
+) -> int:
+    """
+    Удалить скрытый набор менеджера (после удаления настроек)
+
+    Returns:
+        Количество удаленных строк
+    """
+    result = await session.execute(
+        delete(HiddenLead).where(HiddenLead.subdomain == subdomain, HiddenLead.manager_id == manager_id)
+    )
+    await session.commit()
+
+    return result.rowcount
+
+
+async def is_lead_hidden(
+    subdomain: str,
+    manager_id: int,
+    lead_id: int,
+    session: AsyncSession
+) -> bool:
+    """
+    Скрыта ли сделка от менеджера (поиск по первичному ключу hidden_leads)
+
+    Args:
+        subdomain: Субдомен amoCRM
+        manager_id: ID менеджера
+        lead_id: ID сделки
+        session: Асинхронная сессия БД
+
+    Returns:
+        True, если сделка скрыта
+    """
+    stmt = select(exists().where(
+        HiddenLead.subdomain == subdomain,
+        HiddenLead.manager_id == manager_id,
+        HiddenLead.lead_id == lead_id
+    ))
+
+    result = await session.execute(stmt)
+    return bool(result.scalar())
+
+
+async def list_hidden_leads(
+    subdomain: str,
+    manager_id: int,
+    session: AsyncSession,
+    after_lead_id: int = 0,
+    limit: Optional[int] = None
+) -> List[int]:
+    """
+    ID сделок, скрытых от менеджера, по возрастанию
+
+    Args:
+        subdomain: Субдомен amoCRM
+        manager_id: ID менеджера
+        session: Асинхронная сессия БД
+        after_lead_id: Вернуть сделки с ID больше указанного (постраничный обход)
+        limit: Максимальное количество ID
+
+    Returns:
+        Список ID скрытых сделок
+    """
+    stmt = select(HiddenLead.lead_id).where(
+        HiddenLead.subdomain == subdomain,
+        HiddenLead.manager_id == manager_id,
+        HiddenLead.lead_id > after_lead_id
+    ).order_by(HiddenLead.lead_id.asc())
+
+    if limit is not None:
+        stmt = stmt.limit(limit)
+
+    result = await session.execute(stmt)
+    return list(result.scalars().all())
@@ -0,0 +1,64 @@
+from datetime import datetime
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from app.models.account_metadata import AccountMetadata
+from app.core.logging import logger
+
+
+async def get_account_metadata(
+    subdomain: str,
+    session: AsyncSession
+) -> Optional[AccountMetadata]:
+    """
+    Получить сохраненные метаданные аккаунта AmoCRM
+
+    Args:
+        subdomain: Субдомен amoCRM
+        session: Асинхронная сессия БД
+
+    Returns:
+        AccountMetadata или None, если метаданные не сохранялись
+    """
+    stmt = select(AccountMetadata).where(AccountMetadata.subdomain == subdomain)
+
+    result = await session.execute(stmt)
+    return result.scalar_one_or_none()
+
+
+async def save_account_metadata(
+    subdomain: str,
+    data: dict,
+    fetched_at: datetime,
+    session: AsyncSession
+) -> AccountMetadata:
+    """
+    Сохранить метаданные аккаунта AmoCRM (перезаписывает предыдущие)
+
+    Args:
+        subdomain: Субдомен amoCRM
+        data: Метаданные (кастомные поля и воронки)
+        fetched_at: Время получения метаданных из AmoCRM
+        session: Асинхронная сессия БД
+
+    Returns:
+        Сохраненная запись AccountMetadata
+    """
+    metadata = await get_account_metadata(subdomain, session)
+
+    if metadata is None:
+        metadata = AccountMetadata(subdomain=subdomain, data=data, fetched_at=fetched_at)
+        session.add(metadata)
+    else:
+        metadata.data = data
+        metadata.fetched_at = fetched_at
+
+    await session.commit()
+
+    logger.info(
+        "Метаданные аккаунта сохранены в БД | subdomain: %s, fetched_at: %s",
+        subdomain,
+        fetched_at
+    )
+
+    return metadata
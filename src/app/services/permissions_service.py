@@ -1,9 +1,13 @@
-from typing import Optional
+from typing import Any, Dict, List, Optional, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete
+from sqlalchemy import select, delete, update, or_, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm.attributes import set_committed_value
+from app.models.settings_version import SettingsVersion
 from app.models.user_permissions import UserPermissions
 from app.schemas.permissions import SaveSettingsRequest
 from app.core.logging import logger
+from app.utils.visibility import compile_hidden_ids, metadata_version
 
 
 async def get_permissions_by_manager(
@@ -52,6 +56,37 @@ async def get_permissions_by_manager(
     return permissions
 
 
+async def get_permissions_for_managers(
+    keys: List[Tuple[str, int]],
+    session: AsyncSession
+) -> Dict[Tuple[str, int], UserPermissions]:
+    """
+    Получить настройки нескольких менеджеров одним запросом
+    (WHERE (subdomain, manager_id) IN (...))
+
+    Args:
+        keys: Пары (субдомен, ID менеджера)
+        session: Асинхронная сессия БД
+
+    Returns:
+        Dict (субдомен, ID менеджера) -> UserPermissions для найденных настроек
+    """
+    if not keys:
+        return {}
+
+    logger.info("DB → Запрос к БД на получение настроек пачкой | keys: %s", len(keys))
+
+    stmt = select(UserPermissions).where(
+        tuple_(UserPermissions.subdomain, UserPermissions.manager_id).in_(list(set(keys)))
+    )
+
+    result = await session.execute(stmt)
+    return {
+        (permissions.subdomain, permissions.manager_id): permissions
+        for permissions in result.scalars().all()
+    }
+
+
 async def save_permissions(
     request: SaveSettingsRequest,
     session: AsyncSession
@@ -64,41 +99,69 @@ async def save_permissions(
         request: Запрос с настройками
         session: Асинхронная сессия БД
 
+    Returns:
+        Созданная запись UserPermissions
+    """
+    return await save_permissions_document(
+        subdomain=request.subdomain,
+        manager_id=request.manager_id,
+        permissions=request.permissions.model_dump(),
+        session=session
+    )
+
+
+async def save_permissions_document(
+    subdomain: str,
+    manager_id: int,
+    permissions: Dict[str, Any],
+    session: AsyncSession
+) -> UserPermissions:
+    """
+    Сохранить готовый документ permissions для менеджера (без валидации).
+    Если настройки уже существуют - удаляет старые и создаёт новые.
+    Удаление и вставка фиксируются одной транзакцией (вместе с захваченной
+    перед этим версией, см. claim_settings_version).
+
+    Args:
+        subdomain: Субдомен amoCRM
+        manager_id: ID менеджера
+        permissions: Провалидированный документ настроек (dict в формате Permissions)
+        session: Асинхронная сессия БД
+
     Returns:
         Созданная запись UserPermissions
     """
     logger.info(
         "Начало сохранения настроек | subdomain: %s, manager_id: %s",
-        request.subdomain,
-        request.manager_id
+        subdomain,
+        manager_id
     )
 
     # Удаляем старые настройки, если они есть
     deleted = await delete_permissions(
-        subdomain=request.subdomain,
-        manager_id=request.manager_id,
-        session=session
+        subdomain=subdomain,
+        manager_id=manager_id,
+        session=session,
+        commit=False
     )
 
     if deleted:
         logger.info(
             "Старые настройки удалены перед сохранением | subdomain: %s, manager_id: %s",
-            request.subdomain,
-            request.manager_id
+            subdomain,
+            manager_id
         )
 
     # Создаём новую запись
-    permissions_dict = request.permissions.model_dump()
-
     logger.info(
         "Создание новой записи | permissions_keys: %s",
-        list(permissions_dict.keys())
+        list(permissions.keys())
     )
 
     new_permissions = UserPermissions(
-        subdomain=request.subdomain,
-        manager_id=request.manager_id,
-        permissions=permissions_dict
+        subdomain=subdomain,
+        manager_id=manager_id,
+        permissions=permissions
     )
 
     session.add(new_permissions)
@@ -117,7 +180,8 @@ async def save_permissions(
 async def delete_permissions(
     subdomain: str,
     manager_id: int,
-    session: AsyncSession
+    session: AsyncSession,
+    commit: bool = True
 ) -> bool:
     """
     Удалить настройки permissions для менеджера
@@ -126,6 +190,7 @@ async def delete_permissions(
         subdomain: Субдомен amoCRM
         manager_id: ID менеджера
         session: Асинхронная сессия БД
+        commit: Зафиксировать транзакцию
 
     Returns:
         True, если запись была удалена, False если записи не было
@@ -142,7 +207,8 @@ async def delete_permissions(
     )
 
     result = await session.execute(stmt)
-    await session.commit()
+    if commit:
+        await session.commit()
 
     deleted = result.rowcount > 0
 
@@ -161,6 +227,55 @@ async def delete_permissions(
     return deleted
 
 
+async def claim_settings_version(
+    subdomain: str,
+    manager_id: int,
+    version: int,
+    session: AsyncSession
+) -> bool:
+    """
+    Захватить версию записи настроек менеджера (compare-and-set).
+
+    Upsert в settings_versions с условием "текущая версия не новее". Строка
+    версии блокируется до конца транзакции, поэтому записи одного менеджера
+    из разных воркеров выполняются по очереди, а устаревшая запись не
+    применяется. Транзакцию фиксирует сама запись (сохранение или удаление).
+
+    Args:
+        subdomain: Субдомен amoCRM
+        manager_id: ID менеджера
+        version: Версия записи (заголовок x-settings-version)
+        session: Асинхронная сессия БД
+
+    Returns:
+        True, если запись нужно применить; False, если уже применена более новая
+    """
+    stmt = insert(SettingsVersion).values(
+        subdomain=subdomain,
+        manager_id=manager_id,
+        version=version
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[SettingsVersion.subdomain, SettingsVersion.manager_id],
+        set_={"version": stmt.excluded.version},
+        # Равная версия применяется: так операции одного пакета идут по порядку
+        where=SettingsVersion.version <= stmt.excluded.version,
+    ).returning(SettingsVersion.version)
+
+    result = await session.execute(stmt)
+    claimed = result.first() is not None
+
+    if not claimed:
+        logger.info(
+            "Запись устарела, применена более новая | subdomain: %s, manager_id: %s, version: %s",
+            subdomain,
+            manager_id,
+            version
+        )
+
+    return claimed
+
+
 async def get_all_permissions_for_subdomain(
     subdomain: str,
     session: AsyncSession
@@ -183,3 +298,100 @@ async def get_all_permissions_for_subdomain(
     permissions_list = result.scalars().all()
 
     return list(permissions_list)
+
+
+async def refresh_hidden_ids(
+    permissions: UserPermissions,
+    metadata: dict,
+    session: AsyncSession
+) -> bool:
+    """
+    Пересчитать явные списки скрытых ID менеджера, если изменились
+    метаданные аккаунта или настройки (новая запись без hidden_ids)
+
+    Args:
+        permissions: Запись настроек менеджера
+        metadata: Метаданные аккаунта (app.amocrm.metadata)
+        session: Асинхронная сессия БД
+
+    Returns:
+        True, если списки были пересчитаны
+    """
+    version = metadata_version(metadata)
+    if permissions.hidden_ids is not None and permissions.metadata_version == version:
+        return False
+
+    hidden_ids = compile_hidden_ids(permissions.permissions, metadata)
+
+    # Только Core UPDATE: изменение атрибутов объекта дало бы ORM UPDATE при
+    # flush, before_update и новый updated_at самих настроек
+    await session.execute(
+        update(UserPermissions)
+        .where(UserPermissions.id == permissions.id)
+        .values(hidden_ids=hidden_ids, metadata_version=version)
+    )
+    await session.commit()
+
+    # Значения в объекте - как загруженные из БД (объект не становится измененным)
+    set_committed_value(permissions, "hidden_ids", hidden_ids)
+    set_committed_value(permissions, "metadata_version", version)
+
+    logger.info(
+        "Скрытые ID пересчитаны | subdomain: %s, manager_id: %s, metadata_version: %s",
+        permissions.subdomain,
+        permissions.manager_id,
+        version
+    )
+
+    return True
+
+
+async def refresh_hidden_ids_for_subdomain(
+    subdomain: str,
+    metadata: dict,
+    session: AsyncSession
+) -> int:
+    """
+    Пересчитать скрытые ID всех менеджеров субдомена, рассчитанные
+    по другой версии метаданных
+
+    Args:
+        subdomain: Субдомен amoCRM
+        metadata: Метаданные аккаунта (app.amocrm.metadata)
+        session: Асинхронная сессия БД
+
+    Returns:
+        Количество пересчитанных записей
+    """
+    version = metadata_version(metadata)
+
+    stmt = select(UserPermissions).where(
+        UserPermissions.subdomain == subdomain,
+        or_(
+            UserPermissions.metadata_version.is_(None),
+            UserPermissions.metadata_version != version
+        )
+    )
+
+    result = await session.execute(stmt)
+    outdated = result.scalars().all()
+
+    for permissions in outdated:
+        await session.execute(
+            update(UserPermissions)
+            .where(UserPermissions.id == permissions.id)
+            .values(
+                hidden_ids=compile_hidden_ids(permissions.permissions, metadata),
+                metadata_version=version
+            )
+        )
+
+    if outdated:
+        await session.commit()
+        logger.info(
+            "Скрытые ID пересчитаны для субдомена | subdomain: %s, records: %s",
+            subdomain,
+            len(outdated)
+        )
+
+    return len(outdated)
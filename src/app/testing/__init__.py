@@ -0,0 +1,3 @@
+"""Средства для интеграционного и нагрузочного тестирования без реального AmoCRM."""
+
+from .amocrm_stub import AmoCRMStub, StubConfig
@@ -0,0 +1,361 @@
+"""
+Локальный стенд AmoCRM API для интеграционного и нагрузочного тестирования.
+
+Эмулирует эндпоинты, которые использует app.amocrm.requests_amocrm:
+
+    GET /api/v4/leads                              (filter[id][...], page, limit)
+    GET /api/v4/leads/{id}
+    GET /api/v4/{leads|contacts|companies}/custom_fields   (page, limit)
+    GET /api/v4/leads/pipelines
+
+Аккаунт определяется по заголовку Host ("<subdomain>.amocrm.ru"), поэтому
+сервис направляется на стенд одной настройкой:
+AMOCRM_API_BASE_URL=http://127.0.0.1:8800.
+
+Как и AmoCRM, стенд ограничивает количество запросов в секунду на аккаунт
+(ответ 429), отвечает 401 на истекший токен и 204 на пустую выборку.
+Данные аккаунтов генерируются детерминированно при первом обращении.
+"""
+
+import asyncio
+import random
+import re
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional
+
+from aiohttp import web
+from yarl import URL
+
+from app.core.logging import logger
+
+# Лимиты страниц AmoCRM
+LEADS_PAGE_LIMIT = 250
+LEADS_DEFAULT_LIMIT = 50
+CUSTOM_FIELDS_PAGE_LIMIT = 50
+
+CUSTOM_FIELDS_ENTITY_TYPES = ("leads", "contacts", "companies")
+
+FILTER_ID_PARAM = re.compile(r"filter\[id\](\[\d*\])?")
+
+
+@dataclass
+class StubAccount:
+    """Сгенерированные данные одного аккаунта."""
+
+    leads: Dict[int, Dict[str, Any]]
+    custom_fields: Dict[str, List[Dict[str, Any]]]
+    pipelines: List[Dict[str, Any]]
+
+
+@dataclass
+class StubConfig:
+    """
+    Параметры стенда.
+
+    Attributes:
+        leads_count: Количество сделок в каждом аккаунте
+        custom_fields_count: Количество кастомных полей каждой сущности
+        pipelines_count: Количество воронок
+        statuses_per_pipeline: Количество статусов в воронке
+        tags_count: Размер словаря тегов аккаунта
+        latency: Задержка ответа в секундах
+        latency_jitter: Случайная добавка к задержке (0..latency_jitter) в секундах
+        rps: Лимит запросов в секунду на аккаунт (0 - без лимита)
+        token_ttl: Время жизни токена с первого использования в секундах (0 - бессрочно)
+        seed: Зерно генератора данных аккаунтов
+    """
+
+    leads_count: int = 1000
+    custom_fields_count: int = 120
+    pipelines_count: int = 5
+    statuses_per_pipeline: int = 8
+    tags_count: int = 50
+    latency: float = 0.0
+    latency_jitter: float = 0.0
+    rps: int = 7
+    token_ttl: float = 0.0
+    seed: int = 0
+
+
+@dataclass
+class StubStats:
+    """Счетчики обработанных стендом запросов по аккаунтам."""
+
+    requests: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    throttled: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    unauthorized: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+
+
+def _generate_account(subdomain: str, cfg: StubConfig) -> StubAccount:
+    rnd = random.Random(f"{cfg.seed}:{subdomain}")
+
+    pipelines = []
+    status_id = 1000
+    for pipeline_index in range(cfg.pipelines_count):
+        pipeline_id = 100 + pipeline_index
+        statuses = []
+        for sort in range(cfg.statuses_per_pipeline):
+            status_id += 1
+            statuses.append({
+                "id": status_id,
+                "name": f"Статус {sort + 1}",
+                "sort": (sort + 1) * 10,
+                "color": "#99ccff",
+                "type": 0,
+                "pipeline_id": pipeline_id,
+            })
+        pipelines.append({
+            "id": pipeline_id,
+            "name": f"Воронка {pipeline_index + 1}",
+            "sort": (pipeline_index + 1) * 10,
+            "is_main": pipeline_index == 0,
+            "is_archive": False,
+            "_embedded": {"statuses": statuses},
+        })
+
+    custom_fields = {}
+    for type_index, entity_type in enumerate(CUSTOM_FIELDS_ENTITY_TYPES):
+        custom_fields[entity_type] = [
+            {
+                "id": (type_index + 1) * 100000 + index,
+                "name": f"Поле {index}",
+                "type": "text" if index % 3 else "select",
+                "code": None,
+                "sort": index * 10,
+                "enums": None if index % 3 else [
+                    {"id": (type_index + 1) * 1000000 + index * 10 + enum, "value": f"Вариант {enum}"}
+                    for enum in range(3)
+                ],
+                "entity_type": entity_type,
+            }
+            for index in range(1, cfg.custom_fields_count + 1)
+        ]
+
+    tags = [{"id": 5000 + index, "name": f"tag{index}"} for index in range(cfg.tags_count)]
+    leads_fields = custom_fields["leads"]
+    leads = {}
+    for lead_id in range(1, cfg.leads_count + 1):
+        pipeline = rnd.choice(pipelines)
+        status = rnd.choice(pipeline["_embedded"]["statuses"])
+        lead_fields = rnd.sample(leads_fields, k=min(5, len(leads_fields)))
+        leads[lead_id] = {
+            "id": lead_id,
+            "name": f"Сделка #{lead_id}",
+            "price": rnd.randint(0, 100000),
+            "responsible_user_id": rnd.randint(1, 20),
+            "pipeline_id": pipeline["id"],
+            "status_id": status["id"],
+            "custom_fields_values": [
+                {"field_id": f["id"], "values": [{"value": f"value {lead_id}"}]}
+                for f in lead_fields
+            ],
+            "_embedded": {"tags": rnd.sample(tags, k=rnd.randint(0, min(3, len(tags))))},
+        }
+
+    return StubAccount(leads=leads, custom_fields=custom_fields, pipelines=pipelines)
+
+
+class AmoCRMStub:
+    """
+    aiohttp сервер, эмулирующий AmoCRM API.
+
+    Usage:
+        async with AmoCRMStub(StubConfig(latency=0.05)) as stub:
+            # config.amocrm_cfg.API_BASE_URL = stub.base_url
+            ...
+    """
+
+    def __init__(self, cfg: Optional[StubConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        """
+        Args:
+            cfg: Параметры стенда
+            host: Адрес для прослушивания
+            port: Порт (0 - свободный порт)
+        """
+        self.cfg = cfg or StubConfig()
+        self.host = host
+        self.port = port
+        self.stats = StubStats()
+
+        self._accounts: Dict[str, StubAccount] = {}
+        # Время запросов аккаунта за последнюю секунду - для лимита RPS
+        self._request_times: Dict[str, Deque[float]] = defaultdict(deque)
+        # Время первого использования токена - для истечения токенов
+        self._token_first_seen: Dict[str, float] = {}
+        self._expired_tokens: set = set()
+        self._runner: Optional[web.AppRunner] = None
+
+        self.app = web.Application(middlewares=[self._middleware])
+        self.app.router.add_get("/api/v4/leads", self._handle_leads)
+        self.app.router.add_get("/api/v4/leads/pipelines", self._handle_pipelines)
+        self.app.router.add_get(r"/api/v4/leads/{lead_id:\d+}", self._handle_lead)
+        self.app.router.add_get(
+            r"/api/v4/{entity_type:leads|contacts|companies}/custom_fields",
+            self._handle_custom_fields,
+        )
+
+    @property
+    def base_url(self) -> str:
+        """Значение для AMOCRM_API_BASE_URL."""
+        return f"http://{self.host}:{self.port}"
+
+    def account(self, subdomain: str) -> StubAccount:
+        """Данные аккаунта (генерируются при первом обращении)."""
+        account = self._accounts.get(subdomain)
+        if account is None:
+            account = _generate_account(subdomain, self.cfg)
+            self._accounts[subdomain] = account
+        return account
+
+    def expire_token(self, access_token: str) -> None:
+        """Пометить токен истекшим: следующие запросы с ним получат 401."""
+        self._expired_tokens.add(access_token)
+
+    async def start(self) -> None:
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        # При port=0 узнаем фактически выбранный порт
+        self.port = site._server.sockets[0].getsockname()[1]
+        logger.info("Стенд AmoCRM API запущен: %s", self.base_url)
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> "AmoCRMStub":
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.stop()
+
+    @staticmethod
+    def _subdomain(request: web.Request) -> str:
+        return (request.headers.get("Host") or "").split(".", 1)[0].split(":", 1)[0]
+
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler) -> web.StreamResponse:
+        subdomain = self._subdomain(request)
+        self.stats.requests[subdomain] += 1
+
+        if self.cfg.latency or self.cfg.latency_jitter:
+            await asyncio.sleep(self.cfg.latency + random.uniform(0, self.cfg.latency_jitter))
+
+        if self.cfg.rps and self._throttled(subdomain):
+            self.stats.throttled[subdomain] += 1
+            return web.json_response(
+                {"title": "Too Many Requests", "status": 429}, status=429
+            )
+
+        if not self._authorized(request):
+            self.stats.unauthorized[subdomain] += 1
+            return web.json_response(
+                {"title": "Unauthorized", "status": 401, "detail": "Token has expired"},
+                status=401,
+            )
+
+        return await handler(request)
+
+    def _throttled(self, subdomain: str) -> bool:
+        now = time.monotonic()
+        times = self._request_times[subdomain]
+        while times and now - times[0] >= 1.0:
+            times.popleft()
+
+        if len(times) >= self.cfg.rps:
+            return True
+
+        times.append(now)
+        return False
+
+    def _authorized(self, request: web.Request) -> bool:
+        authorization = request.headers.get("Authorization", "")
+        if not authorization.startswith("Bearer ") or not authorization[7:]:
+            return False
+
+        token = authorization[7:]
+        if token in self._expired_tokens:
+            return False
+
+        if self.cfg.token_ttl:
+            first_seen = self._token_first_seen.setdefault(token, time.monotonic())
+            if time.monotonic() - first_seen >= self.cfg.token_ttl:
+                return False
+
+        return True
+
+    @staticmethod
+    def _page_params(request: web.Request, default_limit: int, max_limit: int):
+        try:
+            page = max(1, int(request.query.get("page", 1)))
+            limit = min(max_limit, max(1, int(request.query.get("limit", default_limit))))
+        except ValueError:
+            raise web.HTTPBadRequest(text="Invalid page or limit")
+        return page, limit
+
+    def _page_links(self, request: web.Request, page: int, has_next: bool) -> Dict[str, Any]:
+        # Ссылки строим от адреса стенда: request.url содержит хост из заголовка Host
+        url = URL(self.base_url).with_path(request.path).with_query(request.query)
+        links = {"self": {"href": str(url.update_query(page=page))}}
+        if has_next:
+            links["next"] = {"href": str(url.update_query(page=page + 1))}
+        return links
+
+    async def _handle_leads(self, request: web.Request) -> web.Response:
+        account = self.account(self._subdomain(request))
+        page, limit = self._page_params(request, LEADS_DEFAULT_LIMIT, LEADS_PAGE_LIMIT)
+
+        # AmoCRM принимает и filter[id][], и filter[id][0], filter[id][1], ...
+        ids = [value for key, value in request.query.items() if FILTER_ID_PARAM.fullmatch(key)]
+        if ids:
+            leads = [account.leads[int(i)] for i in ids if i.isdigit() and int(i) in account.leads]
+        else:
+            leads = list(account.leads.values())
+
+        start = (page - 1) * limit
+        chunk = leads[start:start + limit]
+        if not chunk:
+            return web.Response(status=204)
+
+        return web.json_response({
+            "_page": page,
+            "_links": self._page_links(request, page, start + limit < len(leads)),
+            "_embedded": {"leads": chunk},
+        })
+
+    async def _handle_lead(self, request: web.Request) -> web.Response:
+        account = self.account(self._subdomain(request))
+        lead = account.leads.get(int(request.match_info["lead_id"]))
+        if lead is None:
+            return web.Response(status=204)
+        return web.json_response(lead)
+
+    async def _handle_custom_fields(self, request: web.Request) -> web.Response:
+        account = self.account(self._subdomain(request))
+        fields = account.custom_fields[request.match_info["entity_type"]]
+        page, limit = self._page_params(request, CUSTOM_FIELDS_PAGE_LIMIT, CUSTOM_FIELDS_PAGE_LIMIT)
+
+        start = (page - 1) * limit
+        chunk = fields[start:start + limit]
+        if not chunk:
+            return web.Response(status=204)
+
+        return web.json_response({
+            "_total_items": len(fields),
+            "_page": page,
+            "_page_count": -(-len(fields) // limit),
+            "_links": self._page_links(request, page, start + limit < len(fields)),
+            "_embedded": {"custom_fields": chunk},
+        })
+
+    async def _handle_pipelines(self, request: web.Request) -> web.Response:
+        account = self.account(self._subdomain(request))
+        return web.json_response({
+            "_total_items": len(account.pipelines),
+            "_embedded": {"pipelines": account.pipelines},
+        })
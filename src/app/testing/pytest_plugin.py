@@ -0,0 +1,33 @@
+"""
+Pytest фикстуры стенда AmoCRM API.
+
+Подключение в conftest.py:
+
+    pytest_plugins = ["app.testing.pytest_plugin"]
+"""
+
+from typing import AsyncIterator
+
+import pytest
+
+from app.core.settings import config
+from app.testing.amocrm_stub import AmoCRMStub, StubConfig
+
+
+@pytest.fixture
+def amocrm_stub_config() -> StubConfig:
+    """Параметры стенда. Переопределите фикстуру, чтобы изменить задержку, лимиты и т.д."""
+    return StubConfig()
+
+
+@pytest.fixture
+async def amocrm_stub(amocrm_stub_config: StubConfig, monkeypatch) -> AsyncIterator[AmoCRMStub]:
+    """
+    Запущенный стенд AmoCRM API.
+
+    На время теста AMOCRM_API_BASE_URL указывает на стенд, поэтому функции
+    app.amocrm.requests_amocrm обращаются к нему.
+    """
+    async with AmoCRMStub(amocrm_stub_config) as stub:
+        monkeypatch.setattr(config.amocrm_cfg, "API_BASE_URL", stub.base_url)
+        yield stub
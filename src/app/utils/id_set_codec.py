@@ -0,0 +1,181 @@
+"""
+Компактное кодирование множеств ID (скрытые воронки, статусы, поля, сделки)
+для передачи виджету.
+
+Форматы (значение списка ID в ответе заменяется объектом):
+
+    delta-varint - точное множество. Отсортированные ID кодируются разностями
+        с предыдущим ID в LEB128 varint и оборачиваются в base64:
+        {"encoding": "delta-varint", "count": 3, "data": "ZAEB"}
+
+    bloom - фильтр Блума с заданной вероятностью ложного срабатывания для
+        очень больших множеств. Проверка "ID в множестве" может ошибаться
+        только в сторону "да":
+        {"encoding": "bloom", "count": 100000, "m": 958506, "k": 7,
+         "fp_rate": 0.01, "data": "..."}
+
+Позиции битов фильтра: h_i = (h1 + i * h2) mod m, где h1 и h2 - FNV-1a
+(32 бит) от 8 байт ID в little-endian с разными начальными значениями,
+h2 принудительно нечетный. Бит j хранится в байте j // 8, разряд j % 8.
+
+Модуль является и эталонным декодером: decode_id_set / BloomFilter.
+"""
+
+import base64
+import math
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+DELTA_VARINT = "delta-varint"
+BLOOM = "bloom"
+
+# Множества больше этого размера при разрешенном bloom кодируются фильтром
+BLOOM_MIN_SIZE = 50000
+# Вероятность ложного срабатывания фильтра по умолчанию
+BLOOM_FP_RATE = 0.001
+
+_FNV_PRIME = 0x01000193
+_FNV_OFFSET_1 = 0x811C9DC5
+_FNV_OFFSET_2 = 0x050C5D1F
+_MASK_32 = 0xFFFFFFFF
+
+
+def encode_delta_varint(ids: Iterable[int]) -> str:
+    """Кодирование множества неотрицательных ID в base64(delta + varint)."""
+    out = bytearray()
+    previous = 0
+    for value in sorted(set(ids)):
+        delta = value - previous
+        previous = value
+        while delta >= 0x80:
+            out.append((delta & 0x7F) | 0x80)
+            delta >>= 7
+        out.append(delta)
+    return base64.b64encode(bytes(out)).decode("ascii")
+
+
+def decode_delta_varint(data: str) -> List[int]:
+    """Декодирование base64(delta + varint) в отсортированный список ID."""
+    ids = []
+    value = 0
+    delta = 0
+    shift = 0
+    for byte in base64.b64decode(data):
+        delta |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        value += delta
+        ids.append(value)
+        delta = 0
+        shift = 0
+    return ids
+
+
+def _fnv1a(data: bytes, offset: int) -> int:
+    h = offset
+    for byte in data:
+        h = ((h ^ byte) * _FNV_PRIME) & _MASK_32
+    return h
+
+
+class BloomFilter:
+    """Фильтр Блума над целочисленными ID (см. описание формата в модуле)."""
+
+    def __init__(self, m: int, k: int, bits: Optional[bytearray] = None):
+        self.m = m
+        self.k = k
+        self.bits = bits if bits is not None else bytearray((m + 7) // 8)
+
+    @classmethod
+    def for_capacity(cls, count: int, fp_rate: float) -> "BloomFilter":
+        """Фильтр оптимального размера для count элементов и вероятности fp_rate."""
+        count = max(count, 1)
+        m = max(8, math.ceil(-count * math.log(fp_rate) / (math.log(2) ** 2)))
+        k = max(1, round(m / count * math.log(2)))
+        return cls(m, k)
+
+    def _positions(self, value: int):
+        data = int(value).to_bytes(8, "little", signed=False)
+        h1 = _fnv1a(data, _FNV_OFFSET_1)
+        h2 = _fnv1a(data, _FNV_OFFSET_2) | 1
+        for i in range(self.k):
+            yield (h1 + i * h2) % self.m
+
+    def add(self, value: int) -> None:
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value: int) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+    @classmethod
+    def from_payload(cls, payload: Dict[str, Any]) -> "BloomFilter":
+        return cls(payload["m"], payload["k"], bytearray(base64.b64decode(payload["data"])))
+
+
+def encode_id_set(
+    ids: List[int],
+    encoding: str,
+    bloom_min_size: int = BLOOM_MIN_SIZE,
+    fp_rate: float = BLOOM_FP_RATE,
+) -> Union[List[int], Dict[str, Any]]:
+    """
+    Кодирование множества ID выбранным способом.
+
+    Args:
+        ids: Список ID
+        encoding: "json" (список как есть), DELTA_VARINT или BLOOM. При BLOOM
+            множества меньше bloom_min_size кодируются точно (delta-varint)
+        bloom_min_size: Минимальный размер множества для фильтра Блума
+        fp_rate: Вероятность ложного срабатывания фильтра
+
+    Returns:
+        Список ID или объект формата (см. описание модуля)
+    """
+    if encoding == BLOOM and len(ids) >= bloom_min_size:
+        bloom = BloomFilter.for_capacity(len(ids), fp_rate)
+        for value in ids:
+            bloom.add(value)
+        return {
+            "encoding": BLOOM,
+            "count": len(ids),
+            "m": bloom.m,
+            "k": bloom.k,
+            "fp_rate": fp_rate,
+            "data": base64.b64encode(bytes(bloom.bits)).decode("ascii"),
+        }
+
+    if encoding in (DELTA_VARINT, BLOOM):
+        return {"encoding": DELTA_VARINT, "count": len(ids), "data": encode_delta_varint(ids)}
+
+    return ids
+
+
+def decode_id_set(value: Union[List[int], Dict[str, Any]]) -> Union[List[int], BloomFilter]:
+    """
+    Эталонный декодер: список ID для json и delta-varint, BloomFilter для bloom
+    (поддерживает только проверку "in").
+    """
+    if isinstance(value, list):
+        return value
+    if value["encoding"] == DELTA_VARINT:
+        return decode_delta_varint(value["data"])
+    if value["encoding"] == BLOOM:
+        return BloomFilter.from_payload(value)
+    raise ValueError(f"Unknown id set encoding: {value['encoding']}")
+
+
+def encode_hidden(hidden: Dict[str, Any], encoding: str) -> Dict[str, Any]:
+    """
+    Кодирование всех списков ID в структуре hidden
+    ({"pipelines": [...], "statuses": [...], "fields": {"leads": [...], ...}, "leads": [...]}).
+    """
+    if encoding == "json":
+        return hidden
+
+    return {
+        key: encode_hidden(value, encoding) if isinstance(value, dict)
+        else encode_id_set(value, encoding) if isinstance(value, list)
+        else value
+        for key, value in hidden.items()
+    }
@@ -4,6 +4,8 @@ from fastapi import FastAPI
 from app.db.async_session import wait_for_db, run_migrations
 from app.core.logging import logger
 from app.core.broker.app import broker
+from app.core.broker.rpc_client import rpc_client
+from app.utils.tokens import start_token_refresher, stop_token_refresher
 
 
 @asynccontextmanager
@@ -12,16 +14,24 @@ async def lifespan(app: FastAPI):
     await wait_for_db()
     await run_migrations()
 
-    # Запускаем RabbitMQ broker для RPC вызовов из HTTP ручек
+    # Запускаем RabbitMQ broker (публикация вебхуков)
     await broker.start()
-    logger.info("RabbitMQ broker подключен для RPC вызовов.")
+    logger.info("RabbitMQ broker подключен.")
+
+    # Общий RPC клиент HTTP ручек: один reply consumer на процесс
+    await rpc_client.start()
+
+    # Фоновое обновление токенов AmoCRM до истечения кеша
+    start_token_refresher()
 
     logger.info("FastAPI приложение готово к работе.")
 
     try:
         yield
     finally:
-        # Останавливаем broker
+        # Останавливаем обновление токенов, RPC клиент и broker
+        await stop_token_refresher()
+        await rpc_client.close()
         await broker.close()
         logger.info("RabbitMQ broker отключен.")
         logger.info("FastAPI приложение останавливается...")
@@ -0,0 +1,29 @@
+"""
+Файлы SQLite кешей с секретами (токены, ответы AmoCRM): доступ только владельцу.
+"""
+
+import os
+
+# Файл базы и файлы WAL режима
+SQLITE_FILE_SUFFIXES = ("", "-wal", "-shm")
+
+
+def create_private_db_file(path: str) -> None:
+    """
+    Создание файла базы с правами 0600 до первого подключения (иначе SQLite
+    создаст его с umask процесса). -wal и -shm SQLite создает с правами
+    основного файла. Файлы, созданные ранее, ограничиваются так же.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    os.close(os.open(path, os.O_CREAT | os.O_RDWR, 0o600))
+    restrict_db_files(path)
+
+
+def restrict_db_files(path: str) -> None:
+    """Доступ только владельцу для файла базы, -wal и -shm (если они есть)."""
+    for suffix in SQLITE_FILE_SUFFIXES:
+        if os.path.exists(path + suffix):
+            os.chmod(path + suffix, 0o600)
@@ -0,0 +1,156 @@
+"""
+Общий кеш токенов AmoCRM для всех процессов хоста на базе SQLite.
+
+Хранится в файле, поэтому переживает перезапуски и доступен всем воркерам.
+Время истечения хранится в абсолютном виде (unix time), так что TTL
+одинаков для всех процессов, прочитавших запись.
+"""
+
+import sqlite3
+import time
+from functools import lru_cache
+from typing import Dict, Optional
+
+from app.core.settings import config
+from app.core.logging import logger
+from app.utils.sqlite_files import create_private_db_file, restrict_db_files
+
+
+class SQLiteTokenStore:
+    """
+    Хранилище токенов в SQLite файле.
+
+    Помимо токенов хранит lease (аренду) на обновление: процесс, получивший
+    lease, запрашивает токены в сервисе токенов, остальные ждут его результата.
+    Методы синхронные и быстрые (локальный файл), из async кода их следует
+    вызывать через asyncio.to_thread.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Путь к файлу базы SQLite
+        """
+        self.path = path
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        # isolation_level=None - autocommit, транзакции управляются явно
+        return sqlite3.connect(self.path, timeout=5, isolation_level=None)
+
+    def _init_db(self) -> None:
+        # Файл содержит секреты - создается сразу с доступом только владельцу
+        create_private_db_file(self.path)
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS tokens (
+                    subdomain TEXT PRIMARY KEY,
+                    access_token TEXT,
+                    refresh_token TEXT,
+                    expires_at REAL NOT NULL DEFAULT 0,
+                    refresh_at REAL NOT NULL DEFAULT 0,
+                    lease_until REAL NOT NULL DEFAULT 0
+                )
+                """
+            )
+
+        restrict_db_files(self.path)
+
+    def get(self, subdomain: str) -> Optional[Dict]:
+        """
+        Получить запись токенов для субдомена.
+
+        Returns:
+            Dict с access_token, refresh_token, expires_at, refresh_at или None
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT access_token, refresh_token, expires_at, refresh_at "
+                "FROM tokens WHERE subdomain = ? AND access_token IS NOT NULL",
+                (subdomain,),
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        return {
+            "access_token": row[0],
+            "refresh_token": row[1],
+            "expires_at": row[2],
+            "refresh_at": row[3],
+        }
+
+    def put(self, subdomain: str, entry: Dict) -> None:
+        """Сохранить токены и освободить lease на обновление."""
+        with self._connect() as conn:
+            conn.execute(
+                """
+                INSERT INTO tokens (subdomain, access_token, refresh_token, expires_at, refresh_at, lease_until)
+                VALUES (?, ?, ?, ?, ?, 0)
+                ON CONFLICT (subdomain) DO UPDATE SET
+                    access_token = excluded.access_token,
+                    refresh_token = excluded.refresh_token,
+                    expires_at = excluded.expires_at,
+                    refresh_at = excluded.refresh_at,
+                    lease_until = 0
+                """,
+                (
+                    subdomain,
+                    entry["access_token"],
+                    entry["refresh_token"],
+                    entry["expires_at"],
+                    entry["refresh_at"],
+                ),
+            )
+
+    def delete(self, subdomain: Optional[str] = None) -> None:
+        """Удалить токены субдомена или все токены, если subdomain=None."""
+        with self._connect() as conn:
+            if subdomain:
+                conn.execute("DELETE FROM tokens WHERE subdomain = ?", (subdomain,))
+            else:
+                conn.execute("DELETE FROM tokens")
+
+    def try_acquire_lease(self, subdomain: str, ttl: float) -> bool:
+        """
+        Попытаться получить lease на обновление токенов субдомена.
+
+        Args:
+            subdomain: Субдомен AmoCRM
+            ttl: Время жизни lease в секундах (на случай падения процесса)
+
+        Returns:
+            True, если lease получен этим процессом
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("INSERT OR IGNORE INTO tokens (subdomain) VALUES (?)", (subdomain,))
+            cursor = conn.execute(
+                "UPDATE tokens SET lease_until = ? WHERE subdomain = ? AND lease_until < ?",
+                (now + ttl, subdomain, now),
+            )
+            return cursor.rowcount > 0
+
+    def release_lease(self, subdomain: str) -> None:
+        """Освободить lease без сохранения токенов (например, при ошибке)."""
+        with self._connect() as conn:
+            conn.execute("UPDATE tokens SET lease_until = 0 WHERE subdomain = ?", (subdomain,))
+
+
+@lru_cache(maxsize=1)
+def get_shared_token_store() -> Optional[SQLiteTokenStore]:
+    """
+    Общий кеш токенов из конфигурации.
+
+    Returns:
+        SQLiteTokenStore или None, если AMOCRM_TOKEN_CACHE_PATH не задан
+    """
+    path = config.amocrm_cfg.TOKEN_CACHE_PATH
+    if not path:
+        return None
+
+    logger.info("Используем общий кеш токенов: %s", path)
+    return SQLiteTokenStore(path)
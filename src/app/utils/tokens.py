@@ -2,20 +2,53 @@
 Утилиты для работы с токенами AmoCRM через сервис токенов с кешированием.
 """
 
+import asyncio
+import random
+import sqlite3
 import time
 from typing import Dict, Optional
 
 from app.core.broker.rpc import send_rpc_request_and_wait_for_reply
 from app.core.settings import config
 from app.core.logging import logger
+from app.utils.token_store import SQLiteTokenStore, get_shared_token_store
 
 
-# Локальный кеш токенов {subdomain: {tokens, expires_at}}
+# Локальный кеш токенов {subdomain: {tokens, expires_at, refresh_at, last_used}}.
+# Стоит перед общим кешем токенов (app.utils.token_store), если он включен
 _tokens_cache: Dict[str, Dict] = {}
 
 # TTL для кеша токенов в секундах (например, 50 минут, токены живут 1 час)
 TOKEN_CACHE_TTL = 50 * 60
 
+# Сколько секунд после expires_at можно отдавать устаревшие токены,
+# пока в фоне идет их обновление (stale-while-revalidate)
+TOKEN_STALE_TTL = 5 * 60
+
+# Фоновое обновление начинается за REFRESH_AHEAD + случайный jitter до expires_at,
+# чтобы обновления разных субдоменов не совпадали по времени
+TOKEN_REFRESH_AHEAD = 5 * 60
+TOKEN_REFRESH_JITTER = 2 * 60
+
+# Субдомены, токены которых не запрашивались дольше этого времени, удаляются из кеша
+TOKEN_IDLE_TTL = 60 * 60
+
+# Период проверки кеша фоновым обновлятором
+TOKEN_REFRESH_INTERVAL = 30
+
+# Общий кеш токенов: время жизни lease на обновление (покрывает RPC с retry),
+# сколько ждать токены, запрашиваемые другим процессом, и период опроса
+TOKEN_LEASE_TTL = 60
+TOKEN_LEASE_WAIT = 10
+TOKEN_LEASE_POLL_INTERVAL = 0.2
+
+# Выполняющиеся запросы токенов {subdomain: Task}.
+# Конкурентные вызовы для одного субдомена ожидают один и тот же запрос
+_inflight_fetches: Dict[str, asyncio.Task] = {}
+
+# Задача фонового обновления токенов
+_refresher_task: Optional[asyncio.Task] = None
+
 
 async def get_tokens_from_service(subdomain: str, force_refresh: bool = False) -> Dict[str, str]:
     """
@@ -23,6 +56,12 @@ async def get_tokens_from_service(subdomain: str, force_refresh: bool = False) -
 
     Использует локальный кеш для минимизации RPC запросов к сервису токенов.
     Токены кешируются на 50 минут (при TTL токена 60 минут).
+    Конкурентные запросы для одного субдомена объединяются в один RPC вызов,
+    запросы для разных субдоменов выполняются параллельно.
+
+    Истекшие не более TOKEN_STALE_TTL назад токены отдаются сразу, а их
+    обновление запускается в фоне. Ожидание RPC происходит только при
+    пустом кеше или force_refresh.
 
     Args:
         subdomain: Субдомен AmoCRM (например, "example" для example.amocrm.ru)
@@ -46,6 +85,7 @@ async def get_tokens_from_service(subdomain: str, force_refresh: bool = False) -
     if not force_refresh and subdomain in _tokens_cache:
         cached = _tokens_cache[subdomain]
         current_time = time.time()
+        cached["last_used"] = current_time
 
         # Если токены еще валидны
         if current_time < cached["expires_at"]:
@@ -58,14 +98,158 @@ async def get_tokens_from_service(subdomain: str, force_refresh: bool = False) -
                 "access_token": cached["access_token"],
                 "refresh_token": cached["refresh_token"],
             }
+        elif current_time < cached["expires_at"] + TOKEN_STALE_TTL:
+            logger.debug(
+                "Кешированные токены для subdomain=%s устарели, отдаем их и обновляем в фоне",
+                subdomain
+            )
+            _start_fetch(subdomain, background=True)
+            return {
+                "access_token": cached["access_token"],
+                "refresh_token": cached["refresh_token"],
+            }
         else:
             logger.debug(
                 "Кешированные токены для subdomain=%s истекли, обновляем",
                 subdomain
             )
 
-    # Получаем токены из сервиса через RPC
+    # Получаем токены из сервиса через RPC.
+    # Если запрос для этого субдомена уже выполняется - присоединяемся к нему
+    task = _start_fetch(subdomain, force_refresh=force_refresh)
+
+    # shield: отмена одного вызывающего не должна отменять общий запрос
+    return await asyncio.shield(task)
+
+
+def _start_fetch(subdomain: str, force_refresh: bool = False, background: bool = False) -> asyncio.Task:
+    """
+    Запуск запроса токенов или возврат уже выполняющегося для субдомена.
+
+    Args:
+        subdomain: Субдомен AmoCRM
+        force_refresh: Не использовать общий кеш токенов, запросить в сервисе
+        background: Результат никто не ожидает - ошибка только логируется
+    """
+    task = _inflight_fetches.get(subdomain)
+    if task is None:
+        task = asyncio.create_task(_fetch_tokens(subdomain, force_refresh))
+        _inflight_fetches[subdomain] = task
+        task.add_done_callback(lambda _: _inflight_fetches.pop(subdomain, None))
+    else:
+        logger.debug("Ожидаем уже выполняющийся запрос токенов для subdomain=%s", subdomain)
+
+    if background:
+        # Забираем исключение, чтобы asyncio не ругался на необработанную ошибку.
+        # Сама ошибка уже залогирована в _fetch_tokens
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+    return task
+
+
+async def _call_shared_store(method, *args):
+    """
+    Вызов метода общего кеша токенов в отдельном потоке.
+
+    Ошибки общего кеша не должны ломать получение токенов - логируем и
+    возвращаем None, дальше работаем как без общего кеша.
+    """
+    try:
+        return await asyncio.to_thread(method, *args)
+    except sqlite3.Error as e:
+        logger.warning("Ошибка общего кеша токенов (%s): %s", method.__name__, e)
+        return None
+
+
+async def _read_shared_tokens(store: SQLiteTokenStore, subdomain: str) -> Optional[Dict]:
+    """
+    Чтение из общего кеша токенов, которые свежее локальных.
+
+    Returns:
+        Запись токенов или None, если в общем кеше нет более свежих токенов
+    """
+    entry = await _call_shared_store(store.get, subdomain)
+    if entry is None or time.time() >= entry["expires_at"]:
+        return None
+
+    cached = _tokens_cache.get(subdomain)
+    if cached is not None and entry["expires_at"] <= cached["expires_at"]:
+        return None
+
+    return entry
+
+
+async def _wait_for_shared_tokens(store: SQLiteTokenStore, subdomain: str) -> Optional[Dict]:
+    """Ожидание токенов, которые запрашивает другой процесс, владеющий lease."""
+    deadline = time.monotonic() + TOKEN_LEASE_WAIT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(TOKEN_LEASE_POLL_INTERVAL)
+        entry = await _read_shared_tokens(store, subdomain)
+        if entry is not None:
+            return entry
+    return None
+
+
+def _remember_tokens(subdomain: str, entry: Dict) -> Dict[str, str]:
+    """Сохранение записи в локальный кеш с сохранением времени последнего использования."""
+    previous = _tokens_cache.get(subdomain, {})
+    _tokens_cache[subdomain] = {
+        "access_token": entry["access_token"],
+        "refresh_token": entry["refresh_token"],
+        "expires_at": entry["expires_at"],
+        "refresh_at": entry["refresh_at"],
+        "last_used": previous.get("last_used", time.time()),
+    }
+    return {
+        "access_token": entry["access_token"],
+        "refresh_token": entry["refresh_token"],
+    }
+
+
+def _shared_store() -> Optional[SQLiteTokenStore]:
+    """
+    Общий кеш токенов или None, если он выключен или не открывается
+    (тогда токены запрашиваются без общего кеша, только в процессе).
+    """
+    try:
+        return get_shared_token_store()
+    except (OSError, sqlite3.Error) as e:
+        logger.warning("Общий кеш токенов недоступен, работаем без него: %s", e)
+        return None
+
+
+async def _fetch_tokens(subdomain: str, force_refresh: bool = False) -> Dict[str, str]:
+    """
+    Запрос токенов в сервисе токенов и сохранение их в кеш.
+
+    Вызывается не более одного раза одновременно для каждого субдомена.
+    Если включен общий кеш токенов, сначала проверяет его, а RPC выполняет
+    только процесс, получивший lease на обновление субдомена.
+    """
+    store = _shared_store()
+    lease_acquired = False
+
     try:
+        if store is not None and not force_refresh:
+            entry = await _read_shared_tokens(store, subdomain)
+            if entry is not None:
+                logger.info("Токены для subdomain=%s получены из общего кеша", subdomain)
+                return _remember_tokens(subdomain, entry)
+
+        if store is not None:
+            lease_acquired = bool(
+                await _call_shared_store(store.try_acquire_lease, subdomain, TOKEN_LEASE_TTL)
+            )
+            if not lease_acquired and not force_refresh:
+                logger.debug(
+                    "Токены для subdomain=%s уже запрашивает другой процесс, ожидаем",
+                    subdomain
+                )
+                entry = await _wait_for_shared_tokens(store, subdomain)
+                if entry is not None:
+                    return _remember_tokens(subdomain, entry)
+
+        # Получаем токены из сервиса через RPC
         logger.info("Запрашиваем токены в сервисе токенов для subdomain=%s", subdomain)
 
         # Получаем CLIENT_ID из конфигурации
@@ -76,8 +260,6 @@ async def get_tokens_from_service(subdomain: str, force_refresh: bool = False) -
             raise ValueError("AmoCRM CLIENT_ID is not configured")
 
         # Отправляем RPC запрос в сервис токенов
-        # Семафор внутри send_rpc_request_and_wait_for_reply обеспечивает
-        # последовательное выполнение RPC запросов
         tokens = await send_rpc_request_and_wait_for_reply(
             subdomain=subdomain,
             client_id=client_id,
@@ -88,12 +270,20 @@ async def get_tokens_from_service(subdomain: str, force_refresh: bool = False) -
             logger.error("Получены невалидные токены для subdomain=%s", subdomain)
             raise ValueError("Invalid tokens received from token service")
 
-        # Сохраняем в кеш
-        _tokens_cache[subdomain] = {
+        # Сохраняем в локальный и общий кеш с одинаковым временем истечения
+        expires_at = time.time() + TOKEN_CACHE_TTL
+        entry = {
             "access_token": tokens["access_token"],
             "refresh_token": tokens["refresh_token"],
-            "expires_at": time.time() + TOKEN_CACHE_TTL,
+            "expires_at": expires_at,
+            "refresh_at": expires_at - TOKEN_REFRESH_AHEAD - random.uniform(0, TOKEN_REFRESH_JITTER),
         }
+        result = _remember_tokens(subdomain, entry)
+
+        if store is not None:
+            # put освобождает lease
+            await _call_shared_store(store.put, subdomain, entry)
+            lease_acquired = False
 
         logger.info(
             "Токены успешно получены и закешированы для subdomain=%s (TTL: %s мин)",
@@ -101,10 +291,7 @@ async def get_tokens_from_service(subdomain: str, force_refresh: bool = False) -
             TOKEN_CACHE_TTL // 60
         )
 
-        return {
-            "access_token": tokens["access_token"],
-            "refresh_token": tokens["refresh_token"],
-        }
+        return result
 
     except Exception as e:
         logger.error(
@@ -115,10 +302,109 @@ async def get_tokens_from_service(subdomain: str, force_refresh: bool = False) -
         )
         raise
 
+    finally:
+        if lease_acquired:
+            await _call_shared_store(store.release_lease, subdomain)
+
+
+async def _refresh_tokens_loop() -> None:
+    """
+    Фоновое обновление токенов до истечения кеша.
+
+    Обновляет токены недавно использованных субдоменов после refresh_at
+    и удаляет из кеша субдомены, не использовавшиеся дольше TOKEN_IDLE_TTL.
+    """
+    while True:
+        await asyncio.sleep(TOKEN_REFRESH_INTERVAL)
+
+        try:
+            now = time.time()
+            for subdomain, cached in list(_tokens_cache.items()):
+                if now - cached["last_used"] > TOKEN_IDLE_TTL:
+                    _tokens_cache.pop(subdomain, None)
+                    logger.info(
+                        "Токены subdomain=%s не использовались %s мин, удалены из кеша",
+                        subdomain,
+                        TOKEN_IDLE_TTL // 60
+                    )
+                elif now >= cached["refresh_at"]:
+                    logger.debug("Фоновое обновление токенов для subdomain=%s", subdomain)
+                    _start_fetch(subdomain, background=True)
+        except Exception as e:
+            logger.error("Ошибка фонового обновления токенов: %s", e, exc_info=True)
+
+
+def start_token_refresher() -> None:
+    """Запуск фонового обновления токенов (идемпотентно)."""
+    global _refresher_task
+
+    if _refresher_task is None or _refresher_task.done():
+        _refresher_task = asyncio.create_task(_refresh_tokens_loop())
+        logger.info("Фоновое обновление токенов запущено")
+
+
+async def stop_token_refresher() -> None:
+    """Остановка фонового обновления токенов."""
+    global _refresher_task
+
+    if _refresher_task is not None:
+        _refresher_task.cancel()
+        try:
+            await _refresher_task
+        except asyncio.CancelledError:
+            pass
+        _refresher_task = None
+        logger.info("Фоновое обновление токенов остановлено")
+
+
+async def refresh_rejected_tokens(subdomain: str, rejected_access_token: str) -> Dict[str, str]:
+    """
+    Обновление токенов после того, как AmoCRM отклонил access_token (401).
+
+    Все конкурентные вызовы с одним и тем же отклоненным токеном разделяют
+    один force_refresh: если токены уже обновлены (или обновляются) другим
+    вызовом - возвращаются новые токены без повторного RPC.
+
+    Args:
+        subdomain: Субдомен AmoCRM
+        rejected_access_token: access_token, на который AmoCRM ответил 401
+
+    Returns:
+        Dict с новыми access_token и refresh_token
+    """
+    cached = _tokens_cache.get(subdomain)
+    if cached is not None and cached["access_token"] != rejected_access_token:
+        logger.debug("Токены для subdomain=%s уже обновлены другим запросом", subdomain)
+        return {
+            "access_token": cached["access_token"],
+            "refresh_token": cached["refresh_token"],
+        }
+
+    task = _inflight_fetches.get(subdomain)
+    if task is not None:
+        tokens = await asyncio.shield(task)
+        if tokens["access_token"] != rejected_access_token:
+            return tokens
+
+    # Токены мог уже обновить другой процесс
+    store = _shared_store()
+    if store is not None:
+        entry = await _call_shared_store(store.get, subdomain)
+        if (
+            entry is not None
+            and entry["access_token"] != rejected_access_token
+            and time.time() < entry["expires_at"]
+        ):
+            logger.info("Обновленные токены для subdomain=%s получены из общего кеша", subdomain)
+            return _remember_tokens(subdomain, entry)
+
+    logger.warning("AmoCRM отклонил токен для subdomain=%s, принудительно обновляем", subdomain)
+    return await get_tokens_from_service(subdomain, force_refresh=True)
+
 
 def clear_token_cache(subdomain: Optional[str] = None):
     """
-    Очистка кеша токенов.
+    Очистка кеша токенов (локального и общего, если он включен).
 
     Args:
         subdomain: Субдомен для очистки. Если None - очищается весь кеш.
@@ -135,6 +421,13 @@ def clear_token_cache(subdomain: Optional[str] = None):
         _tokens_cache.clear()
         logger.info("Кеш токенов полностью очищен")
 
+    store = _shared_store()
+    if store is not None:
+        try:
+            store.delete(subdomain)
+        except sqlite3.Error as e:
+            logger.warning("Ошибка очистки общего кеша токенов: %s", e)
+
 
 async def get_headers(subdomain: str, access_token: str) -> Dict[str, str]:
     """
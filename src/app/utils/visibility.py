@@ -0,0 +1,161 @@
+"""
+Расчет скрываемых сущностей по настройкам permissions.
+
+Whitelist ("скрыть всё, кроме") нельзя применить без знания всех воронок
+и полей аккаунта. Здесь настройки вместе с метаданными аккаунта
+(app.amocrm.metadata) превращаются в явные списки скрытых ID, чтобы
+клиентам оставалось только проверять вхождение в множество.
+"""
+
+import hashlib
+from typing import Any, Dict, Iterable, List, Optional
+
+# Типы сущностей с кастомными полями
+FIELD_ENTITY_TYPES = ("leads", "contacts", "companies")
+
+
+def _to_ids(values: Iterable[Any]) -> List[int]:
+    """Приведение значений правила к int ID (нечисловые значения пропускаются)."""
+    ids = []
+    for value in values:
+        try:
+            ids.append(int(value))
+        except (TypeError, ValueError):
+            continue
+    return ids
+
+
+def resolve_hidden(rule: Dict[str, Any], universe: Iterable[int]) -> List[int]:
+    """
+    Явный список скрытых ID для одного правила.
+
+    Args:
+        rule: Правило {"mode": "blacklist" | "whitelist" | "none", "values": [...]}
+        universe: Все существующие ID (нужны для whitelist)
+
+    Returns:
+        Отсортированный список скрытых ID
+    """
+    mode = rule.get("mode", "none")
+    values = set(_to_ids(rule.get("values", [])))
+
+    if mode == "blacklist":
+        return sorted(values)
+    if mode == "whitelist":
+        return sorted(set(universe) - values)
+    return []
+
+
+def metadata_version(metadata: Dict[str, Any]) -> str:
+    """
+    Версия метаданных аккаунта - хеш набора ID воронок, статусов и полей.
+
+    Меняется только при добавлении/удалении сущностей, а не при
+    переименовании, поэтому пересчет скрытых ID происходит только когда
+    он действительно может изменить результат.
+    """
+    if metadata.get("version"):
+        return metadata["version"]
+
+    parts = []
+    for pipeline in sorted(metadata.get("pipelines", []), key=lambda p: p["id"]):
+        status_ids = sorted(status["id"] for status in pipeline.get("statuses", []))
+        parts.append(f"p{pipeline['id']}:{','.join(map(str, status_ids))}")
+    for entity_type in FIELD_ENTITY_TYPES:
+        field_ids = sorted(field["id"] for field in metadata.get("custom_fields", {}).get(entity_type, []))
+        parts.append(f"{entity_type}:{','.join(map(str, field_ids))}")
+
+    return hashlib.sha1(";".join(parts).encode("utf-8")).hexdigest()
+
+
+def compile_hidden_ids(permissions: Dict[str, Any], metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Расчет явных списков скрытых ID для менеджера.
+
+    Разделы меню и теги не материализуются: их полный набор не известен
+    из метаданных, клиенты применяют эти правила как есть.
+
+    Args:
+        permissions: Документ permissions менеджера
+        metadata: Метаданные аккаунта (см. app.amocrm.metadata.fetch_account_metadata)
+
+    Returns:
+        Dict вида {"pipelines": [...], "statuses": [...], "fields": {"leads": [...], ...}}
+    """
+    pipelines = metadata.get("pipelines", [])
+    hidden_pipelines = resolve_hidden(
+        permissions.get("pipelines", {}),
+        (pipeline["id"] for pipeline in pipelines),
+    )
+
+    # Статусы скрытых воронок тоже скрыты
+    hidden_pipeline_set = set(hidden_pipelines)
+    hidden_statuses = sorted(
+        status["id"]
+        for pipeline in pipelines
+        if pipeline["id"] in hidden_pipeline_set
+        for status in pipeline.get("statuses", [])
+    )
+
+    fields_rules = permissions.get("fields", {})
+    custom_fields = metadata.get("custom_fields", {})
+
+    return {
+        "pipelines": hidden_pipelines,
+        "statuses": hidden_statuses,
+        "fields": {
+            entity_type: resolve_hidden(
+                fields_rules.get(entity_type, {}),
+                (field["id"] for field in custom_fields.get(entity_type, [])),
+            )
+            for entity_type in FIELD_ENTITY_TYPES
+        },
+    }
+
+
+def lead_tag_names(lead: Dict[str, Any]) -> List[str]:
+    """Названия тегов сделки из объекта AmoCRM API (_embedded.tags) или вебхука (tags)."""
+    tags = lead.get("_embedded", {}).get("tags") or lead.get("tags") or []
+    return [tag["name"] for tag in tags if isinstance(tag, dict) and tag.get("name")]
+
+
+def is_lead_hidden_by_rules(
+    permissions: Dict[str, Any],
+    pipeline_id: Optional[int],
+    tags: Iterable[str],
+) -> bool:
+    """
+    Скрыта ли сделка от менеджера правилами pipelines и tags_logic.leads.
+
+    Та же логика выражена SQL условием в
+    app.services.lead_index_service.hidden_leads_condition - при изменении
+    правил их нужно менять вместе.
+
+    Args:
+        permissions: Документ permissions менеджера
+        pipeline_id: ID воронки сделки
+        tags: Названия тегов сделки
+
+    Returns:
+        True, если сделка скрыта
+    """
+    pipelines_rule = permissions.get("pipelines", {})
+    pipelines_mode = pipelines_rule.get("mode", "none")
+    pipeline_values = set(_to_ids(pipelines_rule.get("values", [])))
+
+    if pipelines_mode == "blacklist" and pipeline_id in pipeline_values:
+        return True
+    if pipelines_mode == "whitelist" and pipeline_id not in pipeline_values:
+        return True
+
+    tags_rule = permissions.get("tags_logic", {}).get("leads", {})
+    tags_mode = tags_rule.get("mode", "none")
+    tag_values = {str(value) for value in tags_rule.get("values", [])}
+    has_listed_tag = any(tag in tag_values for tag in tags)
+
+    if tags_mode == "blacklist" and has_listed_tag:
+        return True
+    if tags_mode == "whitelist" and not has_listed_tag:
+        return True
+
+    return False
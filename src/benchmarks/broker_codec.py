@@ -0,0 +1,97 @@
+"""
+Бенчмарк кодирования сообщений брокера: JSON и msgpack.
+
+Документы повторяют реальные сообщения: запрос сохранения настроек (правила
+по полям, воронкам и тегам) и ответ GET с настройками, скрытыми ID и
+скрытыми сделками из индекса (include_leads). Сравниваются размер тела и
+время кодирования/декодирования через app.core.broker.codec.
+
+Нужен пакет msgpack (pip install .[msgpack]).
+
+Запуск (из src):
+    python -m benchmarks.broker_codec
+"""
+
+import random
+import time
+from typing import Any, Dict
+
+from app.core.broker.codec import JSON_CONTENT_TYPE, MSGPACK_CONTENT_TYPE, decode, encode
+
+# (имя, полей в правилах, тегов, скрытых сделок)
+DOCUMENTS = (
+    ("small", 10, 5, 0),
+    ("medium", 200, 50, 1000),
+    ("large", 2000, 500, 20000),
+    ("huge", 5000, 2000, 200000),
+)
+REPEATS = 20
+
+
+def _mode(rnd: random.Random, values: list) -> Dict[str, Any]:
+    return {"mode": rnd.choice(("blacklist", "whitelist")), "values": values}
+
+
+def _permissions(rnd: random.Random, fields: int, tags: int) -> Dict[str, Any]:
+    def field_ids() -> list:
+        return rnd.sample(range(100_000, 2_000_000), fields)
+
+    def tag_names() -> list:
+        return [f"тег-{rnd.randrange(100_000)}" for _ in range(tags)]
+
+    return {
+        "menu": _mode(rnd, ["analytics", "notifications", "catalogs"]),
+        "pipelines": _mode(rnd, rnd.sample(range(1_000_000, 9_000_000), 20)),
+        "fields": {entity: _mode(rnd, field_ids()) for entity in ("leads", "contacts", "companies")},
+        "tags_logic": {entity: _mode(rnd, tag_names()) for entity in ("leads", "contacts", "companies")},
+    }
+
+
+def realistic_documents(rnd: random.Random, fields: int, tags: int, leads: int) -> Dict[str, Dict[str, Any]]:
+    """Запрос сохранения настроек и ответ GET заданного размера."""
+    permissions = _permissions(rnd, fields, tags)
+    save_request = {"subdomain": "example", "manager_id": 12345, "permissions": permissions}
+    get_reply = {
+        "success": True,
+        "data": {
+            **save_request,
+            "hidden": {
+                "pipelines": rnd.sample(range(1_000_000, 9_000_000), 10),
+                "statuses": rnd.sample(range(10_000_000, 90_000_000), 50),
+                "fields": {
+                    entity: permissions["fields"][entity]["values"] for entity in ("leads", "contacts", "companies")
+                },
+                "leads": sorted(rnd.sample(range(20_000_000, 40_000_000), leads)),
+            },
+            "created_at": "2025-06-01T12:00:00+00:00",
+            "updated_at": "2025-06-02T08:30:00+00:00",
+        },
+    }
+    return {"save request": save_request, "get reply": get_reply}
+
+
+def _timed(func, *args) -> float:
+    started = time.perf_counter()
+    for _ in range(REPEATS):
+        func(*args)
+    return (time.perf_counter() - started) / REPEATS * 1000
+
+
+def main() -> None:
+    rnd = random.Random(0)
+    print(f"{'document':>8} {'message':>13} {'codec':>8} {'bytes':>10} {'encode ms':>10} {'decode ms':>10}")
+
+    for name, fields, tags, leads in DOCUMENTS:
+        for message, document in realistic_documents(rnd, fields, tags, leads).items():
+            for codec, content_type in (("json", JSON_CONTENT_TYPE), ("msgpack", MSGPACK_CONTENT_TYPE)):
+                body = encode(document, content_type)
+                assert decode(body, content_type) == document
+                print(
+                    f"{name:>8} {message:>13} {codec:>8} {len(body):>10} "
+                    f"{_timed(encode, document, content_type):>10.3f} "
+                    f"{_timed(decode, body, content_type):>10.3f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
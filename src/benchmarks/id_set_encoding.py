@@ -0,0 +1,54 @@
+"""
+Бенчмарк кодирования множеств скрытых ID: JSON массив, delta+varint и фильтр Блума.
+
+Сравнивает размер payload (в том числе после gzip, как отдает nginx) и время
+декодирования эталонным декодером.
+
+Запуск (из src):
+    python -m benchmarks.id_set_encoding
+"""
+
+import gzip
+import json
+import random
+import time
+
+from app.utils.id_set_codec import BLOOM, DELTA_VARINT, decode_id_set, encode_id_set
+
+SIZES = (100, 1000, 10000, 50000, 200000)
+# ID сделок AmoCRM - восьмизначные, скрытые сделки разбросаны по диапазону
+ID_RANGE = (20_000_000, 40_000_000)
+REPEATS = 5
+
+
+def _timed(func, *args):
+    started = time.perf_counter()
+    for _ in range(REPEATS):
+        result = func(*args)
+    return result, (time.perf_counter() - started) / REPEATS * 1000
+
+
+def main() -> None:
+    rnd = random.Random(0)
+    print(f"{'size':>8} {'encoding':>13} {'bytes':>10} {'gzip':>10} {'decode ms':>10}")
+
+    for size in SIZES:
+        ids = sorted(rnd.sample(range(*ID_RANGE), size))
+
+        for encoding in ("json", DELTA_VARINT, BLOOM):
+            payload = json.dumps(encode_id_set(ids, encoding, bloom_min_size=0)).encode("utf-8")
+            _, decode_ms = _timed(lambda raw: decode_id_set(json.loads(raw)), payload)
+            print(
+                f"{size:>8} {encoding:>13} {len(payload):>10} "
+                f"{len(gzip.compress(payload)):>10} {decode_ms:>10.2f}"
+            )
+
+        bloom = decode_id_set(encode_id_set(ids, BLOOM, bloom_min_size=0))
+        id_set = set(ids)
+        probes = [value for value in rnd.sample(range(*ID_RANGE), 20000) if value not in id_set]
+        false_positives = sum(1 for value in probes if value in bloom)
+        print(f"{'':>8} {'bloom fp':>13} {false_positives / len(probes):>10.5f}")
+
+
+if __name__ == "__main__":
+    main()
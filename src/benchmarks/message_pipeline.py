@@ -0,0 +1,94 @@
+"""
+Бенчмарк конвейера обработки сообщения воркером: CPU на сообщение SAVE.
+
+Сравниваются два конвейера на одинаковых сообщениях (TestRabbitBroker,
+без RabbitMQ и БД, обработчик только валидирует SaveSettingsRequest):
+
+    legacy  - LoggingMiddleware.on_receive целиком разбирает тело ради
+              subdomain, затем FastStream разбирает его еще раз для обработчика
+    current - subdomain и request id из заголовков x-subdomain/x-request-id,
+              тело декодируется один раз (кеш msg.decode())
+
+Запуск (из src):
+    python -m benchmarks.message_pipeline
+"""
+
+import asyncio
+import json
+import random
+import time
+import uuid
+
+from faststream import BaseMiddleware
+from faststream.rabbit import RabbitBroker, TestRabbitBroker
+
+from app.core.broker.codec import JSON_CONTENT_TYPE, broker_decoder, encode
+from app.core.broker.config import REQUEST_ID_HEADER, SUBDOMAIN_HEADER
+from app.core.broker.middlewares.logging_middleware import LoggingMiddleware
+from app.core.logging import logger, request_id_var, subdomain_var
+from app.schemas.permissions import SaveSettingsRequest
+from benchmarks.broker_codec import realistic_documents
+
+# (имя, полей в правилах, тегов)
+DOCUMENTS = (
+    ("small", 10, 5),
+    ("medium", 200, 50),
+    ("large", 2000, 500),
+)
+MESSAGES = 300
+
+
+class LegacyLoggingMiddleware(BaseMiddleware):
+    """Прежний LoggingMiddleware: разбор тела в on_receive."""
+
+    async def on_receive(self) -> None:
+        body = json.loads(self.msg.body.decode("utf-8"))
+        self._subdomain_token = subdomain_var.set(body.get("subdomain") or "unknown")
+        self._request_id_token = request_id_var.set(str(uuid.uuid4())[:12])
+        logger.info("Получено сообщение из очереди [%s]", self.msg.routing_key)
+
+    async def after_processed(self, exc_type=None, exc_val=None, exc_tb=None):
+        logger.info("Сообщение успешно обработано")
+        subdomain_var.reset(self._subdomain_token)
+        request_id_var.reset(self._request_id_token)
+        return await super().after_processed(exc_type, exc_val, exc_tb)
+
+
+def _broker(middleware) -> RabbitBroker:
+    broker = RabbitBroker(middlewares=[middleware], decoder=broker_decoder, logger=None)
+
+    @broker.subscriber("bench_pipeline")
+    async def handle(data: dict) -> None:
+        SaveSettingsRequest(**data)
+
+    return broker
+
+
+async def _measure(middleware, document: dict, headers: dict) -> float:
+    """CPU время на сообщение, мс."""
+    # Тело кодируется заранее, чтобы не учитывать кодирование на стороне web
+    body = encode(document)
+    async with TestRabbitBroker(_broker(middleware)) as broker:
+        started = time.process_time()
+        for _ in range(MESSAGES):
+            await broker.publish(body, "bench_pipeline", headers=headers, content_type=JSON_CONTENT_TYPE)
+        return (time.process_time() - started) / MESSAGES * 1000
+
+
+async def main() -> None:
+    rnd = random.Random(0)
+    # Логи не влияют на сравнение: одинаковое число записей в обоих режимах
+    logger.disabled = True
+
+    print(f"{'document':>8} {'legacy ms':>10} {'current ms':>11} {'speedup':>8}")
+    for name, fields, tags in DOCUMENTS:
+        document = realistic_documents(rnd, fields, tags, 0)["save request"]
+        headers = {SUBDOMAIN_HEADER: document["subdomain"], REQUEST_ID_HEADER: uuid.uuid4().hex[:12]}
+
+        legacy = await _measure(LegacyLoggingMiddleware, document, {})
+        current = await _measure(LoggingMiddleware, document, headers)
+        print(f"{name:>8} {legacy:>10.3f} {current:>11.3f} {legacy / current:>7.2f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,87 @@
+"""
+Бенчмарк объединения автосохранений: записи в БД за сессии редактирования.
+
+Имитируются администраторы, которые кликают по настройкам менеджеров:
+каждый клик - SAVE всего документа менеджера с интервалом CLICK_INTERVAL.
+Сохранения идут через SaveCoalescer с разными окнами (0 - без объединения);
+запись имитирует удаление и вставку (WRITE_TIME). Сравниваются число записей
+и задержка ответа на сохранение.
+
+Запуск (из src):
+    python -m benchmarks.save_coalescing
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from typing import Any, Dict, List, Tuple
+
+from app.core.broker.coalescing import SaveCoalescer
+
+WRITE_TIME = 0.02  # секунд на удаление и вставку
+CLICK_INTERVAL = (0.1, 0.4)  # секунд между кликами одного администратора
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+async def run_window(window: float, sessions: int, clicks: int) -> Tuple[int, int, List[float]]:
+    """
+    Returns:
+        Кортеж (сохранений, записей в БД, задержки ответов)
+    """
+    writes = 0
+
+    async def writer(subdomain: str, manager_id: int, document: Dict[str, Any], version: int) -> Dict[str, Any]:
+        nonlocal writes
+        writes += 1
+        await asyncio.sleep(WRITE_TIME)
+        return {"success": True, "data": document}
+
+    coalescer = SaveCoalescer(writer, window=window)
+    latencies: List[float] = []
+
+    async def one_save(manager_id: int, click: int) -> None:
+        started = time.perf_counter()
+        document = {"click": click}
+        if coalescer.enabled:
+            await coalescer.save("example", manager_id, document, click)
+        else:
+            await writer("example", manager_id, document, click)
+        latencies.append(time.perf_counter() - started)
+
+    async def editing_session(manager_id: int) -> None:
+        rnd = random.Random(manager_id)
+        tasks = []
+        for click in range(clicks):
+            tasks.append(asyncio.create_task(one_save(manager_id, click)))
+            await asyncio.sleep(rnd.uniform(*CLICK_INTERVAL))
+        await asyncio.gather(*tasks)
+
+    await asyncio.gather(*(editing_session(manager_id) for manager_id in range(1, sessions + 1)))
+    return sessions * clicks, writes, latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=20, help="Одновременных сессий редактирования")
+    parser.add_argument("--clicks", type=int, default=40, help="Кликов (сохранений) за сессию")
+    parser.add_argument("--windows", default="0,0.5,1,2,3", help="Окна объединения через запятую, секунд")
+    args = parser.parse_args()
+
+    print(f"{'window s':>8} {'saves':>6} {'writes':>7} {'ratio':>7} {'p50 ms':>8} {'p95 ms':>8}")
+    for window in (float(value) for value in args.windows.split(",")):
+        saves, writes, latencies = asyncio.run(run_window(window, args.sessions, args.clicks))
+        print(
+            f"{window:>8.1f} {saves:>6} {writes:>7} {saves / writes:>6.1f}x "
+            f"{statistics.median(latencies) * 1000:>8.1f} "
+            f"{_percentile(latencies, 95) * 1000:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
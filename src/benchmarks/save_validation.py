@@ -0,0 +1,74 @@
+"""
+Микро-бенчмарк разбора сообщения SAVE в воркере: стоимость Pydantic на сохранение.
+
+    legacy        - json.loads, SaveSettingsRequest(**data) и model_dump()
+                    (как было в handle_save_settings)
+    validate_json - SAVE_SETTINGS_ADAPTER.validate_json по сырым bytes и model_dump()
+    trusted       - проверка HMAC подписи web и json.loads, без валидации
+
+Запуск (из src):
+    python -m benchmarks.save_validation
+"""
+
+import json
+import random
+import time
+
+from app.core.broker.config import SIGNATURE_HEADER
+from app.core.broker.signing import is_trusted, sign
+from app.core.settings import config
+from app.schemas.permissions import SAVE_SETTINGS_ADAPTER, SaveSettingsRequest
+from benchmarks.broker_codec import realistic_documents
+
+# (имя, полей в правилах, тегов)
+DOCUMENTS = (
+    ("small", 10, 5),
+    ("medium", 200, 50),
+    ("large", 2000, 500),
+    ("huge", 5000, 2000),
+)
+REPEATS = 200
+
+
+def legacy(body: bytes, headers: dict) -> dict:
+    return SaveSettingsRequest(**json.loads(body)).permissions.model_dump()
+
+
+def validate_json(body: bytes, headers: dict) -> dict:
+    return SAVE_SETTINGS_ADAPTER.validate_json(body).permissions.model_dump()
+
+
+def trusted(body: bytes, headers: dict) -> dict:
+    assert is_trusted(body, headers)
+    return json.loads(body)["permissions"]
+
+
+def _timed(func, *args) -> float:
+    started = time.perf_counter()
+    for _ in range(REPEATS):
+        func(*args)
+    return (time.perf_counter() - started) / REPEATS * 1000
+
+
+def main() -> None:
+    rnd = random.Random(0)
+    config.rabbit_cfg.TRUSTED_SECRET = config.rabbit_cfg.TRUSTED_SECRET or "benchmark-secret"
+
+    print(f"{'document':>8} {'bytes':>8} {'legacy ms':>10} {'validate_json ms':>17} {'trusted ms':>11}")
+    for name, fields, tags in DOCUMENTS:
+        document = realistic_documents(rnd, fields, tags, 0)["save request"]
+        # Web отправляет model_dump(mode="json") провалидированного запроса
+        body = json.dumps(SaveSettingsRequest(**document).model_dump(mode="json")).encode("utf-8")
+        headers = {SIGNATURE_HEADER: sign(body)}
+
+        assert legacy(body, headers) == validate_json(body, headers) == trusted(body, headers)
+        print(
+            f"{name:>8} {len(body):>8} "
+            f"{_timed(legacy, body, headers):>10.3f} "
+            f"{_timed(validate_json, body, headers):>17.3f} "
+            f"{_timed(trusted, body, headers):>11.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+import pytest
+
+from app.amocrm import circuit_breaker
+from app.amocrm.circuit_breaker import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    CircuitBreakerOpenError,
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", clock)
+    return clock
+
+
+def _breaker(half_open_requests: int = 1) -> CircuitBreaker:
+    return CircuitBreaker(
+        "example",
+        failure_rate=0.5,
+        min_requests=4,
+        window=30,
+        open_timeout=10,
+        half_open_requests=half_open_requests,
+    )
+
+
+def _open(breaker: CircuitBreaker) -> None:
+    for _ in range(4):
+        breaker.before_request()
+        breaker.record_failure()
+    assert breaker.state == OPEN
+
+
+def test_opens_at_failure_rate_threshold(clock):
+    breaker = _breaker()
+
+    for success in (True, True, False):
+        assert breaker.before_request() is False
+        if success:
+            breaker.record_success()
+        else:
+            breaker.record_failure()
+    # 1 из 3: ниже min_requests
+    assert breaker.state == CLOSED
+
+    breaker.before_request()
+    breaker.record_failure()
+    # 2 из 4 = failure_rate
+    assert breaker.state == OPEN
+
+
+def test_old_outcomes_leave_the_window(clock):
+    breaker = _breaker()
+    for _ in range(3):
+        breaker.before_request()
+        breaker.record_failure()
+
+    clock.now += 31
+    breaker.before_request()
+    breaker.record_failure()
+
+    assert breaker.state == CLOSED
+
+
+def test_open_rejects_until_timeout_then_half_opens(clock):
+    breaker = _breaker()
+    _open(breaker)
+
+    clock.now += 5
+    with pytest.raises(CircuitBreakerOpenError) as error:
+        breaker.before_request()
+    assert error.value.retry_after == pytest.approx(5)
+
+    clock.now += 5
+    assert breaker.before_request() is True
+    assert breaker.state == HALF_OPEN
+
+
+def test_half_open_limits_probes(clock):
+    breaker = _breaker(half_open_requests=2)
+    _open(breaker)
+    clock.now += 10
+
+    assert breaker.before_request() is True
+    assert breaker.before_request() is True
+    with pytest.raises(CircuitBreakerOpenError):
+        breaker.before_request()
+
+    # Отмененный пробный запрос освобождает слот
+    breaker.release(True)
+    assert breaker.before_request() is True
+
+
+def test_probe_success_closes_and_failure_reopens(clock):
+    breaker = _breaker()
+    _open(breaker)
+    clock.now += 10
+
+    probe = breaker.before_request()
+    breaker.record_failure(probe)
+    assert breaker.state == OPEN
+    assert breaker.opened_at == clock.now
+
+    clock.now += 10
+    probe = breaker.before_request()
+    breaker.record_success(probe)
+    assert breaker.state == CLOSED
+    assert breaker.before_request() is False
+
+
+def test_late_success_of_closed_request_does_not_close_half_open(clock):
+    breaker = _breaker()
+    # Медленный запрос пропущен, пока breaker замкнут
+    slow = breaker.before_request()
+    _open(breaker)
+    clock.now += 10
+    probe = breaker.before_request()
+    assert breaker.state == HALF_OPEN
+
+    breaker.record_success(slow)
+
+    assert breaker.state == HALF_OPEN
+    # Слот пробного запроса по-прежнему занят пробой
+    with pytest.raises(CircuitBreakerOpenError):
+        breaker.before_request()
+    breaker.record_success(probe)
+    assert breaker.state == CLOSED
+
+
+def test_late_failure_of_closed_request_does_not_extend_open(clock):
+    breaker = _breaker()
+    slow = breaker.before_request()
+    _open(breaker)
+    opened_at = breaker.opened_at
+
+    clock.now += 5
+    breaker.record_failure(slow)
+    assert breaker.opened_at == opened_at
+
+    clock.now += 5
+    probe = breaker.before_request()
+    breaker.record_failure(slow)
+    assert breaker.state == HALF_OPEN
+    breaker.record_success(probe)
+    assert breaker.state == CLOSED
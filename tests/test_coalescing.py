@@ -0,0 +1,118 @@
+import asyncio
+
+import pytest
+
+from app.core.broker.coalescing import SaveCoalescer
+
+
+class RecordingWriter:
+    """Writer, записывающий (ключ, документ, версия) каждой записи."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.writes = []
+        self.finished = 0
+
+    async def __call__(self, subdomain, manager_id, document, version):
+        self.writes.append(((subdomain, manager_id), document, version))
+        await asyncio.sleep(self.delay)
+        self.finished += 1
+        return {"success": True, "data": document}
+
+
+async def test_window_writes_newest_version_once():
+    writer = RecordingWriter()
+    coalescer = SaveCoalescer(writer, window=0.05)
+
+    results = await asyncio.gather(
+        coalescer.save("example", 1, {"click": 1}, 1),
+        coalescer.save("example", 1, {"click": 3}, 3),
+        # Опоздавшее сообщение с меньшей версией не вытесняет более новый документ
+        coalescer.save("example", 1, {"click": 2}, 2),
+    )
+
+    assert writer.writes == [(("example", 1), {"click": 3}, 3)]
+    assert all(result == {"success": True, "data": {"click": 3}} for result in results)
+
+
+async def test_keys_are_written_separately():
+    writer = RecordingWriter()
+    coalescer = SaveCoalescer(writer, window=0.05)
+
+    await asyncio.gather(
+        coalescer.save("example", 1, {"manager": 1}, 1),
+        coalescer.save("example", 2, {"manager": 2}, 1),
+    )
+
+    assert sorted(write[0] for write in writer.writes) == [("example", 1), ("example", 2)]
+
+
+async def test_save_during_write_goes_to_next_window():
+    writer = RecordingWriter(delay=0.05)
+    coalescer = SaveCoalescer(writer, window=0.01)
+
+    first = asyncio.create_task(coalescer.save("example", 1, {"click": 1}, 1))
+    await asyncio.sleep(0.03)  # окно закрыто, идет запись
+    second = asyncio.create_task(coalescer.save("example", 1, {"click": 2}, 2))
+    await asyncio.gather(first, second)
+
+    assert [write[2] for write in writer.writes] == [1, 2]
+
+
+async def test_settle_writes_open_window_before_returning():
+    writer = RecordingWriter()
+    coalescer = SaveCoalescer(writer, window=10)
+
+    pending = asyncio.create_task(coalescer.save("example", 1, {"click": 1}, 1))
+    await asyncio.sleep(0)
+
+    await asyncio.wait_for(coalescer.settle("example", 1), 1)
+
+    assert writer.writes == [(("example", 1), {"click": 1}, 1)]
+    assert (await pending)["data"] == {"click": 1}
+
+
+async def test_settle_waits_for_running_write():
+    writer = RecordingWriter(delay=0.05)
+    coalescer = SaveCoalescer(writer, window=0.01)
+
+    pending = asyncio.create_task(coalescer.save("example", 1, {"click": 1}, 1))
+    await asyncio.sleep(0.02)  # запись началась по таймеру окна
+    await coalescer.settle("example", 1)
+
+    assert writer.finished == 1
+    await pending
+
+
+async def test_write_error_is_returned_to_all_saves():
+    async def failing_writer(subdomain, manager_id, document, version):
+        raise RuntimeError("db is down")
+
+    coalescer = SaveCoalescer(failing_writer, window=0.01)
+
+    results = await asyncio.gather(
+        coalescer.save("example", 1, {}, 1),
+        coalescer.save("example", 1, {}, 2),
+        return_exceptions=True,
+    )
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+async def test_flush_all_waits_for_timer_flushes():
+    writer = RecordingWriter(delay=0.05)
+    coalescer = SaveCoalescer(writer, window=0.01)
+
+    pending = asyncio.create_task(coalescer.save("example", 1, {"click": 1}, 1))
+    await asyncio.sleep(0.02)  # запись запущена таймером
+    await coalescer.flush_all()
+
+    assert writer.finished == 1
+    await pending
+
+
+def test_window_must_fit_into_save_timeout():
+    with pytest.raises(ValueError):
+        SaveCoalescer(RecordingWriter(), window=10, timeout=15)
+
+    assert SaveCoalescer(RecordingWriter(), window=5, timeout=15).enabled
@@ -0,0 +1,114 @@
+"""Скрытые ID в ответах настроек при пустом кеше метаданных процесса."""
+
+import time
+from datetime import datetime
+
+import pytest
+
+from app.amocrm.metadata import AccountMetadataCache
+from app.core.broker.routers import permissions as permissions_router
+from app.models.user_permissions import UserPermissions
+from app.testing.amocrm_stub import StubConfig
+from app.utils import tokens
+
+
+class RecordingSession:
+    """Сессия БД для сервисного слоя: запоминает выполненные запросы."""
+
+    def __init__(self):
+        self.statements = []
+        self.commits = 0
+
+    async def execute(self, statement):
+        self.statements.append(statement)
+
+    async def commit(self):
+        self.commits += 1
+
+    async def rollback(self):
+        pass
+
+
+@pytest.fixture
+def amocrm_stub_config() -> StubConfig:
+    return StubConfig(leads_count=10, custom_fields_count=6, pipelines_count=3, rps=0)
+
+
+@pytest.fixture
+def empty_metadata_cache(monkeypatch):
+    # Процесс read/write: METADATA_GET здесь не выполнялся, PostgreSQL не используется
+    cache = AccountMetadataCache(ttl=600, persist=False)
+    monkeypatch.setattr(permissions_router, "metadata_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def example_tokens(monkeypatch):
+    monkeypatch.setitem(tokens._tokens_cache, "example", {
+        "access_token": "test-token",
+        "refresh_token": "test-refresh",
+        "expires_at": time.time() + 3600,
+        "refresh_at": time.time() + 3600,
+        "last_used": time.time(),
+    })
+
+
+@pytest.fixture
+def saved_permissions(monkeypatch):
+    """Сохранение без PostgreSQL: захват версии и запись подменены."""
+
+    async def claim_settings_version(subdomain, manager_id, version, session):
+        return True
+
+    async def save_permissions_document(subdomain, manager_id, permissions, session):
+        now = datetime.now()
+        return UserPermissions(
+            id=1,
+            subdomain=subdomain,
+            manager_id=manager_id,
+            permissions=permissions,
+            created_at=now,
+            updated_at=now,
+        )
+
+    async def rebuild_hidden_leads(permissions, version, db_session):
+        pass
+
+    monkeypatch.setattr(permissions_router, "claim_settings_version", claim_settings_version)
+    monkeypatch.setattr(permissions_router, "save_permissions_document", save_permissions_document)
+    monkeypatch.setattr(permissions_router, "_rebuild_hidden_leads", rebuild_hidden_leads)
+
+
+async def test_save_with_whitelist_returns_hidden_ids(
+    amocrm_stub, empty_metadata_cache, example_tokens, saved_permissions
+):
+    pipelines = amocrm_stub.account("example").pipelines
+    visible = pipelines[0]["id"]
+    document = {
+        "pipelines": {"mode": "whitelist", "values": [str(visible)]},
+        "fields": {"leads": {"mode": "blacklist", "values": ["100001"]}},
+    }
+
+    result = await permissions_router._save_result("example", 7, document, 1, RecordingSession())
+
+    hidden = result["data"]["hidden"]
+    assert hidden is not None
+    assert hidden["pipelines"] == sorted(pipeline["id"] for pipeline in pipelines[1:])
+    assert hidden["fields"]["leads"] == [100001]
+    # Метаданные загружены один раз и остались в кеше процесса
+    assert empty_metadata_cache.peek("example") is not None
+
+
+async def test_cached_metadata_is_used_without_amocrm(empty_metadata_cache, saved_permissions, monkeypatch):
+    metadata = {"pipelines": [{"id": 1, "statuses": []}, {"id": 2, "statuses": []}], "custom_fields": {}}
+    empty_metadata_cache._entries["example"] = {"data": metadata, "loaded_at": time.time()}
+
+    async def fail(*args, **kwargs):
+        raise AssertionError("AmoCRM не должен запрашиваться")
+
+    monkeypatch.setattr(empty_metadata_cache, "get", fail)
+    document = {"pipelines": {"mode": "whitelist", "values": ["1"]}}
+
+    result = await permissions_router._save_result("example", 7, document, 1, RecordingSession())
+
+    assert result["data"]["hidden"]["pipelines"] == [2]
@@ -0,0 +1,73 @@
+import random
+
+import pytest
+
+from app.utils.id_set_codec import (
+    BLOOM,
+    DELTA_VARINT,
+    BloomFilter,
+    decode_id_set,
+    encode_hidden,
+    encode_id_set,
+)
+
+
+@pytest.mark.parametrize(
+    "ids",
+    [
+        [],
+        [0],
+        [1, 2, 3],
+        [5, 1, 3, 3],  # порядок и дубликаты не сохраняются
+        [127, 128, 16383, 16384, 2 ** 40, 2 ** 63 - 1],  # границы varint
+        random.Random(0).sample(range(1, 10 ** 9), 5000),
+    ],
+)
+def test_delta_varint_round_trip(ids):
+    encoded = encode_id_set(ids, DELTA_VARINT)
+
+    assert encoded["encoding"] == DELTA_VARINT
+    assert decode_id_set(encoded) == sorted(set(ids))
+
+
+def test_json_is_passed_through():
+    assert encode_id_set([3, 1], "json") == [3, 1]
+    assert decode_id_set([3, 1]) == [3, 1]
+
+
+def test_small_sets_stay_exact_with_bloom():
+    encoded = encode_id_set([1, 2, 3], BLOOM, bloom_min_size=10)
+
+    assert encoded["encoding"] == DELTA_VARINT
+    assert decode_id_set(encoded) == [1, 2, 3]
+
+
+@pytest.mark.parametrize("fp_rate", [0.01, 0.001])
+def test_bloom_has_no_false_negatives_and_bounded_false_positives(fp_rate):
+    rnd = random.Random(1)
+    universe = rnd.sample(range(1, 10 ** 8), 40000)
+    members, others = universe[:20000], universe[20000:]
+
+    bloom = decode_id_set(encode_id_set(members, BLOOM, bloom_min_size=0, fp_rate=fp_rate))
+
+    assert isinstance(bloom, BloomFilter)
+    assert all(value in bloom for value in members)
+    false_positives = sum(value in bloom for value in others)
+    # Запас на случайность выборки: вдвое больше заданной вероятности
+    assert false_positives / len(others) <= fp_rate * 2
+
+
+def test_unknown_encoding_is_rejected():
+    with pytest.raises(ValueError):
+        decode_id_set({"encoding": "zstd", "data": ""})
+
+
+def test_encode_hidden_encodes_nested_lists():
+    hidden = {"pipelines": [2, 1], "fields": {"leads": [10]}, "mode": "blacklist"}
+
+    encoded = encode_hidden(hidden, DELTA_VARINT)
+
+    assert decode_id_set(encoded["pipelines"]) == [1, 2]
+    assert decode_id_set(encoded["fields"]["leads"]) == [10]
+    assert encoded["mode"] == "blacklist"
+    assert encode_hidden(hidden, "json") is hidden
@@ -0,0 +1,103 @@
+"""Совпадение SQL условия hidden_leads_condition и is_lead_hidden_by_rules."""
+
+import pytest
+from sqlalchemy.sql import elements, operators
+
+from app.services.lead_index_service import hidden_leads_condition
+from app.utils.visibility import is_lead_hidden_by_rules
+
+
+def _evaluate(expression, row):
+    """
+    Вычисление условия над строкой lead_index с трехзначной логикой SQL (None - NULL).
+
+    PostgreSQL здесь недоступен, а && по массивам не выполняется в SQLite.
+    """
+    if isinstance(expression, elements.True_):
+        return True
+    if isinstance(expression, elements.False_):
+        return False
+    if isinstance(expression, elements.Null):
+        return None
+    if isinstance(expression, elements.ColumnElement) and hasattr(expression, "table"):
+        return row[expression.key]
+    if isinstance(expression, elements.BindParameter):
+        return expression.value
+    if isinstance(expression, elements.Grouping):
+        return _evaluate(expression.element, row)
+
+    if isinstance(expression, elements.BooleanClauseList):
+        values = [_evaluate(clause, row) for clause in expression.clauses]
+        if expression.operator is operators.or_:
+            return True if True in values else (None if None in values else False)
+        return False if False in values else (None if None in values else True)
+
+    if isinstance(expression, elements.AsBoolean):
+        value = _evaluate(expression.element, row)
+        if value is None:
+            return None
+        return value if expression.operator is operators.is_true else not value
+    if isinstance(expression, elements.UnaryExpression) and expression.operator is operators.inv:
+        value = _evaluate(expression.element, row)
+        return None if value is None else not value
+
+    if isinstance(expression, elements.BinaryExpression):
+        left = _evaluate(expression.left, row)
+        right = _evaluate(expression.right, row)
+        operator = expression.operator
+        if operator is operators.is_:
+            return left is right
+        if operator is operators.is_not:
+            return left is not right
+        if left is None or right is None:
+            return None
+        if operator is operators.in_op:
+            return left in right
+        if operator is operators.not_in_op:
+            return left not in right
+        if getattr(operator, "opstring", None) == "&&":
+            return bool(set(left) & set(right))
+
+    raise NotImplementedError(f"Не поддерживается в тесте: {expression!r}")
+
+
+def _sql_hidden(permissions, pipeline_id, tags) -> bool:
+    # WHERE пропускает и FALSE, и NULL
+    return _evaluate(hidden_leads_condition(permissions), {"pipeline_id": pipeline_id, "tags": tags}) is True
+
+
+PERMISSIONS = [
+    {},
+    {"pipelines": {"mode": "none", "values": ["1"]}},
+    {"pipelines": {"mode": "blacklist", "values": ["1"]}},
+    {"pipelines": {"mode": "blacklist", "values": []}},
+    {"pipelines": {"mode": "blacklist", "values": ["abc"]}},
+    {"pipelines": {"mode": "whitelist", "values": ["1", 3]}},
+    {"pipelines": {"mode": "whitelist", "values": []}},
+    {"tags_logic": {"leads": {"mode": "blacklist", "values": ["vip"]}}},
+    {"tags_logic": {"leads": {"mode": "blacklist", "values": []}}},
+    {"tags_logic": {"leads": {"mode": "whitelist", "values": ["vip", "b2b"]}}},
+    {"tags_logic": {"leads": {"mode": "whitelist", "values": []}}},
+    {
+        "pipelines": {"mode": "whitelist", "values": ["1"]},
+        "tags_logic": {"leads": {"mode": "blacklist", "values": ["vip"]}},
+    },
+    {
+        "pipelines": {"mode": "blacklist", "values": ["2"]},
+        "tags_logic": {"leads": {"mode": "whitelist", "values": ["b2b"]}},
+    },
+]
+
+LEADS = [
+    (1, []),
+    (2, ["vip"]),
+    (3, ["b2b", "other"]),
+    (None, []),
+    (None, ["vip"]),
+]
+
+
+@pytest.mark.parametrize("permissions", PERMISSIONS)
+@pytest.mark.parametrize(("pipeline_id", "tags"), LEADS)
+def test_sql_condition_matches_python_rules(permissions, pipeline_id, tags):
+    assert _sql_hidden(permissions, pipeline_id, tags) == is_lead_hidden_by_rules(permissions, pipeline_id, tags)
@@ -0,0 +1,60 @@
+"""Тесты потокового получения сделок по списку ID."""
+
+import asyncio
+
+import aiohttp
+import pytest
+
+from app.amocrm import requests_amocrm
+from app.amocrm.requests_amocrm import iter_leads_by_ids
+from app.testing.amocrm_stub import StubConfig
+
+HEADERS = {"Authorization": "Bearer test-token", "Host": "example.amocrm.ru"}
+
+
+@pytest.fixture
+def amocrm_stub_config() -> StubConfig:
+    return StubConfig(leads_count=1000, rps=0)
+
+
+async def test_iter_leads_by_ids_returns_all_leads(amocrm_stub):
+    lead_ids = list(amocrm_stub.account("example").leads)
+
+    async with aiohttp.ClientSession() as session:
+        leads = [lead async for lead in iter_leads_by_ids(lead_ids, "example", HEADERS, session, concurrency=3)]
+
+    assert sorted(lead["id"] for lead in leads) == sorted(lead_ids)
+
+
+async def test_iter_leads_by_ids_early_exit_with_full_buffer(amocrm_stub, monkeypatch):
+    # Буфер на одну сделку: воркеры заполняют его сразу и ждут в queue.put
+    monkeypatch.setattr(requests_amocrm, "LEADS_STREAM_BUFFER", 1)
+    lead_ids = list(amocrm_stub.account("example").leads)
+
+    async with aiohttp.ClientSession() as session:
+        stream = iter_leads_by_ids(lead_ids, "example", HEADERS, session, concurrency=4)
+        first = await stream.__anext__()
+        await asyncio.sleep(0.05)
+
+        # Раньше воркеры зависали в put сигнала завершения в полную очередь
+        await asyncio.wait_for(stream.aclose(), timeout=2)
+
+    assert first["id"] in lead_ids
+
+
+async def test_iter_leads_by_ids_break_in_loop(amocrm_stub, monkeypatch):
+    monkeypatch.setattr(requests_amocrm, "LEADS_STREAM_BUFFER", 1)
+    lead_ids = list(amocrm_stub.account("example").leads)
+
+    async def first_lead(session):
+        stream = iter_leads_by_ids(lead_ids, "example", HEADERS, session, concurrency=4)
+        try:
+            async for lead in stream:
+                return lead
+        finally:
+            await stream.aclose()
+
+    async with aiohttp.ClientSession() as session:
+        lead = await asyncio.wait_for(first_lead(session), timeout=2)
+
+    assert lead["id"] in lead_ids
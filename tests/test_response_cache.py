@@ -0,0 +1,28 @@
+import os
+import stat
+
+from app.amocrm.response_cache import ResponseCache
+
+
+def _mode(path) -> int:
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+
+async def test_cache_files_are_private(tmp_path):
+    path = str(tmp_path / "responses.db")
+    old_umask = os.umask(0o022)
+    try:
+        cache = ResponseCache(ttl=60, path=path)
+        await cache.put("example.amocrm.ru /api/v4/leads/pipelines", 200, {}, b'{"pipelines": []}')
+
+        # Пока соединение открыто, -wal и -shm существуют
+        conn = cache._connect()
+        try:
+            conn.execute("SELECT 1 FROM responses").fetchall()
+            files = [path, f"{path}-wal", f"{path}-shm"]
+            assert all(os.path.exists(file) for file in files)
+            assert {file: _mode(file) for file in files} == {file: 0o600 for file in files}
+        finally:
+            conn.close()
+    finally:
+        os.umask(old_umask)
@@ -0,0 +1,50 @@
+import os
+import stat
+
+from app.core.settings import config
+from app.utils import tokens
+from app.utils.token_store import SQLiteTokenStore, get_shared_token_store
+
+
+def _mode(path) -> int:
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+
+def test_store_files_are_private(tmp_path):
+    path = str(tmp_path / "tokens.db")
+    old_umask = os.umask(0o022)
+    try:
+        store = SQLiteTokenStore(path)
+        store.put("example", {"access_token": "a", "refresh_token": "r", "expires_at": 1, "refresh_at": 1})
+
+        # Пока соединение открыто, -wal и -shm существуют
+        conn = store._connect()
+        try:
+            conn.execute("SELECT 1 FROM tokens").fetchall()
+            files = [path, f"{path}-wal", f"{path}-shm"]
+            assert all(os.path.exists(file) for file in files)
+            assert {file: _mode(file) for file in files} == {file: 0o600 for file in files}
+        finally:
+            conn.close()
+    finally:
+        os.umask(old_umask)
+
+
+def test_existing_store_files_are_restricted(tmp_path):
+    path = tmp_path / "tokens.db"
+    path.touch(mode=0o644)
+    os.chmod(path, 0o644)
+
+    SQLiteTokenStore(str(path))
+
+    assert _mode(path) == 0o600
+
+
+def test_broken_store_falls_back_to_process_cache(tmp_path, monkeypatch):
+    # Путь - каталог: SQLite его не откроет
+    monkeypatch.setattr(config.amocrm_cfg, "TOKEN_CACHE_PATH", str(tmp_path))
+    get_shared_token_store.cache_clear()
+    try:
+        assert tokens._shared_store() is None
+    finally:
+        get_shared_token_store.cache_clear()
@@ -0,0 +1,183 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.amocrm.webhooks import WebhookBatcher, is_valid_webhook_token, webhook_token
+from app.api.api_v1.endpoints import webhooks as webhooks_endpoint
+from app.core.settings import config
+
+
+@pytest.fixture
+def webhook_secret(monkeypatch):
+    monkeypatch.setattr(config.amocrm_cfg, "WEBHOOK_SECRET", "test-secret")
+
+
+@pytest.fixture
+def published(monkeypatch):
+    messages = []
+
+    async def publish(message, **options):
+        messages.append((message, options))
+
+    monkeypatch.setattr(webhooks_endpoint.broker, "publish", publish)
+    return messages
+
+
+@pytest.fixture
+async def client():
+    app = FastAPI()
+    app.include_router(webhooks_endpoint.router, prefix="/webhooks")
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+def test_webhook_token_is_bound_to_subdomain(webhook_secret):
+    token = webhook_token("example")
+
+    assert is_valid_webhook_token("example", token)
+    assert not is_valid_webhook_token("other", token)
+    assert not is_valid_webhook_token("example", None)
+
+
+def test_webhooks_are_rejected_without_secret(monkeypatch):
+    monkeypatch.setattr(config.amocrm_cfg, "WEBHOOK_SECRET", "")
+
+    assert not is_valid_webhook_token("example", "anything")
+
+
+async def test_receiver_publishes_authenticated_webhook(webhook_secret, published, client):
+    response = await client.post(
+        f"/webhooks/amocrm/example?token={webhook_token('example')}",
+        content=b"account[subdomain]=example&leads[update][0][id]=1",
+    )
+
+    assert response.status_code == 200
+    assert len(published) == 1
+    assert published[0][0]["subdomain"] == "example"
+
+
+async def test_receiver_accepts_token_header(webhook_secret, published, client):
+    response = await client.post(
+        "/webhooks/amocrm/example",
+        content=b"account[subdomain]=example",
+        headers={"X-Webhook-Token": webhook_token("example")},
+    )
+
+    assert response.status_code == 200
+    assert len(published) == 1
+
+
+@pytest.mark.parametrize(
+    ("url", "status_code"),
+    [
+        ("/webhooks/amocrm/example", 401),
+        ("/webhooks/amocrm/example?token=forged", 403),
+        # Токен другого аккаунта
+        ("/webhooks/amocrm/victim?token={token}", 403),
+    ],
+)
+async def test_receiver_rejects_unauthenticated_webhook(webhook_secret, published, client, url, status_code):
+    response = await client.post(url.format(token=webhook_token("example")), content=b"account[subdomain]=victim")
+
+    assert response.status_code == status_code
+    assert published == []
+
+
+async def test_batches_of_one_subdomain_are_processed_in_order():
+    processed = []
+    running = 0
+
+    async def sink(subdomain, events):
+        nonlocal running
+        running += 1
+        assert running == 1, "пачки субдомена обрабатываются параллельно"
+        await asyncio.sleep(0.02)
+        processed.append([event["id"] for event in events])
+        running -= 1
+
+    batcher = WebhookBatcher(window=0.01, max_size=100, sinks=[sink])
+
+    first = asyncio.create_task(batcher.add("example", [{"id": 1}]))
+    await asyncio.sleep(0.015)  # первая пачка обрабатывается
+    second = asyncio.create_task(batcher.add("example", [{"id": 2}]))
+    await asyncio.sleep(0)
+    # Пачка по размеру, собранная во время обработки первой, тоже ждет ее
+    third = asyncio.create_task(batcher.add("example", [{"id": 3}] * 100))
+    await asyncio.gather(first, second, third)
+
+    assert processed == [[1], [2] + [3] * 100]
+
+
+async def test_batches_of_different_subdomains_run_concurrently():
+    started = []
+    release = asyncio.Event()
+
+    async def sink(subdomain, events):
+        started.append(subdomain)
+        await release.wait()
+
+    batcher = WebhookBatcher(window=0.01, max_size=100, sinks=[sink])
+    tasks = [asyncio.create_task(batcher.add(subdomain, [{"id": 1}])) for subdomain in ("a", "b")]
+    await asyncio.sleep(0.05)
+
+    assert sorted(started) == ["a", "b"]
+    release.set()
+    await asyncio.gather(*tasks)
+
+
+async def test_flush_all_waits_for_timer_flushes():
+    finished = []
+
+    async def sink(subdomain, events):
+        await asyncio.sleep(0.05)
+        finished.append(subdomain)
+
+    batcher = WebhookBatcher(window=0.01, max_size=100, sinks=[sink])
+    pending = asyncio.create_task(batcher.add("example", [{"id": 1}]))
+    await asyncio.sleep(0.02)  # обработка запущена таймером
+
+    await batcher.flush_all()
+
+    assert finished == ["example"]
+    await pending
+
+
+async def test_sink_error_is_returned_to_batch_messages():
+    async def sink(subdomain, events):
+        raise RuntimeError("db is down")
+
+    batcher = WebhookBatcher(window=0.01, max_size=100, sinks=[sink])
+
+    with pytest.raises(RuntimeError):
+        await batcher.add("example", [{"id": 1}])
+
+
+@pytest.fixture
+def batches(monkeypatch):
+    """Пачки, переданные воркером в webhook_batcher."""
+    from app.core.broker.routers import webhooks as webhooks_router
+
+    added = []
+
+    async def add(subdomain, events):
+        added.append((subdomain, [event["id"] for event in events]))
+
+    monkeypatch.setattr(webhooks_router.webhook_batcher, "add", add)
+    return added
+
+
+@pytest.mark.parametrize(
+    ("authenticated", "accepted"),
+    [("example", True), ("EXAMPLE", True), ("other", False), (None, False)],
+)
+async def test_worker_indexes_only_authenticated_webhooks(batches, authenticated, accepted):
+    from app.core.broker.routers.webhooks import handle_amocrm_webhook
+
+    body = "account[subdomain]=example&leads[update][0][id]=1"
+
+    result = await handle_amocrm_webhook({"body": body, "subdomain": authenticated})
+
+    assert result["success"] is accepted
+    assert batches == ([("example", [1])] if accepted else [])